@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Cursor pagination so deep pages cost the same as the first one"""
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class NameCursorPagination(CatalogCursorPagination):
+    ordering = ('name', 'id')
@@ -0,0 +1,34 @@
+import datetime
+import decimal
+import uuid
+
+import msgpack
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+
+def _default(obj):
+    """Encode the types DRF may leave in serialized data"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Promise):
+        # Lazy translation strings
+        return str(obj)
+    raise TypeError(f'Cannot serialize {type(obj)!r}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render responses as MessagePack (``Accept: application/msgpack`` or ``?format=msgpack``)"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
@@ -0,0 +1,219 @@
+from django.db.models import Count, Prefetch, Q
+from rest_framework import serializers
+
+from market.models import Category, Product, ProductImage, Shop
+
+
+def parse_fields(value):
+    """
+    Parse ``?fields=id,name,shop.name`` into a tree: ``{'id': {}, 'name': {}, 'shop': {'name': {}}}``.
+
+    Returns None when no fields were requested, so serializers fall back to their defaults.
+    """
+    if not value:
+        return None
+
+    tree = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for part in path.split('.'):
+            node = node.setdefault(part, {})
+    return tree or None
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for sparse fieldsets and query planning.
+
+    ``Meta`` declares which fields are returned by default, which columns each
+    computed field needs (``depends``), which fields are relations loaded with
+    ``select_related``/``prefetch_related`` (``relations``) and which are
+    queryset annotations (``annotations``). ``plan()`` turns a field tree into
+    the matching queryset so only the requested data is loaded.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.restrict(fields)
+
+    def restrict(self, tree):
+        selected = self.selected_fields(tree)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+        for name, subtree in selected.items():
+            field = self.fields[name]
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsetMixin):
+                nested.restrict(subtree or None)
+
+    @classmethod
+    def selected_fields(cls, tree):
+        if not tree:
+            return {name: {} for name in cls.Meta.default_fields}
+
+        unknown = sorted(set(tree) - set(cls.Meta.fields))
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+        return tree
+
+    @classmethod
+    def nested_class(cls, name):
+        field = cls._declared_fields[name]
+        return type(getattr(field, 'child', field))
+
+    @classmethod
+    def plan(cls, queryset, tree=None, extra_columns=()):
+        """Apply select_related, prefetch_related, annotate and only() for ``tree``"""
+        columns, queryset = cls._plan(queryset, tree, '')
+        return queryset.only(*(columns | set(extra_columns)))
+
+    @classmethod
+    def _plan(cls, queryset, tree, prefix):
+        selected = cls.selected_fields(tree)
+        relations = getattr(cls.Meta, 'relations', {})
+        annotations = getattr(cls.Meta, 'annotations', {})
+        depends = getattr(cls.Meta, 'depends', {})
+
+        columns = {prefix + name for name in getattr(cls.Meta, 'always', ['id'])}
+        needed = {}
+        for name, subtree in selected.items():
+            for dependency in depends.get(name, [name]):
+                needed.setdefault(dependency, subtree if dependency == name else {})
+
+        for name, subtree in needed.items():
+            if relations.get(name) == 'select':
+                nested = cls.nested_class(name)
+                queryset = queryset.select_related(prefix + name)
+                columns.add(prefix + name)
+                nested_columns, queryset = nested._plan(queryset, subtree or None, f'{prefix}{name}__')
+                columns |= nested_columns
+            elif relations.get(name) == 'prefetch':
+                nested = cls.nested_class(name)
+                queryset = queryset.prefetch_related(Prefetch(
+                    prefix + name,
+                    queryset=nested.plan(nested.Meta.model.objects.all(), subtree or None),
+                ))
+            elif name in annotations:
+                if not prefix:
+                    queryset = queryset.annotate(**{name: annotations[name]})
+            else:
+                columns.add(prefix + name)
+        return columns, queryset
+
+
+class CategorySummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url', read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'url']
+        default_fields = ['id', 'name', 'slug']
+        depends = {'url': ['slug']}
+
+
+class ShopSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url', read_only=True)
+    logo_url = serializers.CharField(source='get_logo_url', read_only=True)
+
+    class Meta:
+        model = Shop
+        fields = ['id', 'name', 'slug', 'url', 'logo_url', 'is_verified', 'rating', 'region']
+        default_fields = ['id', 'name', 'slug']
+        depends = {'url': ['slug'], 'logo_url': ['logo']}
+
+
+class ProductImageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_image_url', read_only=True)
+    thumbnail_url = serializers.CharField(source='get_thumbnail_url', read_only=True)
+
+    class Meta:
+        model = ProductImage
+        fields = ['id', 'url', 'thumbnail_url', 'alt_text', 'is_primary', 'order']
+        default_fields = ['id', 'url', 'thumbnail_url', 'alt_text', 'is_primary']
+        always = ['id', 'product']
+        depends = {'url': ['image'], 'thumbnail_url': ['image']}
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url', read_only=True)
+    discount_percentage = serializers.IntegerField(read_only=True)
+    in_stock = serializers.BooleanField(source='is_in_stock', read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
+    category = CategorySummarySerializer(read_only=True)
+    shop = ShopSummarySerializer(read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'url', 'short_description', 'description',
+            'price', 'compare_price', 'discount_percentage', 'stock_quantity', 'in_stock',
+            'condition', 'brand', 'specifications', 'is_featured', 'is_sponsored',
+            'thumbnail_url', 'category', 'shop', 'images', 'created_at', 'updated_at',
+        ]
+        default_fields = [
+            'id', 'name', 'slug', 'price', 'compare_price', 'discount_percentage',
+            'in_stock', 'thumbnail_url', 'category', 'shop',
+        ]
+        depends = {
+            'url': ['slug'],
+            'discount_percentage': ['price', 'compare_price'],
+            'in_stock': ['stock_quantity', 'status'],
+            'thumbnail_url': ['images'],
+        }
+        relations = {'category': 'select', 'shop': 'select', 'images': 'prefetch'}
+
+    def get_thumbnail_url(self, obj):
+        # Uses the prefetched images instead of Product.thumbnail_url's extra queries
+        images = list(obj.images.all())
+        if not images:
+            return None
+        primary = next((image for image in images if image.is_primary), images[0])
+        return primary.get_thumbnail_url()
+
+
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url', read_only=True)
+    image_url = serializers.CharField(source='get_image_preview_url', read_only=True)
+    product_count = serializers.IntegerField(source='num_products', read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'url', 'description', 'parent', 'image_url', 'product_count']
+        default_fields = ['id', 'name', 'slug', 'parent', 'image_url']
+        depends = {'url': ['slug'], 'image_url': ['image'], 'product_count': ['num_products']}
+        annotations = {
+            'num_products': Count(
+                'products', filter=Q(products__is_active=True, products__status='published')
+            ),
+        }
+
+
+class ShopSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url', read_only=True)
+    logo_url = serializers.CharField(source='get_logo_url', read_only=True)
+    banner_url = serializers.CharField(source='get_banner_url', read_only=True)
+    product_count = serializers.IntegerField(source='num_products', read_only=True)
+
+    class Meta:
+        model = Shop
+        fields = [
+            'id', 'name', 'slug', 'url', 'description', 'logo_url', 'banner_url',
+            'region', 'district', 'is_verified', 'rating', 'product_count', 'created_at',
+        ]
+        default_fields = ['id', 'name', 'slug', 'logo_url', 'region', 'is_verified', 'rating']
+        depends = {
+            'url': ['slug'],
+            'logo_url': ['logo'],
+            'banner_url': ['banner'],
+            'product_count': ['num_products'],
+        }
+        annotations = {
+            'num_products': Count(
+                'products', filter=Q(products__is_active=True, products__status='published')
+            ),
+        }
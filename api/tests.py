@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from market.models import Category, Product, ProductImage, Shop
+from .serializers import ProductSerializer, parse_fields
+
+User = get_user_model()
+
+
+class FieldsPlanTests(TestCase):
+
+    def plan(self, fields):
+        return ProductSerializer.plan(Product.objects.all(), parse_fields(fields))
+
+    def test_parse_fields(self):
+        self.assertEqual(parse_fields('id, name,shop.name,shop.slug,'), {
+            'id': {}, 'name': {}, 'shop': {'name': {}, 'slug': {}},
+        })
+        self.assertIsNone(parse_fields(''))
+
+    def test_plain_fields_load_only_their_columns(self):
+        queryset = self.plan('name,url')
+        self.assertFalse(queryset.query.select_related)
+        self.assertFalse(queryset._prefetch_related_lookups)
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'name', 'slug'}, False))
+
+    def test_nested_fields_join_the_relation(self):
+        queryset = self.plan('name,shop.name')
+        self.assertEqual(queryset.query.select_related, {'shop': {}})
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'name', 'shop', 'shop__id', 'shop__name'}, False))
+
+    def test_many_fields_prefetch_planned_queryset(self):
+        queryset = self.plan('id,images.url')
+        prefetch, = queryset._prefetch_related_lookups
+        self.assertEqual(prefetch.prefetch_to, 'images')
+        self.assertEqual(prefetch.queryset.query.deferred_loading, ({'id', 'product', 'image'}, False))
+
+    def test_default_fields(self):
+        queryset = self.plan(None)
+        self.assertEqual(queryset.query.select_related, {'category': {}, 'shop': {}})
+        self.assertEqual([prefetch.prefetch_to for prefetch in queryset._prefetch_related_lookups], ['images'])
+
+
+class CatalogApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Vyakula', slug='vyakula')
+        for index in range(3):
+            seller = User.objects.create_user(email=f'seller{index}@example.com', password='x', user_type='seller')
+            shop = Shop.objects.create(seller=seller, name=f'Duka {index}', slug=f'duka-{index}')
+            product = Product.objects.create(
+                name=f'Unga {index}', slug=f'unga-{index}', description='', price=Decimal('1000'),
+                stock_quantity=5, category=category, shop=shop, status='published',
+            )
+            ProductImage.objects.create(product=product, image=f'uuid-{index}', is_primary=True)
+
+    def get(self, path, **params):
+        return self.client.get(path, params, HTTP_ACCEPT='application/json')
+
+    def test_sparse_fields(self):
+        with self.assertNumQueries(1):
+            response = self.get('/api/products/', fields='id,name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+
+    def test_nested_fields_are_joined(self):
+        with self.assertNumQueries(1):
+            response = self.get('/api/products/', fields='name,shop.name,category.slug')
+        results = response.json()['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(set(results[0]['shop']), {'name'})
+        self.assertEqual(results[0]['category'], {'slug': 'vyakula'})
+
+    def test_many_fields_are_prefetched_once(self):
+        with self.assertNumQueries(2):
+            response = self.get('/api/products/', fields='name,images.url')
+        self.assertEqual([len(product['images']) for product in response.json()['results']], [1, 1, 1])
+
+    def test_default_fields(self):
+        with self.assertNumQueries(2):
+            response = self.get('/api/products/')
+        self.assertIn('thumbnail_url', response.json()['results'][0])
+
+    def test_unknown_field(self):
+        self.assertEqual(self.get('/api/products/', fields='id,secret').status_code, 400)
+        self.assertEqual(self.get('/api/products/', fields='id,shop.secret').status_code, 400)
+
+    def test_annotated_field(self):
+        response = self.get('/api/categories/', fields='slug,product_count')
+        self.assertEqual(response.json()['results'], [{'slug': 'vyakula', 'product_count': 3}])
@@ -0,0 +1,11 @@
+from rest_framework.routers import DefaultRouter
+from . import views
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('products', views.ProductViewSet, basename='product')
+router.register('categories', views.CategoryViewSet, basename='category')
+router.register('shops', views.ShopViewSet, basename='shop')
+
+urlpatterns = router.urls
@@ -0,0 +1,86 @@
+from django.utils.functional import cached_property
+from rest_framework import viewsets
+
+from market.models import Category, Product, Shop
+from .pagination import CatalogCursorPagination, NameCursorPagination
+from .serializers import (
+    CategorySerializer, ProductSerializer, ShopSerializer, parse_fields
+)
+
+
+class CatalogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only catalog endpoint with sparse fieldsets.
+
+    ``?fields=id,name,shop.name`` selects the returned fields; the queryset is
+    planned from the same selection so unrequested relations are never loaded.
+    Subclasses set ``queryset`` and narrow it by query parameters in
+    ``filter_params``.
+    """
+    lookup_field = 'slug'
+
+    @cached_property
+    def fields_tree(self):
+        return parse_fields(self.request.query_params.get('fields'))
+
+    def filter_params(self, queryset):
+        return queryset
+
+    def get_queryset(self):
+        ordering_columns = [column.lstrip('-') for column in self.pagination_class.ordering]
+        return self.serializer_class.plan(
+            self.filter_params(super().get_queryset()), self.fields_tree, extra_columns=ordering_columns
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['fields'] = self.fields_tree
+        return super().get_serializer(*args, **kwargs)
+
+
+class ProductViewSet(CatalogViewSet):
+    queryset = Product.objects.filter(is_active=True, status='published')
+    serializer_class = ProductSerializer
+    pagination_class = CatalogCursorPagination
+
+    def filter_params(self, queryset):
+        params = self.request.query_params
+
+        if params.get('category'):
+            queryset = queryset.filter(category__slug=params['category'])
+        if params.get('shop'):
+            queryset = queryset.filter(shop__slug=params['shop'])
+        if params.get('featured') in ('1', 'true'):
+            queryset = queryset.filter(is_featured=True)
+        try:
+            if params.get('min_price'):
+                queryset = queryset.filter(price__gte=float(params['min_price']))
+            if params.get('max_price'):
+                queryset = queryset.filter(price__lte=float(params['max_price']))
+        except ValueError:
+            pass
+        return queryset
+
+
+class CategoryViewSet(CatalogViewSet):
+    queryset = Category.objects.filter(is_active=True)
+    serializer_class = CategorySerializer
+    pagination_class = NameCursorPagination
+
+    def filter_params(self, queryset):
+        parent = self.request.query_params.get('parent')
+        if parent == 'root':
+            queryset = queryset.filter(parent__isnull=True)
+        elif parent:
+            queryset = queryset.filter(parent__slug=parent)
+        return queryset
+
+
+class ShopViewSet(CatalogViewSet):
+    queryset = Shop.objects.filter(is_active=True)
+    serializer_class = ShopSerializer
+    pagination_class = CatalogCursorPagination
+
+    def filter_params(self, queryset):
+        if self.request.query_params.get('region'):
+            queryset = queryset.filter(region__iexact=self.request.query_params['region'])
+        return queryset
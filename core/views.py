@@ -1,8 +1,17 @@
 
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition
 from django.utils.translation import gettext_lazy as _
 from market.models import Category, Product,HomeSlider
+from market.conditional import listing_etag
+from market.surrogate import (
+    CATEGORIES_KEY, HOME_KEY, PRODUCTS_KEY, add_surrogate_keys, category_key, tag_products
+)
 
+@condition(etag_func=listing_etag)
 def home(request):
     # Get featured categories and products
     featured_categories = Category.objects.filter(is_active=True)[:6]
@@ -20,6 +29,12 @@ def home(request):
         is_sponsored=True
     )[:4]
 
+    tag_products(request, [*featured_products, *sponsored_products])
+    add_surrogate_keys(
+        request, HOME_KEY, PRODUCTS_KEY, CATEGORIES_KEY,
+        *(category_key(category.pk) for category in featured_categories),
+    )
+
     context = {
         'welcome_message': _('Welcome to SokoLetu'),
         'tagline': _('Your Modern Tanzanian Online Marketplace'),
@@ -28,4 +43,10 @@ def home(request):
         'sponsored_products': sponsored_products,
         'sliders':sliders
     }
-    return render(request, 'home.html', context)
\ No newline at end of file
+    return render(request, 'home.html', context)
+
+@never_cache
+@ensure_csrf_cookie
+def csrf_cookie(request):
+    """Sets the CSRF cookie for visitors served a cached page that did not set one"""
+    return HttpResponse(status=204)
@@ -10,14 +10,15 @@ UPLOADCARE_PUBLIC_KEY = '5ff964c3b9a85a1e2697'
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
-    list_display = ('room_id', 'room_type', 'created_at', 'updated_at')
+    list_display = ('room_id', 'room_type', 'last_message_at', 'created_at', 'updated_at')
     list_filter = ('room_type', 'created_at')
     search_fields = ('room_id',)
     filter_horizontal = ('participants',)
+    readonly_fields = ('last_message', 'last_message_preview', 'last_message_at', 'last_message_sender')
 
 @admin.register(ChatParticipant)
 class ChatParticipantAdmin(admin.ModelAdmin):
-    list_display = ('user', 'room', 'joined_at', 'is_online', 'last_seen')
+    list_display = ('user', 'room', 'joined_at', 'is_online', 'last_seen', 'unread_count')
     list_filter = ('is_online', 'joined_at')
     search_fields = ('user__email', 'room__room_id')
 
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+
+def _lock_key(key):
+    return f"{key}:refreshing"
+
+
+def _refresh(key, compute, timeout):
+    """Recompute ``key`` and store it with the time it was computed"""
+    value = compute()
+    cache.set(key, {'value': value, 'computed_at': time.time()}, timeout)
+    return value
+
+
+def _refresh_in_background(key, compute, timeout):
+    def run():
+        try:
+            _refresh(key, compute, timeout)
+        except Exception as e:
+            print(f"Background refresh error for {key}: {e}")
+        finally:
+            cache.delete(_lock_key(key))
+            # The thread opened its own connection; don't leave it to the server to time out
+            connection.close()
+
+    threading.Thread(target=run, name=f"refresh {key}", daemon=True).start()
+
+
+def stale_while_revalidate(key, compute, soft_ttl, timeout, lock_timeout=30, placeholder=None):
+    """
+    Cached value of ``compute()``, refreshed at most once at a time per key.
+
+    Entries older than ``soft_ttl`` seconds are still returned straight away
+    while one background thread recomputes them; the refresh lock is a
+    ``cache.add`` on the shared cache so only the request that wins it starts
+    a recomputation, however many tabs or processes are polling. With nothing
+    cached yet the lock holder computes inline and everyone else gets
+    ``placeholder`` at once, picking up the value on their next poll.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        if time.time() - entry['computed_at'] > soft_ttl and cache.add(_lock_key(key), 1, lock_timeout):
+            _refresh_in_background(key, compute, timeout)
+        return entry['value']
+
+    if cache.add(_lock_key(key), 1, lock_timeout):
+        try:
+            return _refresh(key, compute, timeout)
+        finally:
+            cache.delete(_lock_key(key))
+    # Waiting here would hold a worker for every poll that arrives during the computation
+    return placeholder
+
+
+def cached_seller_analytics(user, compute, placeholder=None):
+    """``compute()``'s analytics payload for ``user`` with stale-while-revalidate caching"""
+    return stale_while_revalidate(
+        getattr(settings, 'DASHBOARD_ANALYTICS_CACHE', 'dashboard_analytics_{seller_id}').format(seller_id=user.pk),
+        compute,
+        soft_ttl=getattr(settings, 'DASHBOARD_ANALYTICS_SOFT_TTL', 30),
+        timeout=getattr(settings, 'DASHBOARD_ANALYTICS_CACHE_TIMEOUT', 60 * 15),
+        placeholder=placeholder,
+    )
@@ -0,0 +1,58 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message):
+    """Opaque cursor for the position just before ``message``"""
+    raw = f"{message.created_at.isoformat()}|{message.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor {cursor!r}") from e
+
+
+def message_page(room, before=None, limit=None):
+    """
+    The ``limit`` messages of ``room`` just older than the ``before`` cursor, oldest first.
+
+    Without a cursor this is the latest page. Rows are read newest first off
+    the (room, created_at, id) index and the id breaks ties between messages
+    saved in the same batch, so pages never skip or repeat a message.
+    Returns (messages, cursor for the next older page or None).
+    """
+    page_size = getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50)
+    limit = max(1, min(limit or page_size, getattr(settings, 'CHAT_HISTORY_MAX_PAGE_SIZE', 100)))
+
+    messages = room.messages.select_related('sender').order_by('-created_at', '-id')
+    if before:
+        created_at, pk = decode_cursor(before)
+        messages = messages.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    messages = list(messages[:limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit][::-1]
+    return messages, encode_cursor(messages[0]) if has_more else None
+
+
+def serialize_message(message):
+    """A message in the shape ChatConsumer broadcasts new messages in"""
+    return {
+        'message': message.content,
+        'message_id': message.pk,
+        'message_type': message.message_type,
+        'sender_id': message.sender_id,
+        'sender_name': message.sender.get_full_name() or message.sender.email,
+        'timestamp': message.created_at.isoformat(),
+    }
@@ -0,0 +1,86 @@
+import asyncio
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .events import push_chat_message
+from .models import ChatMessage, record_new_messages
+
+
+def _save_messages(batch):
+    """INSERT a batch of (message, seller_ids) in one statement and tell the sellers"""
+    messages = [message for message, _ in batch]
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(messages)
+        # bulk_create skips post_save, so the ChatMessage receivers never see these
+        record_new_messages(messages)
+        for message, seller_ids in batch:
+            push_chat_message(message, seller_ids)
+    return messages
+
+
+class ChatMessageWriter:
+    """
+    Collects chat messages from every consumer in the process and saves them with bulk_create.
+
+    A batch is written ``delay`` seconds after its first message or as soon as
+    ``batch_size`` messages are waiting. ``write`` returns once its message is
+    saved, with ``id`` and ``created_at`` filled in.
+    """
+
+    def __init__(self, delay, batch_size):
+        self.delay = delay
+        self.batch_size = batch_size
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    async def write(self, message, seller_ids=()):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message, seller_ids, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._save(batch))
+            # The loop only keeps weak references to tasks
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _save(self, batch):
+        try:
+            await database_sync_to_async(_save_messages)([(message, seller_ids) for message, seller_ids, _ in batch])
+        except Exception as e:
+            print(f"Chat message write error: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for message, _, future in batch:
+            # The sender may have disconnected while the batch was being written
+            if not future.done():
+                future.set_result(message)
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def chat_writer():
+    """The running event loop's ChatMessageWriter"""
+    loop = asyncio.get_running_loop()
+    if loop not in _writers:
+        _writers[loop] = ChatMessageWriter(
+            delay=getattr(settings, 'CHAT_WRITE_BATCH_DELAY', 0.005),
+            batch_size=getattr(settings, 'CHAT_WRITE_BATCH_SIZE', 100),
+        )
+    return _writers[loop]
@@ -1,7 +1,11 @@
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+from .chat_history import message_page, serialize_message
+from .chat_writer import chat_writer
+from .events import metrics_event, seller_group
 from .models import ChatRoom, ChatMessage, ChatParticipant
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -10,6 +14,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.room_group_name = f'chat_{self.room_id}'
         self.user = self.scope['user']
 
+        # Room and participants are looked up once; messages and status updates reuse them
+        membership = None
+        if not isinstance(self.user, AnonymousUser):
+            membership = await self.get_membership()
+        if membership is None:
+            await self.close()
+            return
+        self.room, self.participant_id, self.seller_ids = membership
+        self.user_name = self.user.get_full_name() or self.user.email
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -19,22 +33,24 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
         
         # Update user online status
-        if not isinstance(self.user, AnonymousUser):
-            await self.update_user_online_status(True)
-            
-            # Send join notification
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_status',
-                    'user_id': self.user.id,
-                    'username': self.user.get_full_name() or self.user.email,
-                    'is_online': True,
-                    'message': 'joined the chat'
-                }
-            )
+        await self.update_user_online_status(True)
+        
+        # Send join notification
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'user_status',
+                'user_id': self.user.id,
+                'username': self.user_name,
+                'is_online': True,
+                'message': 'joined the chat'
+            }
+        )
 
     async def disconnect(self, close_code):
+        if not hasattr(self, 'room'):
+            return
+
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -42,20 +58,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         # Update user offline status
-        if not isinstance(self.user, AnonymousUser):
-            await self.update_user_online_status(False)
-            
-            # Send leave notification
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_status',
-                    'user_id': self.user.id,
-                    'username': self.user.get_full_name() or self.user.email,
-                    'is_online': False,
-                    'message': 'left the chat'
-                }
-            )
+        await self.update_user_online_status(False)
+        
+        # Send leave notification
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'user_status',
+                'user_id': self.user.id,
+                'username': self.user_name,
+                'is_online': False,
+                'message': 'left the chat'
+            }
+        )
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
@@ -64,8 +79,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if message_type == 'chat_message':
             message = text_data_json['message']
             
-            # Save message to database
-            saved_message = await self.save_message(message)
+            # Saved together with other messages sent in the same few milliseconds
+            saved_message = await chat_writer().write(
+                ChatMessage(room=self.room, sender=self.user, content=message, message_type='text'),
+                self.seller_ids,
+            )
             
             # Send message to room group
             await self.channel_layer.group_send(
@@ -75,18 +93,34 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     'message': message,
                     'message_id': saved_message.id,
                     'sender_id': self.user.id,
-                    'sender_name': self.user.get_full_name() or self.user.email,
+                    'sender_name': self.user_name,
                     'timestamp': saved_message.created_at.isoformat(),
                 }
             )
         
+        elif message_type == 'history':
+            # Backfill of older messages for a client scrolling up
+            try:
+                messages, next_cursor = await self.get_history(text_data_json.get('before'), text_data_json.get('limit'))
+            except ValueError as e:
+                await self.send(text_data=json.dumps({'type': 'error', 'message': str(e)}))
+                return
+            await self.send(text_data=json.dumps({
+                'type': 'history',
+                'messages': messages,
+                'next_cursor': next_cursor,
+            }))
+        
+        elif message_type == 'read':
+            await self.mark_read()
+        
         elif message_type == 'typing':
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'typing_indicator',
                     'user_id': self.user.id,
-                    'username': self.user.get_full_name() or self.user.email,
+                    'username': self.user_name,
                     'is_typing': text_data_json['is_typing']
                 }
             )
@@ -122,24 +156,63 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     @database_sync_to_async
-    def save_message(self, message_content):
-        """Save message to database"""
-        room = ChatRoom.objects.get(room_id=self.room_id)
-        message = ChatMessage.objects.create(
-            room=room,
-            sender=self.user,
-            content=message_content,
-            message_type='text'
+    def get_membership(self):
+        """The room, the user's participant row and the sellers to notify, or None if the user is not in the room"""
+        participants = list(
+            ChatParticipant.objects.filter(room__room_id=self.room_id)
+            .select_related('room', 'user')
         )
-        return message
+        own = next((participant for participant in participants if participant.user_id == self.user.id), None)
+        if own is None:
+            return None
+        seller_ids = [
+            participant.user_id for participant in participants
+            if participant is not own and participant.user.user_type in ('seller', 'both')
+        ]
+        return own.room, own.pk, seller_ids
+
+    @database_sync_to_async
+    def get_history(self, before, limit):
+        messages, next_cursor = message_page(self.room, before=before, limit=int(limit) if limit else None)
+        return [serialize_message(message) for message in messages], next_cursor
+
+    @database_sync_to_async
+    def mark_read(self):
+        self.room.mark_read(self.user)
 
     @database_sync_to_async
     def update_user_online_status(self, is_online):
         """Update user online status"""
-        room = ChatRoom.objects.get(room_id=self.room_id)
-        participant, created = ChatParticipant.objects.get_or_create(
-            user=self.user,
-            room=room
+        ChatParticipant.objects.filter(pk=self.participant_id).update(
+            is_online=is_online, last_seen=timezone.now()
         )
-        participant.is_online = is_online
-        participant.save()
\ No newline at end of file
+
+class SellerMetricsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live feed for a seller's open dashboard.
+
+    Sends the current figures on connect, then relays whatever dashboard.events
+    pushes to the seller's group: paid orders, refreshed figures, low-stock
+    alerts and new chat messages.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if isinstance(self.user, AnonymousUser) or not self.user.is_seller:
+            await self.close()
+            return
+
+        self.group_name = seller_group(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        event = await database_sync_to_async(metrics_event)(self.user.id)
+        if event is not None:
+            await self.send_json(event)
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def seller_event(self, event):
+        await self.send_json(event['event'])
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from market.models import Product
+from .metrics import LOW_STOCK_THRESHOLD, seller_metrics_query
+
+# Figures the dashboard cards show; pushed after every sale or refund
+LIVE_METRICS = ('total_sales', 'monthly_revenue', 'total_orders', 'total_customers', 'today_sales', 'today_orders')
+
+
+def seller_group(seller_id):
+    """Channel group of a seller's open dashboards"""
+    return f"seller_{seller_id}"
+
+
+def _send(seller_id, event):
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            seller_group(seller_id), {'type': 'seller.event', 'event': event}
+        )
+    except Exception as e:
+        # Dashboards catch up on their next page load
+        print(f"Dashboard push error: {e}")
+
+
+def push(seller_id, event):
+    """Send ``event`` to the seller's dashboards once the current transaction commits"""
+    transaction.on_commit(lambda: _send(seller_id, event))
+
+
+def metrics_event(seller_id):
+    shop = seller_metrics_query(seller_id).first()
+    if shop is None:
+        return None
+    event = {'type': 'metrics'}
+    for name in LIVE_METRICS:
+        value = getattr(shop, name)
+        # Channel layers serialize with msgpack, which has no Decimal
+        event[name] = float(value) if isinstance(value, Decimal) else value
+    return event
+
+
+def push_sales(seller_id, shop_orders):
+    """
+    Announce paid sub-orders and refreshed figures to a seller.
+
+    ``shop_orders`` are dicts with ``order__order_number``, ``subtotal`` and
+    ``item_count`` for sub-orders that just became sales.
+    """
+    for shop_order in shop_orders:
+        push(seller_id, {
+            'type': 'order',
+            'order_number': shop_order['order__order_number'],
+            'subtotal': float(shop_order['subtotal']),
+            'item_count': shop_order['item_count'],
+        })
+
+    def send_metrics():
+        event = metrics_event(seller_id)
+        if event is not None:
+            _send(seller_id, event)
+
+    transaction.on_commit(send_metrics)
+
+
+def push_low_stock(product_ids):
+    """Warn sellers about products among ``product_ids`` at or below the low-stock threshold"""
+    def send():
+        for product in Product.objects.filter(
+            pk__in=product_ids, stock_quantity__lte=LOW_STOCK_THRESHOLD
+        ).values('pk', 'name', 'stock_quantity', 'shop__seller_id'):
+            _send(product['shop__seller_id'], {
+                'type': 'low_stock',
+                'product_id': product['pk'],
+                'name': product['name'],
+                'stock_quantity': product['stock_quantity'],
+            })
+
+    transaction.on_commit(send)
+
+
+def push_chat_message(message, seller_ids):
+    for seller_id in seller_ids:
+        push(seller_id, {
+            'type': 'chat_message',
+            'room_id': message.room.room_id,
+            'sender_name': message.sender.get_full_name() or message.sender.email,
+            'preview': message.content[:100],
+        })
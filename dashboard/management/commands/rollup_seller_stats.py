@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from dashboard.rollups import rollup_seller_stats
+
+class Command(BaseCommand):
+    help = 'Roll up paid sub-orders into DailyStats and SellerAnalytics for the seller dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=2,
+            help='Number of recent days, including today, to recompute (default: 2)'
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute every day since the first order and the per-product sales stats'
+        )
+
+    def handle(self, *args, **options):
+        days = rollup_seller_stats(days=options['days'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up seller stats for {len(days)} day(s)'))
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.db.models import (
+    Count, DecimalField, F, FilteredRelation, IntegerField, OuterRef, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from market.models import Product, Shop
+
+# Figures annotated by seller_metrics_query
+METRICS = (
+    'total_sales', 'total_orders', 'monthly_revenue', 'total_products', 'total_customers',
+    'today_sales', 'today_orders', 'weekly_sales', 'weekly_orders',
+    'active_products', 'low_stock_products', 'new_customers_week', 'total_views',
+)
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+LOW_STOCK_THRESHOLD = 10
+
+
+def _sum(field, condition, output_field):
+    return Coalesce(Sum(field, filter=condition), Value(0), output_field=output_field)
+
+
+def _product_count(**filters):
+    products = (
+        Product.objects.filter(shop=OuterRef('pk'), **filters)
+        .order_by()
+        .values('shop')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(products, output_field=IntegerField()), Value(0))
+
+
+def seller_metrics_query(user, today=None):
+    """
+    The user's shop annotated with every dashboard figure, as one SELECT.
+
+    The last 30 DailyStats rows are joined once and split into today, week and
+    month with conditional aggregates; all-time totals come from the seller's
+    single SellerAnalytics row and product counts from scalar subqueries.
+    """
+    today = today or timezone.localdate()
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+    return Shop.objects.filter(seller=user).annotate(
+        recent=FilteredRelation(
+            'seller__daily_stats', condition=Q(seller__daily_stats__date__gte=month_ago)
+        ),
+    ).annotate(
+        monthly_revenue=_sum('recent__sales', None, MONEY),
+        today_sales=_sum('recent__sales', Q(recent__date=today), MONEY),
+        today_orders=_sum('recent__orders', Q(recent__date=today), IntegerField()),
+        weekly_sales=_sum('recent__sales', Q(recent__date__gte=week_ago), MONEY),
+        weekly_orders=_sum('recent__orders', Q(recent__date__gte=week_ago), IntegerField()),
+        new_customers_week=_sum('recent__new_customers', Q(recent__date__gte=week_ago), IntegerField()),
+        total_sales=Coalesce(F('seller__analytics__total_sales'), Value(0), output_field=MONEY),
+        total_orders=Coalesce(F('seller__analytics__total_orders'), Value(0)),
+        total_customers=Coalesce(F('seller__analytics__total_customers'), Value(0)),
+        total_views=Coalesce(F('seller__analytics__total_views'), Value(0)),
+        total_products=_product_count(),
+        active_products=_product_count(is_active=True),
+        low_stock_products=_product_count(stock_quantity__lte=LOW_STOCK_THRESHOLD),
+    )
+
+
+def seller_metrics(request):
+    """
+    The current seller's annotated shop, or None; computed once per request.
+
+    seller_dashboard, analytics_view and the JSON endpoints all read their
+    figures through this, so a page never pays for the query twice.
+    """
+    if not hasattr(request, '_seller_metrics'):
+        request._seller_metrics = seller_metrics_query(request.user).first()
+    return request._seller_metrics
+
+
+def metrics_dict(shop):
+    """The figures annotated on ``shop`` by seller_metrics_query, in calculate_seller_analytics' shape"""
+    analytics = {name: getattr(shop, name) for name in METRICS}
+    analytics['average_rating'] = shop.rating or 4.5
+    return analytics
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_last_message_and_unread(apps, schema_editor):
+    """Copy each room's newest message onto it and count what participants have not read"""
+    ChatRoom = apps.get_model('dashboard', 'ChatRoom')
+    ChatParticipant = apps.get_model('dashboard', 'ChatParticipant')
+    ChatMessage = apps.get_model('dashboard', 'ChatMessage')
+
+    for room in ChatRoom.objects.all():
+        message = ChatMessage.objects.filter(room=room).order_by('-created_at', '-id').first()
+        if message is not None:
+            ChatRoom.objects.filter(pk=room.pk).update(
+                last_message=message,
+                last_message_preview=message.content[:100],
+                last_message_at=message.created_at,
+                last_message_sender_id=message.sender_id,
+            )
+
+    for participant in ChatParticipant.objects.all():
+        unread = ChatMessage.objects.filter(
+            room_id=participant.room_id, is_read=False
+        ).exclude(sender_id=participant.user_id).count()
+        if unread:
+            ChatParticipant.objects.filter(pk=participant.pk).update(unread_count=unread)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dashboard', '0003_chatmessage_dashboard_c_room_id_a0cd52_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='unread messages'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.chatmessage', verbose_name='last message'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='last message at'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=100, verbose_name='last message preview'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='last message sender'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['-last_message_at'], name='dashboard_c_last_me_6a7b05_idx'),
+        ),
+        migrations.RunPython(fill_last_message_and_unread, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+from collections import Counter
+
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
@@ -28,19 +31,48 @@ class ChatRoom(models.Model):
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
 
+    # Copied from the newest message by record_new_messages so room lists never read messages
+    last_message = models.ForeignKey(
+        'ChatMessage',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name=_('last message')
+    )
+    last_message_preview = models.CharField(_('last message preview'), max_length=100, blank=True)
+    last_message_at = models.DateTimeField(_('last message at'), blank=True, null=True)
+    last_message_sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name=_('last message sender')
+    )
+
     class Meta:
         verbose_name = _('chat room')
         verbose_name_plural = _('chat rooms')
+        indexes = [
+            models.Index(fields=['-last_message_at']),
+        ]
 
     def __str__(self):
         return f"ChatRoom {self.room_id}"
 
+    def mark_read(self, user):
+        """Mark the messages others sent in the room as read and clear the user's unread counter"""
+        self.messages.filter(is_read=False).exclude(sender=user).update(is_read=True)
+        ChatParticipant.objects.filter(room=self, user=user).update(unread_count=0)
+
 class ChatParticipant(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
     joined_at = models.DateTimeField(_('joined at'), auto_now_add=True)
     is_online = models.BooleanField(_('is online'), default=False)
     last_seen = models.DateTimeField(_('last seen'), auto_now=True)
+    unread_count = models.PositiveIntegerField(_('unread messages'), default=0)
 
     class Meta:
         unique_together = ['user', 'room']
@@ -112,6 +144,10 @@ class ChatMessage(models.Model):
         verbose_name = _('chat message')
         verbose_name_plural = _('chat messages')
         ordering = ['created_at']
+        indexes = [
+            # History pages walk a room's messages by (created_at, id)
+            models.Index(fields=['room', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.email} in {self.room.room_id}"
@@ -149,6 +185,39 @@ class MessageReadReceipt(models.Model):
     class Meta:
         unique_together = ['user', 'message']
 
+
+def record_new_messages(messages):
+    """
+    Update the rooms' last message and the other participants' unread counters for new ``messages``.
+
+    The last message only ever moves forward, so batches saved out of order
+    cannot leave an older message on the room.
+    """
+    latest = {}
+    unread = Counter()
+    for message in messages:
+        current = latest.get(message.room_id)
+        if current is None or (message.created_at, message.pk) > (current.created_at, current.pk):
+            latest[message.room_id] = message
+        unread[message.room_id, message.sender_id] += 1
+
+    for room_id, message in latest.items():
+        ChatRoom.objects.filter(
+            Q(last_message_at__isnull=True)
+            | Q(last_message_at__lt=message.created_at)
+            | Q(last_message_at=message.created_at, last_message_id__lt=message.pk),
+            pk=room_id,
+        ).update(
+            last_message=message,
+            last_message_preview=message.content[:100],
+            last_message_at=message.created_at,
+            last_message_sender_id=message.sender_id,
+        )
+    for (room_id, sender_id), count in unread.items():
+        ChatParticipant.objects.filter(room_id=room_id).exclude(user_id=sender_id).update(
+            unread_count=F('unread_count') + count
+        )
+
 class SellerAnalytics(models.Model):
     seller = models.OneToOneField(
         User,
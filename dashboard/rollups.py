@@ -0,0 +1,173 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.utils import timezone
+
+from market.models import ProductSalesStats, Shop
+from market.rollups import day_start
+from orders.models import OrderItem, ShopOrder
+from .models import DailyStats, SellerAnalytics
+
+
+def rollup_sales_day(day):
+    """Recompute every seller's sales, orders and new customers for ``day`` from paid, uncancelled sub-orders"""
+    paid = ShopOrder.objects.filter(payment_status='paid').exclude(status='cancelled')
+    earlier = paid.filter(
+        shop=OuterRef('shop'), customer=OuterRef('customer'), created_at__lt=day_start(day)
+    )
+    rows = paid.filter(
+        created_at__gte=day_start(day),
+        created_at__lt=day_start(day + timedelta(days=1)),
+    ).values('shop__seller_id').annotate(
+        sales=Sum('subtotal'),
+        orders=Count('id'),
+        new_customers=Count('customer', distinct=True, filter=~Exists(earlier)),
+    )
+    stats = [
+        DailyStats(
+            seller_id=row['shop__seller_id'],
+            date=day,
+            sales=row['sales'],
+            orders=row['orders'],
+            new_customers=row['new_customers'],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        # Sellers whose sales that day were all refunded or failed since the last run
+        DailyStats.objects.filter(date=day).exclude(
+            seller_id__in=[stat.seller_id for stat in stats]
+        ).update(sales=0, orders=0, new_customers=0)
+        # Views for the day are filled in by rollup_product_views
+        DailyStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['seller', 'date'],
+            update_fields=['sales', 'orders', 'new_customers'],
+        )
+    return len(stats)
+
+
+def refresh_seller_analytics(seller_ids=None):
+    """
+    Rebuild SellerAnalytics totals from DailyStats rows.
+
+    ``new_customers`` counts a customer only on their first paid order with
+    the seller, so its sum is the seller's distinct customers.
+    """
+    shops = Shop.objects.annotate(products_total=Count('products'))
+    if seller_ids is not None:
+        shops = shops.filter(seller_id__in=seller_ids)
+    shops = {shop.seller_id: shop for shop in shops}
+
+    month_ago = timezone.localdate() - timedelta(days=30)
+    totals = {
+        row['seller_id']: row
+        for row in DailyStats.objects.filter(seller_id__in=shops).values('seller_id').annotate(
+            total_sales=Sum('sales'),
+            total_orders=Sum('orders'),
+            total_views=Sum('views'),
+            total_customers=Sum('new_customers'),
+            monthly_revenue=Sum('sales', filter=Q(date__gte=month_ago)),
+        )
+    }
+    repeat_customers = Counter(
+        row['shop__seller_id']
+        for row in ShopOrder.objects.filter(
+            payment_status='paid', shop__seller_id__in=shops
+        ).exclude(status='cancelled').values('shop__seller_id', 'customer').annotate(orders=Count('id')).filter(orders__gt=1)
+    )
+
+    analytics = []
+    for seller_id, shop in shops.items():
+        row = totals.get(seller_id, {})
+        analytics.append(SellerAnalytics(
+            seller_id=seller_id,
+            total_sales=row.get('total_sales') or 0,
+            total_orders=row.get('total_orders') or 0,
+            monthly_revenue=row.get('monthly_revenue') or 0,
+            total_products=shop.products_total,
+            total_views=row.get('total_views') or 0,
+            total_customers=row.get('total_customers') or 0,
+            repeat_customers=repeat_customers[seller_id],
+            average_rating=shop.rating,
+        ))
+    SellerAnalytics.objects.bulk_create(
+        analytics,
+        update_conflicts=True,
+        unique_fields=['seller'],
+        update_fields=[
+            'total_sales', 'total_orders', 'monthly_revenue', 'total_products', 'total_views',
+            'total_customers', 'repeat_customers', 'average_rating', 'last_updated',
+        ],
+    )
+    return len(analytics)
+
+
+def refresh_product_sales_stats():
+    """Rebuild every ProductSalesStats row from the lines of paid, uncancelled sub-orders"""
+    rows = OrderItem.objects.filter(
+        shop_order__payment_status='paid'
+    ).exclude(shop_order__status='cancelled').values(
+        'product_id', 'product__shop_id', 'product__category_id'
+    ).annotate(
+        units_sold=Sum('quantity'),
+        revenue=Sum('total_price'),
+        order_count=Count('shop_order', distinct=True),
+        last_sold_at=Max('shop_order__created_at'),
+    )
+    stats = [
+        ProductSalesStats(
+            product_id=row['product_id'],
+            shop_id=row['product__shop_id'],
+            category_id=row['product__category_id'],
+            units_sold=row['units_sold'],
+            revenue=row['revenue'],
+            order_count=row['order_count'],
+            last_sold_at=row['last_sold_at'],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        # Products whose every sale has since been refunded or cancelled
+        ProductSalesStats.objects.exclude(
+            product_id__in=[stat.product_id for stat in stats]
+        ).update(units_sold=0, revenue=0, order_count=0, last_sold_at=None)
+        ProductSalesStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['shop', 'category', 'units_sold', 'revenue', 'order_count', 'last_sold_at'],
+        )
+    return len(stats)
+
+
+def rollup_seller_stats(days=2, full=False):
+    """
+    Recompute DailyStats for today and the previous ``days - 1`` days, then seller totals.
+
+    Payments settle and get refunded after the order day, so recent days are
+    recomputed on every run; ``full`` rebuilds every day since the first order
+    and the per-product sales stats. Returns the days rolled up.
+    """
+    today = timezone.localdate()
+    first = today - timedelta(days=max(days, 1) - 1)
+    if full:
+        oldest = ShopOrder.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if oldest is not None:
+            first = min(first, timezone.localdate(oldest))
+
+    rolled = []
+    day = first
+    while day <= today:
+        rollup_sales_day(day)
+        rolled.append(day)
+        day += timedelta(days=1)
+    refresh_seller_analytics()
+    if full:
+        refresh_product_sales_stats()
+    return rolled
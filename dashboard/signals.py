@@ -0,0 +1,148 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import DatabaseError, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from market.rollups import day_start
+from market.models import ProductSalesStats
+from orders.models import OrderItem, ShopOrder
+from orders.signals import shop_order_sales_changed, stock_changed
+from .events import push_chat_message, push_low_stock, push_sales
+from .models import ChatMessage, ChatParticipant, DailyStats, SellerAnalytics, record_new_messages
+
+logger = logging.getLogger(__name__)
+
+
+def _add(model, lookup, deltas, defaults=None, **updates):
+    """Add ``deltas`` to the row matching ``lookup`` in one UPDATE, creating it if needed"""
+    row, _ = model.objects.get_or_create(**lookup, defaults=defaults)
+    model.objects.filter(pk=row.pk).update(**{
+        field: Greatest(F(field) + delta, Value(type(delta)(0)))
+        for field, delta in deltas.items()
+    }, **updates)
+
+
+def _is_first_sale(shop_order):
+    """Whether ``shop_order`` is the customer's only sale with the shop up to the end of its day"""
+    day_end = day_start(timezone.localdate(shop_order['created_at']) + timedelta(days=1))
+    return not ShopOrder.objects.filter(
+        shop_id=shop_order['shop_id'],
+        customer_id=shop_order['customer_id'],
+        payment_status='paid',
+        created_at__lt=day_end,
+    ).exclude(status='cancelled').exclude(pk=shop_order['pk']).exists()
+
+
+@receiver(shop_order_sales_changed)
+def apply_sales_deltas(sender, changes, **kwargs):
+    """
+    Keep today's DailyStats and the seller's SellerAnalytics live between rollups.
+
+    Runs in the payment's transaction; rollup_seller_stats recomputes the
+    same figures from scratch and corrects any drift.
+    """
+    month_ago = timezone.localdate() - timedelta(days=30)
+    shop_orders = ShopOrder.objects.filter(pk__in=changes).values(
+        'pk', 'shop_id', 'shop__seller_id', 'customer_id', 'subtotal', 'item_count',
+        'created_at', 'order__order_number'
+    )
+    new_sales = {}
+    try:
+        # A failure here must not undo the payment it is reporting
+        with transaction.atomic():
+            for shop_order in shop_orders:
+                sign = changes[shop_order['pk']]
+                sales_of_seller = new_sales.setdefault(shop_order['shop__seller_id'], [])
+                if sign > 0:
+                    sales_of_seller.append(shop_order)
+                day = timezone.localdate(shop_order['created_at'])
+                sales = shop_order['subtotal'] * sign
+                new_customers = sign if _is_first_sale(shop_order) else 0
+
+                _add(DailyStats, {'seller_id': shop_order['shop__seller_id'], 'date': day}, {
+                    'sales': sales,
+                    'orders': sign,
+                    'new_customers': new_customers,
+                })
+                _add(SellerAnalytics, {'seller_id': shop_order['shop__seller_id']}, {
+                    'total_sales': sales,
+                    'total_orders': sign,
+                    'total_customers': new_customers,
+                    'monthly_revenue': sales if day >= month_ago else Decimal('0'),
+                })
+    except DatabaseError:
+        logger.exception("Sales analytics update failed for shop orders %s", sorted(changes))
+        return
+
+    for seller_id, sales in new_sales.items():
+        push_sales(seller_id, sales)
+
+
+@receiver(shop_order_sales_changed)
+def apply_product_sales_deltas(sender, changes, **kwargs):
+    """
+    Add the changed sub-orders' lines to (or take them off) ProductSalesStats.
+
+    A refund does not move last_sold_at back; rollup_seller_stats --full does.
+    """
+    lines = OrderItem.objects.filter(shop_order_id__in=changes).values(
+        'product_id', 'product__shop_id', 'product__category_id',
+        'shop_order_id', 'shop_order__created_at',
+    ).annotate(units=Sum('quantity'), revenue=Sum('total_price'))
+
+    products = {}
+    for line in lines:
+        sign = changes[line['shop_order_id']]
+        product = products.setdefault(line['product_id'], {
+            'shop_id': line['product__shop_id'],
+            'category_id': line['product__category_id'],
+            'deltas': {'units_sold': 0, 'revenue': Decimal('0'), 'order_count': 0},
+            'sold_at': None,
+        })
+        product['deltas']['units_sold'] += line['units'] * sign
+        product['deltas']['revenue'] += line['revenue'] * sign
+        product['deltas']['order_count'] += sign
+        if sign > 0:
+            product['sold_at'] = max(filter(None, [product['sold_at'], line['shop_order__created_at']]))
+
+    try:
+        with transaction.atomic():
+            for product_id, product in products.items():
+                updates = {}
+                if product['sold_at'] is not None:
+                    sold_at = Value(product['sold_at'])
+                    updates['last_sold_at'] = Greatest(Coalesce(F('last_sold_at'), sold_at), sold_at)
+                _add(
+                    ProductSalesStats, {'product_id': product_id}, product['deltas'],
+                    defaults={'shop_id': product['shop_id'], 'category_id': product['category_id']},
+                    **updates
+                )
+    except DatabaseError:
+        logger.exception("Product sales stats update failed for shop orders %s", sorted(changes))
+
+
+@receiver(stock_changed)
+def alert_low_stock(sender, product_ids, **kwargs):
+    push_low_stock(product_ids)
+
+
+@receiver(post_save, sender=ChatMessage)
+def record_chat_message(sender, instance, created, **kwargs):
+    if created:
+        record_new_messages([instance])
+
+
+@receiver(post_save, sender=ChatMessage)
+def notify_sellers_of_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    seller_ids = ChatParticipant.objects.filter(
+        room_id=instance.room_id, user__user_type__in=['seller', 'both']
+    ).exclude(user_id=instance.sender_id).values_list('user_id', flat=True)
+    push_chat_message(instance, seller_ids)
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .caching import _lock_key, stale_while_revalidate
+from .chat_history import InvalidCursor, message_page
+from .chat_writer import ChatMessageWriter
+from market.models import Category, Product, ProductSalesStats, Shop
+from orders.models import Order, OrderItem, ShopOrder
+from orders.payments import mark_paid, transition
+from .models import ChatMessage, ChatParticipant, ChatRoom, DailyStats, SellerAnalytics
+from .views import calculate_seller_analytics
+
+User = get_user_model()
+
+
+@override_settings(CHAT_HISTORY_PAGE_SIZE=10, CHAT_HISTORY_MAX_PAGE_SIZE=20)
+class ChatHistoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        cls.seller = User.objects.create_user(email='seller@example.com', password='x', user_type='seller')
+        cls.room = ChatRoom.objects.create(room_id='room-1')
+        for user in (cls.buyer, cls.seller):
+            ChatParticipant.objects.create(room=cls.room, user=user)
+
+    def add_messages(self, count, created_at):
+        """``count`` messages all saved at ``created_at``, as a single chat write batch would be"""
+        messages = ChatMessage.objects.bulk_create([
+            ChatMessage(room=self.room, sender=self.buyer, content=f"Habari {index}")
+            for index in range(count)
+        ])
+        ChatMessage.objects.filter(pk__in=[message.pk for message in messages]).update(created_at=created_at)
+        return [message.pk for message in messages]
+
+    def all_pages(self, limit=None):
+        """Message ids from the newest page back to the first, oldest first within each page"""
+        pages, cursor = [], None
+        while True:
+            messages, cursor = message_page(self.room, before=cursor, limit=limit)
+            pages.append([message.pk for message in messages])
+            if cursor is None:
+                return pages
+
+    def test_shared_created_at_neither_skips_nor_repeats(self):
+        now = timezone.now()
+        ids = self.add_messages(3, now - timedelta(minutes=1)) + self.add_messages(25, now) + self.add_messages(2, now + timedelta(minutes=1))
+        pages = self.all_pages(limit=7)
+
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 7, 2])
+        self.assertEqual([pk for page in reversed(pages) for pk in page], ids)
+
+    def test_pages_are_oldest_first(self):
+        now = timezone.now()
+        older = self.add_messages(1, now - timedelta(minutes=5))
+        newer = self.add_messages(1, now)
+        messages, cursor = message_page(self.room)
+        self.assertEqual([message.pk for message in messages], older + newer)
+        self.assertIsNone(cursor)
+
+    def test_limit_is_clamped(self):
+        self.add_messages(30, timezone.now())
+        self.assertEqual(len(message_page(self.room)[0]), 10)
+        self.assertEqual(len(message_page(self.room, limit=500)[0]), 20)
+        self.assertEqual(len(message_page(self.room, limit=-3)[0]), 1)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            message_page(self.room, before='not-a-cursor')
+
+    def test_history_view(self):
+        self.add_messages(12, timezone.now())
+        self.client.force_login(self.seller)
+        url = reverse('dashboard:chat_history', kwargs={'room_id': self.room.room_id})
+
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'before': first['next_cursor']}).json()
+        self.assertEqual(len(first['messages']), 10)
+        self.assertEqual(len(second['messages']), 2)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(self.client.get(url, {'before': 'garbage'}).status_code, 400)
+
+    def test_history_view_is_for_participants(self):
+        outsider = User.objects.create_user(email='outsider@example.com', password='x')
+        self.client.force_login(outsider)
+        response = self.client.get(reverse('dashboard:chat_history', kwargs={'room_id': self.room.room_id}))
+        self.assertEqual(response.status_code, 404)
+
+
+class StaleWhileRevalidateTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def get(self):
+        return stale_while_revalidate('analytics', self.compute, soft_ttl=30, timeout=60, placeholder='empty')
+
+    def test_cold_miss_computes_once(self):
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_placeholder_while_another_caller_computes(self):
+        cache.add(_lock_key('analytics'), 1, 30)
+        self.assertEqual(self.get(), 'empty')
+        self.assertEqual(self.calls, 0)
+
+
+class SellerMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(email='seller@example.com', password='x', user_type='seller')
+        Shop.objects.create(seller=cls.seller, name='Duka', slug='duka')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_one_metrics_query_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.seller
+        with self.assertNumQueries(1):
+            first = calculate_seller_analytics(request)
+            second = calculate_seller_analytics(request)
+        self.assertEqual(first, second)
+        self.assertEqual(first['total_products'], 0)
+
+    def test_endpoints(self):
+        self.client.force_login(self.seller)
+        analytics = self.client.get(reverse('dashboard:get_analytics_data')).json()
+        self.assertEqual(analytics['analytics']['total_orders'], 0)
+        self.assertEqual(set(analytics['chart_data']), {
+            'period', 'dates', 'sales', 'orders', 'moving_average', 'change', 'change_pct', 'cumulative_sales',
+        })
+        self.assertEqual(self.client.get(reverse('dashboard:quick_stats')).json()['active_products'], 0)
+
+
+class SalesDeltaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(email='seller@example.com', password='x', user_type='seller')
+        cls.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        shop = Shop.objects.create(seller=cls.seller, name='Duka', slug='duka')
+        cls.product = Product.objects.create(
+            name='Unga', slug='unga', description='', price=Decimal('1500'), stock_quantity=20,
+            category=Category.objects.create(name='Vyakula', slug='vyakula'), shop=shop, status='published',
+        )
+        cls.order = Order.objects.create(
+            user=cls.buyer, subtotal=Decimal('4500'), tax_amount=0, shipping_cost=0, total=Decimal('4500'),
+            payment_method='mpesa', shipping_name='Asha', shipping_phone='0712345678',
+            shipping_email='buyer@example.com', shipping_address='Mtaa 1', shipping_region='Dar es Salaam',
+            shipping_district='Ilala',
+        )
+        shop_order = ShopOrder.objects.create(
+            order=cls.order, shop=shop, customer=cls.buyer, subtotal=Decimal('4500'), item_count=3,
+            created_at=cls.order.created_at,
+        )
+        OrderItem.objects.create(
+            order=cls.order, shop_order=shop_order, product=cls.product, product_name='Unga',
+            product_price=Decimal('1500'), quantity=3, total_price=Decimal('4500'),
+        )
+
+    def figures(self):
+        daily = DailyStats.objects.get(seller=self.seller, date=timezone.localdate(self.order.created_at))
+        analytics = SellerAnalytics.objects.get(seller=self.seller)
+        stats = ProductSalesStats.objects.get(product=self.product)
+        return {
+            'daily': (daily.sales, daily.orders, daily.new_customers),
+            'analytics': (analytics.total_sales, analytics.total_orders, analytics.total_customers),
+            'product': (stats.units_sold, stats.revenue, stats.order_count),
+        }
+
+    def test_paid_then_refunded(self):
+        self.assertTrue(mark_paid(self.order, 'TX1'))
+        self.assertEqual(self.figures(), {
+            'daily': (Decimal('4500'), 1, 1),
+            'analytics': (Decimal('4500'), 1, 1),
+            'product': (3, Decimal('4500'), 1),
+        })
+
+        self.assertTrue(transition(self.order.pk, 'refunded'))
+        self.assertEqual(self.figures(), {
+            'daily': (Decimal('0'), 0, 0),
+            'analytics': (Decimal('0'), 0, 0),
+            'product': (0, Decimal('0'), 0),
+        })
+
+    def test_cancelled_after_payment(self):
+        mark_paid(self.order, 'TX1')
+        self.order.refresh_from_db()
+        self.order.status = 'cancelled'
+        self.order.save()
+        self.assertEqual(self.figures()['analytics'], (Decimal('0'), 0, 0))
+        self.assertEqual(self.figures()['product'], (0, Decimal('0'), 0))
+
+    def test_unpaid_changes_leave_figures(self):
+        self.assertTrue(transition(self.order.pk, 'failed'))
+        self.assertFalse(SellerAnalytics.objects.filter(seller=self.seller).exists())
+        self.assertFalse(ProductSalesStats.objects.filter(product=self.product).exists())
+
+
+class ChatWriterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        cls.seller = User.objects.create_user(email='seller@example.com', password='x', user_type='seller')
+        cls.room = ChatRoom.objects.create(room_id='room-1')
+        for user in (cls.buyer, cls.seller):
+            ChatParticipant.objects.create(room=cls.room, user=user)
+
+    def burst(self, count, **writer_options):
+        """Write ``count`` buyer messages at once, as concurrent consumers would; returns them and the INSERTs"""
+        writer = ChatMessageWriter(**{'delay': 0.01, 'batch_size': 100, **writer_options})
+
+        async def send():
+            return await asyncio.gather(*(
+                writer.write(ChatMessage(room=self.room, sender=self.buyer, content=f"Habari {index}"), [self.seller.pk])
+                for index in range(count)
+            ))
+
+        with CaptureQueriesContext(connection) as queries:
+            messages = async_to_sync(send)()
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "dashboard_chatmessage"')]
+        return messages, inserts
+
+    def unread(self, user):
+        return ChatParticipant.objects.get(room=self.room, user=user).unread_count
+
+    def test_burst_is_one_insert(self):
+        messages, inserts = self.burst(10)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(ChatMessage.objects.filter(room=self.room).count(), 10)
+        self.assertTrue(all(message.pk and message.created_at for message in messages))
+
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, max(message.pk for message in messages))
+        self.assertEqual(self.room.last_message_preview, 'Habari 9')
+        self.assertEqual(self.room.last_message_sender_id, self.buyer.pk)
+        self.assertEqual(self.unread(self.seller), 10)
+        self.assertEqual(self.unread(self.buyer), 0)
+
+    def test_full_batches_are_written_straight_away(self):
+        _, inserts = self.burst(5, delay=0.05, batch_size=2)
+        # Two full batches go at once; the fifth message is written when the delay runs out
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(self.unread(self.seller), 5)
+
+    def test_mark_read(self):
+        self.burst(3)
+        self.room.mark_read(self.seller)
+        self.assertEqual(self.unread(self.seller), 0)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .models import DailyStats
+
+PERIODS = ('day', 'week', 'month')
+
+_DAY = np.timedelta64(1, 'D')
+# numpy weeks start on Thursday (1970-01-01); shifting by three days makes them start on Monday
+_WEEK_SHIFT = np.timedelta64(3, 'D')
+
+
+class SeriesRangeError(ValueError):
+    pass
+
+
+def _bucket_starts(days, period):
+    """First day of the day/week/month each of ``days`` falls in"""
+    if period == 'week':
+        return (days + _WEEK_SHIFT).astype('datetime64[W]').astype('datetime64[D]') - _WEEK_SHIFT
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+def _moving_average(values, window):
+    """Trailing mean over ``window`` buckets; the first buckets average what is available"""
+    totals = np.cumsum(values)
+    # Only the first len(values) lagged totals are used, however wide the window
+    lagged = np.concatenate([np.zeros(min(window, len(values))), totals])[:len(values)]
+    return (totals - lagged) / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def _change_pct(values):
+    """Percentage change from the previous bucket; NaN where there is nothing to compare with"""
+    previous = np.concatenate([[np.nan], values[:-1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = (values - previous) / previous * 100
+    pct[~np.isfinite(pct)] = np.nan
+    return pct
+
+
+def _to_list(values, decimals=2):
+    return [None if np.isnan(value) else value for value in np.round(values, decimals).tolist()]
+
+
+def sales_series(user, start, end, period='day', window=7):
+    """
+    Dense sales chart data for ``user`` from ``start`` to ``end`` inclusive.
+
+    Every day in the range gets a value (days without a DailyStats row count
+    as zero) before being summed into ``period`` buckets. Besides sales and
+    orders the result carries a ``window``-bucket moving average of sales,
+    the change from the previous bucket and cumulative sales.
+    """
+    if period not in PERIODS:
+        raise SeriesRangeError(f"Unknown period {period!r}")
+    if end < start:
+        raise SeriesRangeError("The range ends before it starts")
+    if (end - start).days >= getattr(settings, 'DASHBOARD_CHART_MAX_DAYS', 5 * 366):
+        raise SeriesRangeError("The range is too long")
+    max_window = getattr(settings, 'DASHBOARD_CHART_MAX_WINDOW', 90)
+    if not 1 <= window <= max_window:
+        raise SeriesRangeError(f"The moving average window must be between 1 and {max_window}")
+
+    rows = list(DailyStats.objects.filter(
+        seller=user, date__gte=start, date__lte=end
+    ).values_list('date', 'sales', 'orders'))
+
+    length = (end - start).days + 1
+    days = np.datetime64(start, 'D') + np.arange(length) * _DAY
+    daily_sales = np.zeros(length)
+    daily_orders = np.zeros(length, dtype=np.int64)
+    if rows:
+        dates, sales, orders = zip(*rows)
+        offsets = (np.array(dates, dtype='datetime64[D]') - days[0]) // _DAY
+        daily_sales[offsets] = np.array(sales, dtype=float)
+        daily_orders[offsets] = orders
+
+    buckets = _bucket_starts(days, period)
+    edges = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+    sales = np.add.reduceat(daily_sales, edges)
+    orders = np.add.reduceat(daily_orders, edges)
+
+    return {
+        'period': period,
+        'dates': np.datetime_as_string(buckets[edges], unit='D').tolist(),
+        'sales': _to_list(sales),
+        'orders': orders.tolist(),
+        'moving_average': _to_list(_moving_average(sales, window)),
+        'change': _to_list(np.diff(sales, prepend=np.nan)),
+        'change_pct': _to_list(_change_pct(sales), 1),
+        'cumulative_sales': _to_list(np.cumsum(sales)),
+    }
+
+
+def recent_sales_series(user, today, days=30, **kwargs):
+    """``sales_series`` for the ``days`` days up to and including ``today``"""
+    return sales_series(user, today - timedelta(days=days - 1), today, **kwargs)
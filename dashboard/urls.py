@@ -18,6 +18,8 @@ urlpatterns = [
     path('analytics/', views.analytics_view, name='analytics'),
     path('chat/', views.chat_dashboard, name='chat_dashboard'),
     path('chat/<str:room_id>/', views.chat_room, name='chat_room'),
+    path('chat/<str:room_id>/history/', views.chat_history, name='chat_history'),
     path('api/analytics/', views.get_analytics_data, name='get_analytics_data'),
     path('api/quick-stats/', views.quick_stats, name='quick_stats'),
+    path('api/sales-series/', views.sales_series_data, name='sales_series'),
 ]
\ No newline at end of file
@@ -3,15 +3,16 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.utils import timezone
-from django.utils.translation import gettext_lazy as _
-from django.db.models import Sum, Count, Avg
-from django.db import OperationalError
-from django.db.models.functions import TruncDate
+from django.db.models import F
 from datetime import datetime, timedelta
 
-from .models import SellerAnalytics, DailyStats, ChatRoom, ChatMessage
-from market.models import Product, Shop
-from orders.models import Order, OrderItem
+from .caching import cached_seller_analytics
+from .chat_history import message_page, serialize_message
+from .metrics import metrics_dict, seller_metrics
+from .models import ChatRoom, ChatParticipant
+from .timeseries import SeriesRangeError, recent_sales_series, sales_series
+from market.models import top_selling
+from orders.models import ShopOrder
 
 
 @login_required
@@ -21,29 +22,24 @@ def seller_dashboard(request):
     if not request.user.is_seller:
         return render(request, 'dashboard/access_denied.html')
     
-    try:
-        shop = Shop.objects.get(seller=request.user)
-    except Shop.DoesNotExist:
+    # The shop comes back with every analytics figure annotated
+    shop = seller_metrics(request)
+    if shop is None:
         return redirect('market:create_shop')
-    
-    # Calculate analytics
-    analytics = calculate_seller_analytics(request.user)
+    analytics = metrics_dict(shop)
     
     # Get recent orders
-    recent_orders = Order.objects.filter(
-        items__product__shop=shop
-    ).distinct().select_related('user').prefetch_related('items')[:5]
+    recent_orders = ShopOrder.objects.filter(
+        shop=shop
+    ).select_related('order', 'customer').prefetch_related('items')[:5]
 
     # Get popular products
-    popular_products = Product.objects.filter(
-        shop=shop
-    ).annotate(
-        total_orders=Count('orderitem')
-    ).order_by('-total_orders')[:5]
+    popular_products = [stats.product for stats in top_selling(shop, 5)]
     
     context = {
         'shop': shop,
         'analytics': analytics,
+        'chart_data': get_sales_chart_data_safe(request.user),
         'recent_orders': recent_orders,
         'popular_products': popular_products,
     }
@@ -57,22 +53,16 @@ def analytics_view(request):
     if not request.user.is_seller:
         return render(request, 'dashboard/access_denied.html')
     
-    try:
-        shop = Shop.objects.get(seller=request.user)
-    except Shop.DoesNotExist:
+    shop = seller_metrics(request)
+    if shop is None:
         return redirect('market:create_shop')
     
     try:
-        analytics = calculate_seller_analytics(request.user)
+        analytics = metrics_dict(shop)
         chart_data = get_sales_chart_data_safe(request.user)
         
         # Get top performing products
-        top_products = Product.objects.filter(
-            shop=shop
-        ).annotate(
-            total_sales=Sum('orderitem__total_price'),
-            total_orders=Count('orderitem')
-        ).order_by('-total_sales')[:10]
+        top_products = [stats.product for stats in top_selling(shop, 10, by='revenue')]
         
         context = {
             'shop': shop,
@@ -91,40 +81,9 @@ def analytics_view(request):
 
 
 def get_sales_chart_data_safe(user):
-    """Safe version without ambiguous column errors"""
+    """Dense daily sales and orders for the last 30 days, read from DailyStats"""
     try:
-        shop = Shop.objects.get(seller=user)
-        
-        # Last 30 days
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        
-        # FIX: Use 'total' field instead of 'total_amount'
-        daily_data = Order.objects.filter(
-            items__product__shop=shop,
-            created_at__gte=thirty_days_ago,
-            payment_status='paid'
-        ).annotate(
-            sales_date=TruncDate('created_at')
-        ).values('sales_date').annotate(
-            daily_sales=Sum('total'),  # CHANGED: total_amount -> total
-            daily_orders=Count('id', distinct=True)
-        ).order_by('sales_date')
-        
-        # Format data for charts
-        dates = []
-        sales_data = []
-        orders_data = []
-        
-        for day in daily_data:
-            dates.append(day['sales_date'].strftime('%Y-%m-%d'))
-            sales_data.append(float(day['daily_sales'] or 0))
-            orders_data.append(day['daily_orders'])
-        
-        return {
-            'dates': dates,
-            'sales': sales_data,
-            'orders': orders_data,
-        }
+        return recent_sales_series(user, timezone.localdate())
         
     except Exception as e:
         print(f"Error in chart data: {e}")
@@ -135,74 +94,12 @@ def get_sales_chart_data_safe(user):
         }
 
 
-def calculate_seller_analytics(user):
-    """Calculate seller analytics - FIXED VERSION"""
-    try:
-        shop = Shop.objects.get(seller=user)
-    except Shop.DoesNotExist:
+def calculate_seller_analytics(request):
+    """The seller's analytics from the request's seller_metrics (see dashboard.metrics)"""
+    shop = seller_metrics(request)
+    if shop is None:
         return get_empty_analytics()
-    
-    # Date ranges for different periods
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    # FIX: Use 'total' field instead of 'total_amount'
-    all_orders = Order.objects.filter(items__product__shop=shop, payment_status='paid')
-    today_orders = all_orders.filter(created_at__date=today)
-    week_orders = all_orders.filter(created_at__date__gte=week_ago)
-    month_orders = all_orders.filter(created_at__date__gte=month_ago)
-    
-    # FIX: Use 'total' field for all calculations
-    total_sales = all_orders.aggregate(total=Sum('total'))['total'] or 0
-    total_orders = all_orders.count()
-    monthly_revenue = month_orders.aggregate(total=Sum('total'))['total'] or 0
-    
-    # Today's performance
-    today_sales = today_orders.aggregate(total=Sum('total'))['total'] or 0
-    today_orders_count = today_orders.count()
-    
-    # Weekly performance
-    weekly_sales = week_orders.aggregate(total=Sum('total'))['total'] or 0
-    
-    # Product stats
-    total_products = Product.objects.filter(shop=shop).count()
-    active_products = Product.objects.filter(shop=shop, is_active=True).count()
-    low_stock_products = Product.objects.filter(shop=shop, stock_quantity__lte=10).count()  # FIX: stock_quantity not quantity
-    
-    # Customer stats
-    total_customers = all_orders.values('user').distinct().count()
-    new_customers_week = all_orders.filter(
-        created_at__date__gte=week_ago
-    ).values('user').distinct().count()
-    
-    return {
-        # Overall metrics
-        'total_sales': total_sales,
-        'total_orders': total_orders,
-        'monthly_revenue': monthly_revenue,
-        'total_products': total_products,
-        'total_customers': total_customers,
-        
-        # Today's performance
-        'today_sales': today_sales,
-        'today_orders': today_orders_count,
-        
-        # Weekly performance
-        'weekly_sales': weekly_sales,
-        'weekly_orders': week_orders.count(),
-        
-        # Product status
-        'active_products': active_products,
-        'low_stock_products': low_stock_products,
-        
-        # Customer growth
-        'new_customers_week': new_customers_week,
-        
-        # Ratings
-        'average_rating': shop.rating or 4.5,
-        'total_views': 0,  # Placeholder - add if needed
-    }
+    return metrics_dict(shop)
 
 
 def get_empty_analytics():
@@ -231,17 +128,18 @@ def chat_dashboard(request):
     if not request.user.is_seller:
         return render(request, 'dashboard/access_denied.html')
     
-    # Get seller's chat rooms
-    chat_rooms = ChatRoom.objects.filter(
-        participants=request.user
-    ).prefetch_related('participants', 'messages').distinct()
+    # Seller's chat rooms, most recently active first; last message and unread
+    # count are kept on the room and the seller's participant row
+    memberships = ChatParticipant.objects.filter(
+        user=request.user
+    ).select_related('room').prefetch_related('room__participants').order_by(
+        F('room__last_message_at').desc(nulls_last=True), '-room__created_at'
+    )
     
-    # Get unread message counts
-    for room in chat_rooms:
-        room.unread_count = ChatMessage.objects.filter(
-            room=room,
-            is_read=False
-        ).exclude(sender=request.user).count()
+    chat_rooms = []
+    for membership in memberships:
+        membership.room.unread_count = membership.unread_count
+        chat_rooms.append(membership.room)
     
     context = {
         'chat_rooms': chat_rooms,
@@ -254,32 +152,81 @@ def chat_dashboard(request):
 def chat_room(request, room_id):
     """Individual chat room"""
     room = get_object_or_404(ChatRoom, room_id=room_id, participants=request.user)
-    messages = room.messages.select_related('sender').all()[:100]
+    # Latest page only; older pages are fetched over the chat socket
+    messages, history_cursor = message_page(room)
     
     # Mark messages as read
-    room.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    room.mark_read(request.user)
     
     context = {
         'room': room,
         'messages': messages,
+        'history_cursor': history_cursor,
     }
     
     return render(request, 'dashboard/chat_room.html', context)
 
 
+@login_required
+def chat_history(request, room_id):
+    """API for a page of chat history: ?before=<cursor>&limit=N, newest page without a cursor"""
+    room = get_object_or_404(ChatRoom, room_id=room_id, participants=request.user)
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        messages, next_cursor = message_page(room, before=request.GET.get('before'), limit=limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'messages': [serialize_message(message) for message in messages],
+        'next_cursor': next_cursor,
+    })
+
+
+def seller_analytics_payload(request):
+    """Analytics and chart data shared by the polled endpoints, served stale-while-revalidate"""
+    return cached_seller_analytics(
+        request.user,
+        lambda: {
+            'analytics': calculate_seller_analytics(request),
+            'chart_data': get_sales_chart_data_safe(request.user),
+        },
+        # Shown while the first computation is still running
+        placeholder={
+            'analytics': get_empty_analytics(),
+            'chart_data': {'dates': [], 'sales': [], 'orders': []},
+        },
+    )
+
+
 @login_required
 def get_analytics_data(request):
     """API endpoint for analytics data"""
     if not request.user.is_seller:
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    analytics = calculate_seller_analytics(request.user)
-    chart_data = get_sales_chart_data_safe(request.user)
+    return JsonResponse(seller_analytics_payload(request))
+
+
+@login_required
+def sales_series_data(request):
+    """API for sales charts over any range: ?start=YYYY-MM-DD&end=YYYY-MM-DD&period=day|week|month&window=N"""
+    if not request.user.is_seller:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    today = timezone.localdate()
+    try:
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else today
+        start = (
+            datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+            if request.GET.get('start') else end - timedelta(days=29)
+        )
+        window = int(request.GET.get('window', 7))
+        series = sales_series(request.user, start, end, period=request.GET.get('period', 'day'), window=window)
+    except (ValueError, SeriesRangeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    return JsonResponse({
-        'analytics': analytics,
-        'chart_data': chart_data,
-    })
+    return JsonResponse(series)
 
 
 @login_required
@@ -288,7 +235,7 @@ def quick_stats(request):
     if not request.user.is_seller:
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    analytics = calculate_seller_analytics(request.user)
+    analytics = seller_analytics_payload(request)['analytics']
     
     # Return only essential stats
     quick_stats = {
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
-from .models import Category, Shop, Product, ProductImage, ProductView, SponsoredRequest, SearchHistory,HomeSlider
+from .models import Category, Shop, Product, ProductImage, ProductView, ProductViewDaily, ShopViewDaily, ProductSalesStats, WatermarkedImage, SponsoredRequest, SearchHistory,HomeSlider
 from .forms import CategoryAdminForm, ShopAdminForm, ProductImageForm,HomeSliderForm
 # Uploadcare Public Key - Replace with your actual key
 UPLOADCARE_PUBLIC_KEY = '5ff964c3b9a85a1e2697'
@@ -120,11 +120,45 @@ class ProductImageAdmin(admin.ModelAdmin):
         return "No Image"
     image_preview_large.short_description = 'Image Preview'
 
+@admin.register(WatermarkedImage)
+class WatermarkedImageAdmin(admin.ModelAdmin):
+    list_display = ['source', 'status', 'output', 'processed_at']
+    list_filter = ['status']
+    search_fields = ['source']
+    readonly_fields = ['created_at', 'updated_at', 'processed_at']
+    actions = ['retry_watermark']
+
+    def retry_watermark(self, request, queryset):
+        queryset.update(status='pending', error='')
+    retry_watermark.short_description = "Queue selected images for watermarking again"
+
 @admin.register(ProductView)
 class ProductViewAdmin(admin.ModelAdmin):
     list_display = ['product', 'user', 'ip_address', 'viewed_at']
     list_filter = ['viewed_at']
 
+@admin.register(ProductViewDaily)
+class ProductViewDailyAdmin(admin.ModelAdmin):
+    list_display = ['product', 'date', 'views', 'unique_visitors']
+    list_filter = ['date']
+    search_fields = ['product__name']
+    date_hierarchy = 'date'
+
+@admin.register(ShopViewDaily)
+class ShopViewDailyAdmin(admin.ModelAdmin):
+    list_display = ['shop', 'date', 'views', 'unique_visitors']
+    list_filter = ['date']
+    search_fields = ['shop__name']
+    date_hierarchy = 'date'
+
+@admin.register(ProductSalesStats)
+class ProductSalesStatsAdmin(admin.ModelAdmin):
+    list_display = ['product', 'shop', 'category', 'units_sold', 'revenue', 'order_count', 'last_sold_at']
+    list_filter = ['category']
+    search_fields = ['product__name', 'shop__name']
+    list_select_related = ['product', 'shop', 'category']
+    readonly_fields = ['units_sold', 'revenue', 'order_count', 'last_sold_at']
+
 @admin.register(SponsoredRequest)
 class SponsoredRequestAdmin(admin.ModelAdmin):
     list_display = ['product', 'seller', 'title', 'status', 'start_date', 'end_date', 'created_at']
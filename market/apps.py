@@ -4,4 +4,7 @@ from django.utils.translation import gettext_lazy as _
 class MarketConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'market'
-    verbose_name = _('Market')
\ No newline at end of file
+    verbose_name = _('Market')
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,139 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils import translation
+
+from .models import Category, Product, Shop
+
+CATALOG_VERSION_KEY = getattr(settings, 'CATALOG_VERSION_CACHE', 'catalog_version')
+MEDIA_VERSION_KEY = getattr(settings, 'MEDIA_VERSION_CACHE', 'media_version')
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+
+
+def get_catalog_version():
+    """Counter bumped whenever any catalog object changes; listing pages depend on it"""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    _bump_version(CATALOG_VERSION_KEY)
+
+
+def get_media_version():
+    """Counter bumped when the watermark pipeline finishes images, which changes their URLs"""
+    return _get_version(MEDIA_VERSION_KEY)
+
+
+def bump_media_version():
+    _bump_version(MEDIA_VERSION_KEY)
+
+
+def _viewer_key(request):
+    """Pages differ per user and language, so validators must too"""
+    user_id = request.user.pk if request.user.is_authenticated else 'anon'
+    return f"{user_id}:{translation.get_language()}"
+
+
+def _has_pending_messages(request):
+    # A 304 would keep flash messages from ever being shown
+    return len(get_messages(request)) > 0
+
+
+def _make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _product_row(request, slug):
+    """
+    One indexed lookup for the timestamps a product page depends on, memoised per request.
+
+    Stock changes and image edits touch the product's ``updated_at``, so the
+    page does not need the catalog version that every sale elsewhere bumps.
+    """
+    if not hasattr(request, '_conditional_product'):
+        request._conditional_product = Product.objects.filter(
+            slug=slug, is_active=True, status='published'
+        ).values_list('updated_at', 'shop__updated_at', 'category__updated_at').first()
+    return request._conditional_product
+
+
+def product_etag(request, slug):
+    row = _product_row(request, slug)
+    if row is None or _has_pending_messages(request):
+        return None
+    return _make_etag('product', slug, *row, get_media_version(), _viewer_key(request))
+
+
+def product_last_modified(request, slug):
+    row = _product_row(request, slug)
+    if row is None or _has_pending_messages(request):
+        return None
+    return max(row)
+
+
+def _shop_updated_at(request, slug):
+    if not hasattr(request, '_conditional_shop'):
+        request._conditional_shop = Shop.objects.filter(
+            slug=slug, is_active=True
+        ).values_list('updated_at', flat=True).first()
+    return request._conditional_shop
+
+
+def shop_etag(request, slug):
+    updated_at = _shop_updated_at(request, slug)
+    if updated_at is None or _has_pending_messages(request):
+        return None
+    return _make_etag(
+        'shop', slug, updated_at, get_catalog_version(),
+        request.GET.urlencode(), _viewer_key(request),
+    )
+
+
+def shop_last_modified(request, slug):
+    if _has_pending_messages(request):
+        return None
+    return _shop_updated_at(request, slug)
+
+
+def category_etag(request, slug=None, **kwargs):
+    """Validator for listing pages: catalog version plus the category if there is one"""
+    if _has_pending_messages(request):
+        return None
+
+    updated_at = None
+    if slug:
+        updated_at = Category.objects.filter(
+            slug=slug, is_active=True
+        ).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+    return _make_etag(
+        'listing', request.path, updated_at, get_catalog_version(),
+        request.GET.urlencode(), _viewer_key(request),
+    )
+
+
+def listing_etag(request, *args, **kwargs):
+    if _has_pending_messages(request):
+        return None
+    return _make_etag(
+        'listing', request.path, get_catalog_version(),
+        request.GET.urlencode(), _viewer_key(request),
+    )
@@ -0,0 +1,31 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from channels.consumer import SyncConsumer
+from .watermark import claim_pending, process_sources
+
+_executor = None
+
+def get_executor():
+    """Process pool shared by every message handled in this worker"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
+
+class WatermarkConsumer(SyncConsumer):
+    """
+    Background worker for the ``image-watermark`` channel.
+
+    Run with ``python manage.py runworker image-watermark``. Each message drains
+    the pending queue in batches, so bursts of uploads share pool round trips and
+    messages for images that were already handled are no-ops.
+    """
+    batch_size = 50
+
+    def watermark_image(self, message):
+        while True:
+            sources = claim_pending(self.batch_size)
+            if not sources:
+                break
+            process_sources(sources, executor=get_executor())
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.urls import reverse
+
+from .utils import resolve_local_media
+
+FORMATS = {
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+}
+
+_size_lock = threading.Lock()
+_cache_size = None
+
+
+def cache_dir():
+    return Path(getattr(settings, 'MEDIA_DERIVATIVE_CACHE_DIR', Path(settings.BASE_DIR) / 'media_cache'))
+
+
+def allowed_widths():
+    return getattr(settings, 'MEDIA_DERIVATIVE_WIDTHS', (150, 300, 600, 1200))
+
+
+def negotiate_format(fmt, accept):
+    """Resolve ``auto`` to WebP when the client accepts it, JPEG otherwise"""
+    if fmt == 'auto':
+        return 'webp' if 'image/webp' in (accept or '') else 'jpeg'
+    return fmt if fmt in FORMATS else None
+
+
+@lru_cache(maxsize=4096)
+def _content_digest(path, mtime_ns, size):
+    """SHA-256 of a source file, memoised on its path, mtime and size"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_key(path, width, fmt):
+    """Content address of a derivative: source bytes plus transform parameters"""
+    stat = path.stat()
+    digest = _content_digest(str(path), stat.st_mtime_ns, stat.st_size)
+    quality = getattr(settings, 'MEDIA_DERIVATIVE_QUALITY', 75)
+    return hashlib.sha256(f"{digest}:{width}:{fmt}:{quality}".encode()).hexdigest()
+
+
+def derivative_path(key, fmt):
+    return cache_dir() / key[:2] / f"{key}{FORMATS[fmt][1]}"
+
+
+def get_derivative(name, width, fmt):
+    """
+    Path of the resized ``fmt`` variant of local media ``name``, generating it on first use.
+
+    Returns ``(path, key)``, or ``(None, None)`` when ``name`` is not local media.
+    """
+    source = resolve_local_media(name)
+    if source is None:
+        return None, None
+
+    key = derivative_key(source, width, fmt)
+    target = derivative_path(key, fmt)
+    if target.exists():
+        # Bump mtime so eviction treats the file as recently used
+        os.utime(target)
+        return target, key
+
+    quality = getattr(settings, 'MEDIA_DERIVATIVE_QUALITY', 75)
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, width * 4))
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        img.save(tmp_path, format=FORMATS[fmt][0], quality=quality, optimize=True)
+    os.replace(tmp_path, target)
+
+    _account(target.stat().st_size, keep=target)
+    return target, key
+
+
+def _account(added_bytes, keep=None):
+    """Track the cache size and evict least recently used files when over the cap"""
+    global _cache_size
+    max_bytes = getattr(settings, 'MEDIA_DERIVATIVE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+    with _size_lock:
+        if _cache_size is not None:
+            _cache_size += added_bytes
+            if _cache_size <= max_bytes:
+                return
+        _cache_size = evict(max_bytes, keep=keep)
+
+
+def evict(max_bytes, keep=None):
+    """Delete the oldest derivatives (except ``keep``) until the cache fits in 90% of ``max_bytes``"""
+    files = []
+    total = 0
+    for path in cache_dir().glob('*/*'):
+        if path.suffix == '.tmp':
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    if total <= max_bytes:
+        return total
+
+    target = int(max_bytes * 0.9)
+    for mtime, size, path in sorted(files):
+        if total <= target:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+            total -= size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def derivative_url(name, width, fmt='auto'):
+    """Derivative URL for local media ``name``, or None if it is not stored locally"""
+    source = resolve_local_media(name)
+    if source is None:
+        return None
+
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    width = min((w for w in allowed_widths() if w >= width), default=max(allowed_widths()))
+    url = reverse('media_derivative', kwargs={
+        'width': width,
+        'fmt': fmt,
+        'path': source.relative_to(media_root).as_posix(),
+    })
+    # The version changes whenever the source file does, so responses can be immutable
+    return f"{url}?v={source.stat().st_mtime_ns}"
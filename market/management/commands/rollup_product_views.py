@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from market.rollups import rollup_product_views, prune_product_views
+
+class Command(BaseCommand):
+    help = 'Roll up raw product views into daily tables and prune old raw views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=2,
+            help='Number of recent complete days to recompute (default: 2)'
+        )
+        parser.add_argument(
+            '--retention-days', type=int,
+            default=getattr(settings, 'PRODUCT_VIEW_RETENTION_DAYS', 90),
+            help='Keep raw views for this many days'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=getattr(settings, 'PRODUCT_VIEW_PRUNE_CHUNK_SIZE', 5000),
+            help='Rows deleted per statement while pruning'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            help='Write pruned rows to gzipped JSON-lines files in this directory'
+        )
+        parser.add_argument(
+            '--no-prune', action='store_true',
+            help='Only roll up, do not delete raw views'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rolling up product views...')
+        days = rollup_product_views(
+            days=options['days'],
+            retention_days=options['retention_days'],
+        )
+        self.stdout.write(f'Rolled up {len(days)} day(s)')
+
+        if options['no_prune']:
+            return
+
+        self.stdout.write('Pruning raw product views...')
+        deleted = prune_product_views(
+            retention_days=options['retention_days'],
+            chunk_size=options['chunk_size'],
+            archive_dir=options['archive_dir'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Pruned {deleted} raw product views')
+        )
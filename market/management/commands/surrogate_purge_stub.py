@@ -0,0 +1,48 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = 'Run a local purge endpoint that prints the surrogate keys it receives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+
+    def handle(self, *args, **options):
+        stdout = self.stdout
+        header = settings.SURROGATE_KEY_HEADER
+
+        class PurgeHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    keys = json.loads(self.rfile.read(length) or b'{}').get('keys', [])
+                except ValueError:
+                    keys = []
+                keys = keys or self.headers.get(header, '').split()
+
+                stdout.write(f"PURGE {len(keys)} key(s): {' '.join(keys)}")
+                body = json.dumps({'status': 'ok', 'purged': len(keys)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), PurgeHandler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Purge stub listening on http://{options['host']}:{options['port']}/ "
+            f"(set SURROGATE_PURGE_URL to this address)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
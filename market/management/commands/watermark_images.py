@@ -0,0 +1,48 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from market.watermark import claim_pending, image_sources, process_sources, register_sources
+
+class Command(BaseCommand):
+    help = 'Watermark product images and shop banners in batches using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Register every existing product image and shop banner before processing'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of worker processes (default: all cores)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Images claimed from the queue per batch'
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also retry images that failed before'
+        )
+
+    def handle(self, *args, **options):
+        if options['scan']:
+            created = register_sources(image_sources())
+            self.stdout.write(f'Registered {created} new image(s)')
+
+        total_done = total_failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                sources = claim_pending(options['batch_size'], retry_failed=options['retry_failed'])
+                if not sources:
+                    break
+                done, failed = process_sources(sources, executor=executor)
+                total_done += done
+                total_failed += failed
+                self.stdout.write(f'Processed batch of {len(sources)} image(s)')
+                # Failed images are only retried once per run
+                options['retry_failed'] = False
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Watermarked {total_done} image(s), {total_failed} failed')
+        )
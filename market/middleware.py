@@ -0,0 +1,29 @@
+from django.conf import settings
+
+
+class SurrogateKeyMiddleware:
+    """
+    Emit the surrogate keys collected by views so the HTTP cache can purge precisely.
+
+    Anonymous responses that set no cookies are also marked cacheable by the
+    proxy for ``SURROGATE_CACHE_TTL`` seconds; browsers still see the normal
+    Cache-Control headers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        keys = getattr(request, 'surrogate_keys', None)
+        if not keys or request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+
+        response[settings.SURROGATE_KEY_HEADER] = ' '.join(sorted(keys))
+
+        user = getattr(request, 'user', None)
+        is_anonymous = user is None or not user.is_authenticated
+        if is_anonymous and not response.cookies:
+            response['Surrogate-Control'] = f"max-age={settings.SURROGATE_CACHE_TTL}"
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0003_homeslider'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='views')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='unique visitors')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='market.shop', verbose_name='shop')),
+            ],
+            options={
+                'verbose_name': 'daily shop views',
+                'verbose_name_plural': 'daily shop views',
+                'ordering': ['-date'],
+                'unique_together': {('shop', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='views')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='unique visitors')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='market.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'daily product views',
+                'verbose_name_plural': 'daily product views',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'product'], name='market_prod_date_5c0b22_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+    ]
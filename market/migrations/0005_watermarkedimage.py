@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0004_productviewdaily_shopviewdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatermarkedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Media path or Uploadcare URL of the original image', max_length=500, unique=True, verbose_name='source')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='status')),
+                ('output', models.CharField(blank=True, max_length=255, verbose_name='output')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processed at')),
+            ],
+            options={
+                'verbose_name': 'watermarked image',
+                'verbose_name_plural': 'watermarked images',
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='market_wate_status_3855ca_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0005_watermarkedimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_stats', serialize=False, to='market.product', verbose_name='product')),
+                ('units_sold', models.PositiveIntegerField(default=0, verbose_name='units sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='revenue')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='order count')),
+                ('last_sold_at', models.DateTimeField(blank=True, null=True, verbose_name='last sold at')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_stats', to='market.category', verbose_name='category')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_stats', to='market.shop', verbose_name='shop')),
+            ],
+            options={
+                'verbose_name': 'product sales stats',
+                'verbose_name_plural': 'product sales stats',
+                'indexes': [models.Index(fields=['shop', '-units_sold'], name='market_prod_shop_id_52f930_idx'), models.Index(fields=['shop', '-revenue'], name='market_prod_shop_id_32abd3_idx'), models.Index(fields=['category', '-units_sold'], name='market_prod_categor_3c3afe_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def backfill_product_sales_stats(apps, schema_editor):
+    """Build ProductSalesStats from the lines of paid, uncancelled sub-orders sold so far"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    ProductSalesStats = apps.get_model('market', 'ProductSalesStats')
+
+    rows = OrderItem.objects.filter(
+        shop_order__payment_status='paid'
+    ).exclude(shop_order__status='cancelled').values(
+        'product_id', 'product__shop_id', 'product__category_id'
+    ).annotate(
+        units_sold=models.Sum('quantity'),
+        revenue=models.Sum('total_price'),
+        order_count=models.Count('shop_order', distinct=True),
+        last_sold_at=models.Max('shop_order__created_at'),
+    ).order_by('product_id')
+    ProductSalesStats.objects.bulk_create([
+        ProductSalesStats(
+            product_id=row['product_id'],
+            shop_id=row['product__shop_id'],
+            category_id=row['product__category_id'],
+            units_sold=row['units_sold'],
+            revenue=row['revenue'],
+            order_count=row['order_count'],
+            last_sold_at=row['last_sold_at'],
+        )
+        for row in rows
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0006_productsalesstats'),
+        ('orders', '0004_shoporder'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_sales_stats, migrations.RunPython.noop),
+    ]
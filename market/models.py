@@ -1,16 +1,19 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
 from django.urls import reverse
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q, Sum, Max
 from django.contrib.postgres.search import SearchVectorField
 from django.contrib.postgres.indexes import GinIndex
 from django.core.cache import cache
 from django.utils import timezone
 from django.utils.functional import cached_property
-from .utils import apply_watermark
+from .derivatives import derivative_url
+from .utils import resolve_local_media
 
 import uuid
 
@@ -71,7 +74,7 @@ class Category(models.Model):
     def get_image_preview_url(self):
         """Get preview image URL for category listing"""
         if self.image:
-            return f"https://ucarecdn.com/{self.image}/-/resize/300x300/-/format/jpg/-/quality/smart/"
+            return derivative_url(self.image, 300) or f"https://ucarecdn.com/{self.image}/-/resize/300x300/-/format/jpg/-/quality/smart/"
         return None
     
     def get_og_image_url(self):
@@ -137,13 +140,6 @@ class Shop(models.Model):
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
 
-    
-    def save(self, *args, **kwargs):
-        if self.banner:
-            watermarked = apply_watermark(self.banner)
-            self.image.save(self.banner.name, watermarked, save=False)
-        super().save(*args, **kwargs)
-
     class Meta:
         verbose_name = _('shop')
         verbose_name_plural = _('shops')
@@ -168,21 +164,32 @@ class Shop(models.Model):
     def get_logo_url(self):
         """Get optimized logo URL"""
         if self.logo:
-            return f"https://ucarecdn.com/{self.logo}/-/resize/100x100/-/format/jpg/-/quality/smart/"
+            return derivative_url(self.logo, 150) or f"https://ucarecdn.com/{self.logo}/-/resize/100x100/-/format/jpg/-/quality/smart/"
         return None
     
     def get_banner_url(self):
         """Get optimized banner URL"""
-        if self.banner:
-            return f"https://ucarecdn.com/{self.banner}/-/resize/1200x400/-/format/jpg/-/quality/smart/"
+        media = self.banner and self._banner_media()
+        if media:
+            return derivative_url(media, 1200) or f"https://ucarecdn.com/{self.banner}/-/resize/1200x400/-/format/jpg/-/quality/smart/"
         return None
     
     def get_banner_preview_url(self):
         """Get preview banner URL"""
-        if self.banner:
-            return f"https://ucarecdn.com/{self.banner}/-/resize/400x150/-/format/jpg/-/quality/smart/"
+        media = self.banner and self._banner_media()
+        if media:
+            return derivative_url(media, 600) or f"https://ucarecdn.com/{self.banner}/-/resize/400x150/-/format/jpg/-/quality/smart/"
         return None
 
+    def _banner_media(self):
+        """The watermarked banner once the pipeline has made it; None while a local original waits for it"""
+        from .watermark import watermarked_media
+
+        watermarked = watermarked_media(self.banner)
+        if watermarked or resolve_local_media(self.banner):
+            return watermarked
+        return self.banner
+
     @property
     def product_count(self):
         return self.products.filter(is_active=True).count()
@@ -337,8 +344,12 @@ class Product(models.Model):
         current_views += 1
         
         if current_views >= 5:  # Update database every 5 views
+            # Plain UPDATE: leaves updated_at (and page validators) alone and skips save signals
+            Product.objects.filter(pk=self.pk).update(
+                total_views=F('total_views') + current_views,
+                last_viewed=timezone.now(),
+            )
             self.total_views += current_views
-            self.save()
             cache.delete(cache_key)
         else:
             cache.set(cache_key, current_views, 3600)  # Cache for 1 hour
@@ -369,7 +380,24 @@ class Product(models.Model):
 
     @property
     def view_count(self):
-        return self.views.count()
+        """Rolled-up daily views plus raw views newer than the last rollup"""
+        from .rollups import day_start
+
+        rolled = self.daily_views.aggregate(total=Sum('views'), last_day=Max('date'))
+        raw_views = self.views.all()
+        if rolled['last_day']:
+            raw_views = raw_views.filter(
+                viewed_at__gte=day_start(rolled['last_day'] + timezone.timedelta(days=1))
+            )
+        return (rolled['total'] or 0) + raw_views.count()
+
+    @property
+    def total_sold(self):
+        """Units sold, from the product's ProductSalesStats"""
+        try:
+            return self.sales_stats.units_sold
+        except ObjectDoesNotExist:
+            return 0
 
 
      # ADD THESE PROPERTIES FOR SIMPLE TEMPLATE ACCESS
@@ -421,13 +449,6 @@ class ProductImage(models.Model):
     
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
 
-    
-    def save(self, *args, **kwargs):
-        if self.image:
-            watermarked = apply_watermark(self.image)
-            self.image.save(self.image.name, watermarked, save=False)
-        super().save(*args, **kwargs)
-
     class Meta:
         verbose_name = _('product image')
         verbose_name_plural = _('product images')
@@ -446,6 +467,11 @@ class ProductImage(models.Model):
 
         image_str = str(self.image).strip()
 
+        # Picha iliyohifadhiwa kwenye MEDIA_ROOT: nakala yenye watermark pekee
+        local_url = self._local_url(1200)
+        if local_url:
+            return local_url
+
         # Kama ni full URL (mfano https://32b2svpniy.ucarecd.net/xxxx)
         if image_str.startswith('http'):
             return image_str  # tumia kama ilivyo
@@ -463,6 +489,10 @@ class ProductImage(models.Model):
 
         image_str = str(self.image).strip()
 
+        local_url = self._local_url(300)
+        if local_url:
+            return local_url
+
         if image_str.startswith('http'):
             # Ongeza transform kwa link kamili
             return f"{image_str}-/resize/300x300/-/format/auto/-/quality/70/"
@@ -471,6 +501,25 @@ class ProductImage(models.Model):
         return f"https://{project_domain}/{image_str}/-/resize/300x300/-/format/auto/-/quality/70/"
 
 
+    def _watermarked_media(self):
+        """Media path of the watermarked copy of this image, or None until it exists"""
+        from .watermark import watermarked_media
+
+        return watermarked_media(self.image, cdn_domain='32b2svpniy.ucarecd.net')
+
+    def _local_url(self, width):
+        """
+        Derivative of the watermarked copy, or a placeholder while a local original waits for it.
+
+        None for CDN images that have not been watermarked yet.
+        """
+        watermarked = self._watermarked_media()
+        if watermarked:
+            return derivative_url(watermarked, width)
+        if resolve_local_media(self.image):
+            return f"{settings.STATIC_URL}images/placeholder.jpg"
+        return None
+
     def get_uuid(self):
         """Optional helper if you still need the UUID only."""
         image_str = str(self.image).strip()
@@ -481,6 +530,44 @@ class ProductImage(models.Model):
 
 
 
+class WatermarkedImage(models.Model):
+    """Processing state of the batch watermark pipeline for one source image"""
+    STATUS_CHOICES = (
+        ('pending', _('Pending')),
+        ('processing', _('Processing')),
+        ('done', _('Done')),
+        ('failed', _('Failed')),
+    )
+
+    source = models.CharField(
+        _('source'),
+        max_length=500,
+        unique=True,
+        help_text=_('Media path or Uploadcare URL of the original image')
+    )
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    output = models.CharField(_('output'), max_length=255, blank=True)
+    error = models.TextField(_('error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    processed_at = models.DateTimeField(_('processed at'), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('watermarked image')
+        verbose_name_plural = _('watermarked images')
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
 class ProductView(models.Model):
     product = models.ForeignKey(
         Product, 
@@ -512,6 +599,102 @@ class ProductView(models.Model):
     def __str__(self):
         return f"View of {self.product.name} at {self.viewed_at}"
 
+class ProductViewDaily(models.Model):
+    """Per-product, per-day rollup of raw ProductView rows"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_views',
+        verbose_name=_('product')
+    )
+    date = models.DateField(_('date'))
+    views = models.PositiveIntegerField(_('views'), default=0)
+    unique_visitors = models.PositiveIntegerField(_('unique visitors'), default=0)
+
+    class Meta:
+        verbose_name = _('daily product views')
+        verbose_name_plural = _('daily product views')
+        unique_together = ['product', 'date']
+        indexes = [
+            models.Index(fields=['date', 'product']),
+        ]
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: {self.views}"
+
+class ShopViewDaily(models.Model):
+    """Per-shop, per-day rollup of raw ProductView rows"""
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='daily_views',
+        verbose_name=_('shop')
+    )
+    date = models.DateField(_('date'))
+    views = models.PositiveIntegerField(_('views'), default=0)
+    unique_visitors = models.PositiveIntegerField(_('unique visitors'), default=0)
+
+    class Meta:
+        verbose_name = _('daily shop views')
+        verbose_name_plural = _('daily shop views')
+        unique_together = ['shop', 'date']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.shop_id} on {self.date}: {self.views}"
+
+class ProductSalesStats(models.Model):
+    """
+    Running sales totals for a product from paid, uncancelled orders.
+
+    Kept current by payments and refunds (dashboard.signals) and rebuilt by
+    rollup_seller_stats --full. Shop and category are copied from the product
+    so top-N lists are read straight off an index.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='sales_stats',
+        verbose_name=_('product')
+    )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='product_sales_stats',
+        verbose_name=_('shop')
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='product_sales_stats',
+        verbose_name=_('category')
+    )
+    units_sold = models.PositiveIntegerField(_('units sold'), default=0)
+    revenue = models.DecimalField(_('revenue'), max_digits=12, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(_('order count'), default=0)
+    last_sold_at = models.DateTimeField(_('last sold at'), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('product sales stats')
+        verbose_name_plural = _('product sales stats')
+        indexes = [
+            models.Index(fields=['shop', '-units_sold']),
+            models.Index(fields=['shop', '-revenue']),
+            models.Index(fields=['category', '-units_sold']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units_sold} sold"
+
+
+def top_selling(shop, limit=5, by='units_sold'):
+    """The shop's best sellers by ``units_sold`` or ``revenue``, with their products"""
+    return ProductSalesStats.objects.filter(
+        shop=shop, **{f'{by}__gt': 0}
+    ).select_related('product', 'product__category').order_by(f'-{by}')[:limit]
+
 class SponsoredRequest(models.Model):
     STATUS_CHOICES = (
         ('pending', _('Pending')),
@@ -2,6 +2,7 @@ from django.core.cache import cache
 from django.db.models import Count, Q
 from django.utils import timezone
 from .models import Product, ProductView, SearchHistory
+from .rollups import trending_products
 
 class RecommendationEngine:
     def __init__(self, request):
@@ -80,12 +81,7 @@ class RecommendationEngine:
         trending = cache.get(cache_key)
         
         if trending is None:
-            trending = Product.objects.filter(
-                is_active=True,
-                status='published'
-            ).annotate(
-                recent_views=Count('views', filter=Q(views__viewed_at__gte=timezone.now()-timezone.timedelta(days=7)))
-            ).order_by('-recent_views', '-total_views')[:limit]
+            trending = trending_products(limit=limit, days=7)
             
             cache.set(cache_key, trending, 1800)  # Cache for 30 minutes
         
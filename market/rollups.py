@@ -0,0 +1,195 @@
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Product, ProductView, ProductViewDaily, ShopViewDaily
+
+
+def day_start(day):
+    """Aware datetime for the start of ``day`` in the site timezone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def retention_cutoff(retention_days=None):
+    """First day whose raw views are kept"""
+    if retention_days is None:
+        retention_days = getattr(settings, 'PRODUCT_VIEW_RETENTION_DAYS', 90)
+    return timezone.localdate() - timedelta(days=retention_days)
+
+
+def rollup_day(day):
+    """Recompute product, shop and seller view rollups for a single day from raw rows"""
+    raw_views = ProductView.objects.filter(
+        viewed_at__gte=day_start(day),
+        viewed_at__lt=day_start(day + timedelta(days=1)),
+    )
+
+    product_rows = [
+        ProductViewDaily(
+            product_id=row['product_id'],
+            date=day,
+            views=row['views'],
+            unique_visitors=row['unique_visitors'],
+        )
+        for row in raw_views.values('product_id').annotate(
+            views=Count('id'),
+            unique_visitors=Count('ip_address', distinct=True),
+        )
+    ]
+    shop_rows = [
+        ShopViewDaily(
+            shop_id=row['product__shop_id'],
+            date=day,
+            views=row['views'],
+            unique_visitors=row['unique_visitors'],
+        )
+        for row in raw_views.values('product__shop_id').annotate(
+            views=Count('id'),
+            unique_visitors=Count('ip_address', distinct=True),
+        )
+    ]
+
+    with transaction.atomic():
+        ProductViewDaily.objects.bulk_create(
+            product_rows,
+            update_conflicts=True,
+            unique_fields=['product', 'date'],
+            update_fields=['views', 'unique_visitors'],
+        )
+        ShopViewDaily.objects.bulk_create(
+            shop_rows,
+            update_conflicts=True,
+            unique_fields=['shop', 'date'],
+            update_fields=['views', 'unique_visitors'],
+        )
+        _feed_daily_stats(day)
+
+    return len(product_rows), len(shop_rows)
+
+
+def _feed_daily_stats(day):
+    """Copy shop view totals for ``day`` into the seller's DailyStats row"""
+    from dashboard.models import DailyStats
+
+    stats = [
+        DailyStats(seller_id=row['shop__seller_id'], date=day, views=row['views'])
+        for row in ShopViewDaily.objects.filter(date=day).values('shop__seller_id').annotate(
+            views=Sum('views')
+        )
+    ]
+    DailyStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=['seller', 'date'],
+        update_fields=['views'],
+    )
+
+
+def unrolled_days_before(cutoff):
+    """Days older than ``cutoff`` that still have raw views but no rollup rows yet"""
+    raw_days = set(
+        ProductView.objects.filter(viewed_at__lt=day_start(cutoff))
+        .annotate(day=TruncDate('viewed_at'))
+        .order_by()
+        .values_list('day', flat=True)
+        .distinct()
+    )
+    if not raw_days:
+        return []
+    rolled_days = set(
+        ProductViewDaily.objects.filter(date__in=raw_days)
+        .order_by()
+        .values_list('date', flat=True)
+        .distinct()
+    )
+    return sorted(raw_days - rolled_days)
+
+
+def rollup_product_views(days=2, retention_days=None):
+    """
+    Roll up the last ``days`` complete days plus any older days that were never rolled up.
+
+    Days older than the retention cutoff are only rolled up once: pruning may
+    already have removed part of their raw rows, so recomputing them would
+    undercount.
+    """
+    cutoff = retention_cutoff(retention_days)
+    yesterday = timezone.localdate() - timedelta(days=1)
+    recent = [
+        yesterday - timedelta(days=offset)
+        for offset in range(days)
+        if yesterday - timedelta(days=offset) >= cutoff
+    ]
+
+    rolled = []
+    for day in unrolled_days_before(cutoff) + sorted(recent):
+        rollup_day(day)
+        rolled.append(day)
+    return rolled
+
+
+def prune_product_views(retention_days=None, chunk_size=None, archive_dir=None):
+    """
+    Delete raw views older than the retention window in chunks of ``chunk_size`` rows.
+
+    Every day being pruned must already be rolled up (see ``rollup_product_views``).
+    When ``archive_dir`` is given each chunk is appended to a gzipped JSON-lines
+    file there before it is deleted.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'PRODUCT_VIEW_PRUNE_CHUNK_SIZE', 5000)
+    cutoff = day_start(retention_cutoff(retention_days))
+    old_views = ProductView.objects.filter(viewed_at__lt=cutoff).order_by('id')
+
+    archive = None
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(
+            archive_dir, f"product_views_{timezone.now().strftime('%Y%m%d%H%M%S')}.jsonl.gz"
+        )
+        archive = gzip.open(archive_path, 'at', encoding='utf-8')
+
+    deleted = 0
+    try:
+        while True:
+            if archive:
+                rows = list(old_views.values(
+                    'id', 'product_id', 'user_id', 'ip_address', 'user_agent', 'viewed_at'
+                )[:chunk_size])
+                ids = [row['id'] for row in rows]
+                for row in rows:
+                    row['viewed_at'] = row['viewed_at'].isoformat()
+                    archive.write(json.dumps(row) + '\n')
+                archive.flush()
+            else:
+                ids = list(old_views.values_list('id', flat=True)[:chunk_size])
+
+            if not ids:
+                break
+            ProductView.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+    finally:
+        if archive:
+            archive.close()
+
+    return deleted
+
+
+def trending_products(limit=6, days=7):
+    """Published products ordered by rolled-up views over the last ``days`` days"""
+    since = timezone.localdate() - timedelta(days=days)
+    return Product.objects.filter(
+        is_active=True,
+        status='published',
+    ).annotate(
+        recent_views=Coalesce(
+            Sum('daily_views__views', filter=Q(daily_views__date__gte=since)), 0
+        )
+    ).order_by('-recent_views', '-total_views')[:limit]
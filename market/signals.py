@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .conditional import bump_catalog_version
+from .models import Category, HomeSlider, Product, ProductImage, ProductSalesStats, Shop
+from .surrogate import (
+    CATEGORIES_KEY, HOME_KEY, PRODUCTS_KEY, SHOPS_KEY, category_key, category_listing_key,
+    product_key, purge_keys, shop_key, shop_listing_key,
+)
+from .watermark import enqueue_watermark
+
+# Product fields that decide which listing pages a product appears on
+LISTING_FIELDS = ('status', 'is_active', 'is_featured', 'is_sponsored', 'category_id', 'shop_id')
+
+@receiver(post_save, sender=Product)
+def move_product_sales_stats(sender, instance, created, **kwargs):
+    """Keep the shop and category copied onto ProductSalesStats in step with the product"""
+    if not created:
+        ProductSalesStats.objects.filter(product=instance).exclude(
+            shop_id=instance.shop_id, category_id=instance.category_id
+        ).update(shop_id=instance.shop_id, category_id=instance.category_id)
+
+@receiver(post_save, sender=ProductImage)
+def queue_product_image_watermark(sender, instance, **kwargs):
+    if instance.image:
+        enqueue_watermark(instance.image, cdn_domain='32b2svpniy.ucarecd.net')
+
+@receiver(post_save, sender=Shop)
+def queue_shop_banner_watermark(sender, instance, **kwargs):
+    if instance.banner:
+        enqueue_watermark(instance.banner)
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def touch_image_product(sender, instance, **kwargs):
+    # Product page validators go by the product's updated_at
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Shop)
+@receiver([post_save, post_delete], sender=HomeSlider)
+def invalidate_catalog_validators(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+def _purge_on_commit(*keys):
+    transaction.on_commit(lambda: purge_keys(*keys))
+
+@receiver(post_init, sender=Product)
+def remember_listing_fields(sender, instance, **kwargs):
+    instance._listing_snapshot = tuple(instance.__dict__.get(field) for field in LISTING_FIELDS)
+
+@receiver([post_save, post_delete], sender=Product)
+def purge_product_pages(sender, instance, signal, created=False, **kwargs):
+    keys = [product_key(instance.pk)]
+    current = tuple(getattr(instance, field) for field in LISTING_FIELDS)
+    previous = getattr(instance, '_listing_snapshot', None)
+
+    # Listings only need purging when the product joins, leaves or moves between them
+    if created or signal is post_delete or previous != current:
+        keys += [PRODUCTS_KEY, HOME_KEY, CATEGORIES_KEY, SHOPS_KEY]
+        for snapshot in {previous, current} - {None}:
+            category_id, shop_id = snapshot[-2:]
+            keys += [category_listing_key(category_id), shop_listing_key(shop_id)]
+        instance._listing_snapshot = current
+    _purge_on_commit(*keys)
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def purge_product_image_pages(sender, instance, **kwargs):
+    _purge_on_commit(product_key(instance.product_id))
+
+@receiver([post_save, post_delete], sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    _purge_on_commit(category_key(instance.pk), category_listing_key(instance.pk), CATEGORIES_KEY)
+
+@receiver([post_save, post_delete], sender=Shop)
+def purge_shop_pages(sender, instance, **kwargs):
+    _purge_on_commit(shop_key(instance.pk), shop_listing_key(instance.pk), SHOPS_KEY)
+
+@receiver([post_save, post_delete], sender=HomeSlider)
+def purge_home_page(sender, **kwargs):
+    _purge_on_commit(HOME_KEY)
@@ -0,0 +1,143 @@
+import atexit
+import threading
+
+import httpx
+from django.conf import settings
+
+
+def product_key(product_id):
+    return f"product-{product_id}"
+
+
+def shop_key(shop_id):
+    return f"shop-{shop_id}"
+
+
+def category_key(category_id):
+    return f"category-{category_id}"
+
+
+def shop_listing_key(shop_id):
+    """Pages listing a shop's products; purged when a product joins or leaves the shop"""
+    return f"shop-{shop_id}-products"
+
+
+def category_listing_key(category_id):
+    """Pages listing a category's products; purged when a product joins or leaves it"""
+    return f"category-{category_id}-products"
+
+
+# Listing pages whose membership changes with any product, category, shop or slider
+PRODUCTS_KEY = 'products'
+CATEGORIES_KEY = 'categories'
+SHOPS_KEY = 'shops'
+HOME_KEY = 'home'
+
+
+def add_surrogate_keys(request, *keys):
+    """Tag the response for ``request`` with ``keys`` (emitted by SurrogateKeyMiddleware)"""
+    if not hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(str(key) for key in keys if key)
+
+
+def tag_products(request, products):
+    """Tag a response with every product shown and its shop and category"""
+    keys = []
+    for product in products:
+        keys.append(product_key(product.pk))
+        keys.append(shop_key(product.shop_id))
+        keys.append(category_key(product.category_id))
+    add_surrogate_keys(request, *keys)
+
+
+class PurgeDispatcher:
+    """
+    Collects surrogate keys and sends them to the cache's purge endpoint in batches.
+
+    Keys are flushed from a background thread every ``SURROGATE_PURGE_INTERVAL``
+    seconds, or immediately once ``SURROGATE_PURGE_BATCH_SIZE`` keys are waiting,
+    and once more when the process exits so management commands and workers
+    do not drop what they queued. Does nothing when ``SURROGATE_PURGE_URL`` is
+    not configured.
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._client = None
+
+    @property
+    def enabled(self):
+        return bool(getattr(settings, 'SURROGATE_PURGE_URL', None))
+
+    def purge(self, *keys):
+        if not self.enabled or not keys:
+            return
+
+        with self._lock:
+            self._keys.update(keys)
+            pending = len(self._keys)
+            if self._thread is None:
+                # The flushing thread is a daemon and dies with the interpreter
+                atexit.register(self.flush)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='surrogate-purge', daemon=True
+                )
+                self._thread.start()
+
+        if pending >= getattr(settings, 'SURROGATE_PURGE_BATCH_SIZE', 100):
+            self._wakeup.set()
+
+    def _run(self):
+        interval = getattr(settings, 'SURROGATE_PURGE_INTERVAL', 0.5)
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Send all pending keys now; returns the number of keys sent"""
+        with self._lock:
+            keys, self._keys = sorted(self._keys), set()
+        if not keys:
+            return 0
+
+        batch_size = getattr(settings, 'SURROGATE_PURGE_BATCH_SIZE', 100)
+        sent = 0
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            try:
+                self._send(batch)
+                sent += len(batch)
+            except httpx.HTTPError as e:
+                # Put the batch back so the next flush retries it
+                with self._lock:
+                    self._keys.update(batch)
+                print(f"Surrogate purge error: {e}")
+                break
+        return sent
+
+    def _send(self, keys):
+        if self._client is None:
+            self._client = httpx.Client(timeout=getattr(settings, 'SURROGATE_PURGE_TIMEOUT', 5))
+
+        headers = {settings.SURROGATE_KEY_HEADER: ' '.join(keys)}
+        token = getattr(settings, 'SURROGATE_PURGE_TOKEN', None)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        response = self._client.post(
+            settings.SURROGATE_PURGE_URL, json={'keys': keys}, headers=headers
+        )
+        response.raise_for_status()
+
+
+dispatcher = PurgeDispatcher()
+
+
+def purge_keys(*keys):
+    dispatcher.purge(*keys)
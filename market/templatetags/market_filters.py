@@ -1,4 +1,5 @@
 from django import template
+from market.derivatives import derivative_url
 
 register = template.Library()
 
@@ -26,4 +27,11 @@ def multiply(value, arg):
     try:
         return float(value) * float(arg)
     except (ValueError, TypeError):
-        return 0
\ No newline at end of file
+        return 0
+@register.filter
+def resized(value, width):
+    """URL of a resized variant of a local media image, or the value unchanged"""
+    try:
+        return derivative_url(value, int(width)) or value
+    except (ValueError, TypeError, OSError):
+        return value
@@ -1,3 +1,150 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import httpx
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from .models import Category, Product, ProductImage, Shop
+from .surrogate import PurgeDispatcher
+from .watermark import source_for, watermark_source
+
+User = get_user_model()
+
+
+class MediaDerivativeTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root, MEDIA_DERIVATIVE_CACHE_DIR=cls.cache_dir,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root)
+        shutil.rmtree(cls.cache_dir)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user(email='seller@example.com', password='x', user_type='seller')
+        cls.shop = Shop.objects.create(seller=seller, name='Duka', slug='duka')
+        cls.product = Product.objects.create(
+            name='Kikapu', slug='kikapu', description='', price=Decimal('5000'), stock_quantity=3,
+            category=Category.objects.create(name='Vikapu', slug='vikapu'), shop=cls.shop, status='published',
+        )
+
+    def write_image(self, name):
+        path = Path(self.media_root) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'green').save(buffer, 'JPEG')
+        path.write_bytes(buffer.getvalue())
+        return name
+
+    def get(self, path, width=300):
+        return self.client.get(f'/media-cache/{width}/jpeg/{path}')
+
+    def test_other_media_is_resized(self):
+        self.assertEqual(self.get(self.write_image('categories/vikapu.jpg')).status_code, 200)
+
+    def test_product_original_is_refused_until_watermarked(self):
+        image = ProductImage.objects.create(product=self.product, image=self.write_image('products/kikapu.jpg'))
+        self.assertEqual(self.get('products/kikapu.jpg').status_code, 404)
+        self.assertEqual(image.get_image_url(), '/static/images/placeholder.jpg')
+
+        source, output, error = watermark_source(source_for(image.image), self.media_root)
+        self.assertEqual(error, '')
+        # The original's URL now serves the watermarked copy, which the page links directly
+        self.assertEqual(self.get('products/kikapu.jpg').status_code, 200)
+        self.assertIn(output, image.get_image_url())
+        self.assertEqual(self.get(output, 1200).status_code, 200)
+
+    def test_banner_original_is_refused(self):
+        self.shop.banner = self.write_image('banners/duka.jpg')
+        self.shop.save()
+        self.assertEqual(self.get('banners/duka.jpg').status_code, 404)
+        self.assertIsNone(self.shop.get_banner_url())
+
+
+@override_settings(
+    SURROGATE_PURGE_URL='https://cache.example.com/purge', SURROGATE_PURGE_TOKEN='siri',
+    SURROGATE_PURGE_BATCH_SIZE=3, SURROGATE_PURGE_INTERVAL=60,
+)
+class PurgeDispatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.status = 200
+        self.sent = threading.Event()
+        self.dispatcher = PurgeDispatcher()
+        self.dispatcher._client = httpx.Client(transport=httpx.MockTransport(self.endpoint))
+        atexit = mock.patch('market.surrogate.atexit.register')
+        self.atexit_register = atexit.start()
+        self.addCleanup(atexit.stop)
+
+    def endpoint(self, request):
+        """Stub purge endpoint recording each batch of keys it is sent"""
+        keys = json.loads(request.content)['keys']
+        self.assertEqual(request.headers['Surrogate-Key'], ' '.join(keys))
+        self.assertEqual(request.headers['Authorization'], 'Bearer siri')
+        if self.status == 200:
+            self.batches.append(keys)
+            self.sent.set()
+        return httpx.Response(self.status)
+
+    def test_keys_are_deduplicated_and_batched(self):
+        self.dispatcher._keys.update(['product-1', 'product-2', 'home'])
+        self.dispatcher._keys.update(['product-2', 'shop-1', 'home', 'products'])
+        self.assertEqual(self.dispatcher.flush(), 5)
+        self.assertEqual(self.batches, [['home', 'product-1', 'product-2'], ['products', 'shop-1']])
+        self.assertEqual(self.dispatcher.flush(), 0)
+
+    def test_full_batch_is_sent_without_waiting_for_the_interval(self):
+        self.dispatcher.purge('product-1', 'product-2', 'product-1')
+        self.assertFalse(self.sent.wait(0.2))
+        self.dispatcher.purge('home')
+        self.assertTrue(self.sent.wait(5))
+        self.assertEqual(self.batches, [['home', 'product-1', 'product-2']])
+
+    @override_settings(SURROGATE_PURGE_INTERVAL=0.05)
+    def test_keys_are_sent_after_the_interval(self):
+        self.dispatcher.purge('product-1')
+        self.assertTrue(self.sent.wait(5))
+        self.assertEqual(self.batches, [['product-1']])
+
+    def test_flushed_at_exit(self):
+        self.dispatcher.purge('product-1')
+        self.dispatcher.purge('product-2')
+        self.atexit_register.assert_called_once_with(self.dispatcher.flush)
+        at_exit, = self.atexit_register.call_args.args
+        self.assertEqual(at_exit(), 2)
+        self.assertEqual(self.batches, [['product-1', 'product-2']])
+
+    def test_failed_batch_is_kept_for_retry(self):
+        self.status = 503
+        self.dispatcher._keys.update(['product-1', 'product-2'])
+        self.assertEqual(self.dispatcher.flush(), 0)
+        self.status = 200
+        self.assertEqual(self.dispatcher.flush(), 2)
+        self.assertEqual(self.batches, [['product-1', 'product-2']])
+
+    @override_settings(SURROGATE_PURGE_URL=None)
+    def test_disabled_without_url(self):
+        self.dispatcher.purge('product-1')
+        self.assertIsNone(self.dispatcher._thread)
+        self.assertEqual(self.dispatcher.flush(), 0)
@@ -1,27 +1,70 @@
 from PIL import Image, ImageDraw, ImageFont
+from django.conf import settings
 from django.core.files.base import ContentFile
+from functools import lru_cache
 from io import BytesIO
+from pathlib import Path
 
-def apply_watermark(image):
-    base_img = Image.open(image).convert("RGBA")
-    width, height = base_img.size
+WATERMARK_TEXT = "Sokoletu.co.tz"
+
+@lru_cache(maxsize=32)
+def get_watermark_font(size):
+    """Load the watermark font once per size and process"""
+    candidates = [getattr(settings, 'WATERMARK_FONT_PATH', None), "arial.ttf", "DejaVuSans.ttf"]
+    for font_path in candidates:
+        if not font_path:
+            continue
+        try:
+            return ImageFont.truetype(font_path, size=size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
 
-    # Watermark text
-    text = "Sokoletu.co.tz"
-    font = ImageFont.truetype("arial.ttf", size=int(width/20))
+@lru_cache(maxsize=64)
+def get_watermark_layer(size):
+    """Transparent RGBA layer with the watermark text for an image of ``size``"""
+    width, height = size
+    font = get_watermark_font(max(int(width / 20), 10))
 
-    watermark_layer = Image.new("RGBA", base_img.size, (0,0,0,0))
+    watermark_layer = Image.new("RGBA", size, (0, 0, 0, 0))
     draw = ImageDraw.Draw(watermark_layer)
 
     # Position bottom-right
-    text_width, text_height = draw.textsize(text, font)
+    left, top, right, bottom = draw.textbbox((0, 0), WATERMARK_TEXT, font=font)
+    text_width, text_height = right - left, bottom - top
     position = (width - text_width - 20, height - text_height - 20)
 
-    draw.text(position, text, font=font, fill=(255,255,255,120))  # 120 = opacity
+    draw.text(position, WATERMARK_TEXT, font=font, fill=(255, 255, 255, 120))  # 120 = opacity
+    return watermark_layer
 
-    combined = Image.alpha_composite(base_img, watermark_layer)
+def watermark_bytes(data, quality=85):
+    """Watermark encoded image bytes and return JPEG bytes"""
+    base_img = Image.open(BytesIO(data)).convert("RGBA")
+
+    combined = Image.alpha_composite(base_img, get_watermark_layer(base_img.size))
     combined = combined.convert("RGB")
 
     output = BytesIO()
-    combined.save(output, format='JPEG', quality=85)
-    return ContentFile(output.getvalue())
+    combined.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+def apply_watermark(image):
+    """Watermark a file-like image and return it as a ContentFile"""
+    return ContentFile(watermark_bytes(image.read()))
+
+def resolve_local_media(name):
+    """Absolute path of ``name`` if it refers to an existing file under MEDIA_ROOT"""
+    if not name:
+        return None
+
+    name = str(name).strip()
+    if name.startswith(settings.MEDIA_URL):
+        name = name[len(settings.MEDIA_URL):]
+    if not name or name.startswith('http'):
+        return None
+
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    path = (media_root / name).resolve()
+    if media_root not in path.parents or not path.is_file():
+        return None
+    return path
@@ -1,7 +1,11 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Count
+from django.db.models import F, Q, Count
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from PIL import Image
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -11,6 +15,15 @@ from .models import Category, Product, ProductView, Shop, SearchHistory, Sponsor
 from .search import AdvancedProductSearch
 from .forms import ProductForm  # ← HAKIKISHA HII IKO
 from .recommendations import RecommendationEngine
+from .conditional import (
+    category_etag, listing_etag, product_etag, product_last_modified, shop_etag, shop_last_modified
+)
+from .derivatives import FORMATS, allowed_widths, get_derivative, negotiate_format
+from .watermark import awaiting_watermark, source_for, watermarked_media
+from .surrogate import (
+    CATEGORIES_KEY, PRODUCTS_KEY, SHOPS_KEY, add_surrogate_keys, category_key,
+    category_listing_key, shop_key, shop_listing_key, tag_products,
+)
 
 class ProductSearchView(ListView):
     model = Product
@@ -26,7 +39,7 @@ class ProductSearchView(ListView):
         queryset = Product.objects.filter(
             is_active=True, 
             status='published'
-        ).select_related('category', 'shop').prefetch_related('images')
+        ).select_related('category', 'shop', 'sales_stats').prefetch_related('images')
         
         if query:
             # Simple search without advanced search engine
@@ -148,6 +161,7 @@ def track_product_view(product, request):
         user_agent=request.META.get('HTTP_USER_AGENT', '')
     )
 
+@method_decorator(condition(etag_func=listing_etag), name='dispatch')
 class CategoryListView(ListView):
     model = Category
     template_name = 'market/category_list.html'
@@ -161,6 +175,14 @@ class CategoryListView(ListView):
             product_count=Count('products', filter=Q(products__is_active=True))
         )
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        add_surrogate_keys(self.request, CATEGORIES_KEY, *(
+            category_key(category.pk) for category in context['categories']
+        ))
+        return context
+
+@method_decorator(condition(etag_func=category_etag), name='dispatch')
 class ProductListView(ListView):
     model = Product
     template_name = 'market/product_list.html'
@@ -171,7 +193,7 @@ class ProductListView(ListView):
         queryset = Product.objects.filter(
             is_active=True, 
             status='published'
-        ).select_related('category', 'shop').prefetch_related('images')
+        ).select_related('category', 'shop', 'sales_stats').prefetch_related('images')
         
         # Filter by category if provided
         category_slug = self.kwargs.get('category_slug')
@@ -208,6 +230,9 @@ class ProductListView(ListView):
         ordering = self.request.GET.get('ordering', '-created_at')
         if ordering in ['price', '-price', 'name', '-name', '-created_at', '-view_count']:
             queryset = queryset.order_by(ordering)
+        elif ordering == '-total_sold':
+            # Products that never sold have no stats row; keep them after the ones that did
+            queryset = queryset.order_by(F('sales_stats__units_sold').desc(nulls_last=True), '-created_at')
         
         return queryset
     
@@ -220,13 +245,24 @@ class ProductListView(ListView):
         category_slug = self.kwargs.get('category_slug')
         if category_slug:
             context['current_category'] = get_object_or_404(Category, slug=category_slug)
-        
+            add_surrogate_keys(
+                self.request,
+                category_key(context['current_category'].pk),
+                category_listing_key(context['current_category'].pk),
+            )
+        else:
+            add_surrogate_keys(self.request, PRODUCTS_KEY)
+
+        tag_products(self.request, context['products'])
+        add_surrogate_keys(self.request, CATEGORIES_KEY)
         return context
 
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
 def product_detail(request, slug):
+    # Revalidated (304) requests are not counted as product views
     product = get_object_or_404(
-        Product.objects.select_related('category', 'shop')
-                       .prefetch_related('images', 'views'),
+        Product.objects.select_related('category', 'shop', 'sales_stats')
+                       .prefetch_related('images'),
         slug=slug, 
         is_active=True,
         status='published'
@@ -250,6 +286,9 @@ def product_detail(request, slug):
     # Get primary image and other images
     primary_image = product.images.filter(is_primary=True).first()
     other_images = product.images.exclude(id=primary_image.id if primary_image else None)[:3]
+
+    tag_products(request, [product, *related_products, *recommendations])
+    add_surrogate_keys(request, category_listing_key(product.category_id))
     
     context = {
         'product': product,
@@ -264,6 +303,7 @@ def product_detail(request, slug):
 
 
 
+@condition(etag_func=shop_etag, last_modified_func=shop_last_modified)
 def shop_detail(request, slug):
     shop = get_object_or_404(
         Shop.objects.select_related('seller')
@@ -276,7 +316,7 @@ def shop_detail(request, slug):
     products = shop.products.filter(
         is_active=True, 
         status='published'
-    ).select_related('category').prefetch_related('images')
+    ).select_related('category', 'sales_stats').prefetch_related('images')
     
     # Check if user is the shop owner
     is_owner = request.user.is_authenticated and request.user == shop.seller
@@ -284,7 +324,7 @@ def shop_detail(request, slug):
     # Get owner's products (including drafts if owner)
     owner_products = products
     if is_owner:
-        owner_products = shop.products.filter(is_active=True).select_related('category').prefetch_related('images')
+        owner_products = shop.products.filter(is_active=True).select_related('category', 'sales_stats').prefetch_related('images')
     
     # Handle filtering for owners
     status_filter = request.GET.get('status')
@@ -304,6 +344,9 @@ def shop_detail(request, slug):
         'out_of_stock': products.filter(status='out_of_stock').count(),
     }
     
+    add_surrogate_keys(request, shop_key(shop.pk), shop_listing_key(shop.pk))
+    tag_products(request, page_obj)
+
     context = {
         'shop': shop,
         'products': page_obj,
@@ -441,13 +484,17 @@ def search_suggestions(request):
     
     return JsonResponse({'suggestions': suggestions})
 
+@condition(etag_func=listing_etag)
 def featured_products(request):
     products = Product.objects.filter(
         is_active=True,
         status='published',
         is_featured=True
-    ).select_related('category', 'shop').prefetch_related('images')[:8]
+    ).select_related('category', 'shop', 'sales_stats').prefetch_related('images')[:8]
     
+    tag_products(request, products)
+    add_surrogate_keys(request, PRODUCTS_KEY)
+
     context = {
         'featured_products': products,
         'title': _('Featured Products')
@@ -455,13 +502,17 @@ def featured_products(request):
     
     return render(request, 'market/featured_products.html', context)
 
+@condition(etag_func=listing_etag)
 def sponsored_products(request):
     products = Product.objects.filter(
         is_active=True,
         status='published',
         is_sponsored=True
-    ).select_related('category', 'shop').prefetch_related('images')[:12]
+    ).select_related('category', 'shop', 'sales_stats').prefetch_related('images')[:12]
     
+    tag_products(request, products)
+    add_surrogate_keys(request, PRODUCTS_KEY)
+
     context = {
         'sponsored_products': products,
         'title': _('Sponsored Products')
@@ -728,6 +779,51 @@ def product_delete(request, pk):
     return render(request, 'market/product_delete.html', context)
 
 
+@condition(etag_func=listing_etag)
 def shop_list(request):
     shops = Shop.objects.filter(is_active=True).order_by('-created_at')
+    add_surrogate_keys(request, SHOPS_KEY, *(shop_key(shop.pk) for shop in shops))
     return render(request, 'market/shop_list.html', {'shops': shops})
+
+
+def media_derivative(request, width, fmt, path):
+    """Serve a resized/WebP variant of local media, generated on first request"""
+    if width not in allowed_widths():
+        raise Http404
+
+    source = source_for(path)
+    if source and awaiting_watermark(source):
+        # Product images and banners are resized from their watermarked copy only
+        path = watermarked_media(source)
+        if path is None:
+            raise Http404
+
+    image_format = negotiate_format(fmt, request.META.get('HTTP_ACCEPT'))
+    if image_format is None:
+        raise Http404
+
+    etag = response = None
+    # A concurrent eviction can remove the file between lookup and open; regenerate once
+    for attempt in range(2):
+        try:
+            derivative, key = get_derivative(path, width, image_format)
+            if derivative is None:
+                raise Http404
+            etag = f'"{key}"'
+            if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+                response = HttpResponseNotModified()
+            else:
+                response = FileResponse(open(derivative, 'rb'), content_type=FORMATS[image_format][2])
+            break
+        except FileNotFoundError:
+            continue
+        except (OSError, Image.DecompressionBombError):
+            raise Http404
+    if response is None:
+        raise Http404
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if fmt == 'auto':
+        patch_vary_headers(response, ['Accept'])
+    return response
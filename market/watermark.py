@@ -0,0 +1,203 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import repeat
+from pathlib import Path
+
+import httpx
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .conditional import bump_catalog_version, bump_media_version
+from .models import ProductImage, Shop, WatermarkedImage
+from .utils import resolve_local_media, watermark_bytes
+
+WATERMARK_CHANNEL = 'image-watermark'
+WATERMARK_OUTPUT_DIR = 'watermarked'
+
+
+def source_for(value, cdn_domain='ucarecdn.com'):
+    """Media path for local files, otherwise the Uploadcare CDN URL of ``value``"""
+    if not value:
+        return None
+
+    value = str(value).strip()
+    local_path = resolve_local_media(value)
+    if local_path:
+        return str(local_path.relative_to(Path(settings.MEDIA_ROOT).resolve()))
+    if value.startswith('http'):
+        return value
+    return f"https://{cdn_domain}/{value}/"
+
+
+def output_for(source):
+    """Media path the pipeline writes the watermarked copy of ``source`` to"""
+    return f"{WATERMARK_OUTPUT_DIR}/{hashlib.sha1(source.encode()).hexdigest()}.jpg"
+
+
+def watermarked_media(value, cdn_domain='ucarecdn.com'):
+    """
+    Media path of the watermarked copy of ``value``, or None until the pipeline has written it.
+
+    The output path is derived from the source, so this is a file check rather
+    than a WatermarkedImage query per image on listing pages.
+    """
+    source = source_for(value, cdn_domain=cdn_domain)
+    if not source:
+        return None
+    output = output_for(source)
+    if (Path(settings.MEDIA_ROOT) / output).is_file():
+        return output
+    return None
+
+
+def awaiting_watermark(source):
+    """
+    Whether local media ``source`` is a product image or shop banner original.
+
+    Those are only shown through their watermarked copy, so nothing may serve
+    or resize the original itself.
+    """
+    names = [source, f"{settings.MEDIA_URL}{source}"]
+    return (
+        WatermarkedImage.objects.filter(source=source).exists()
+        or ProductImage.objects.filter(image__in=names).exists()
+        or Shop.objects.filter(banner__in=names).exists()
+    )
+
+
+def image_sources():
+    """Every product image and shop banner the pipeline is responsible for"""
+    for image in ProductImage.objects.exclude(image='').values_list('image', flat=True).iterator():
+        yield source_for(image, cdn_domain='32b2svpniy.ucarecd.net')
+    for banner in Shop.objects.exclude(banner__isnull=True).exclude(banner='').values_list('banner', flat=True).iterator():
+        yield source_for(banner)
+
+
+def register_sources(sources):
+    """Create pending records for sources that have never been seen; returns the count created"""
+    sources = {source for source in sources if source}
+    existing = set(
+        WatermarkedImage.objects.filter(source__in=sources).values_list('source', flat=True)
+    )
+    created = WatermarkedImage.objects.bulk_create(
+        [WatermarkedImage(source=source) for source in sources - existing],
+        ignore_conflicts=True,
+    )
+    return len(created)
+
+
+def enqueue_watermark(value, cdn_domain='ucarecdn.com'):
+    """Register an image and notify the watermark worker after the transaction commits"""
+    source = source_for(value, cdn_domain=cdn_domain)
+    if not source:
+        return
+
+    record, created = WatermarkedImage.objects.get_or_create(source=source)
+    if created:
+        transaction.on_commit(lambda: _notify_worker(source))
+
+
+def _notify_worker(source):
+    try:
+        async_to_sync(get_channel_layer().send)(
+            WATERMARK_CHANNEL, {'type': 'watermark.image', 'source': source}
+        )
+    except Exception as e:
+        # The record stays pending and is picked up by the watermark_images command
+        print(f"Watermark queue error: {e}")
+
+
+def claim_pending(limit, retry_failed=False, stale_after=timedelta(hours=1)):
+    """Mark up to ``limit`` records as processing and return their sources"""
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    stale = timezone.now() - stale_after
+
+    with transaction.atomic():
+        records = list(
+            WatermarkedImage.objects.select_for_update(skip_locked=True).filter(
+                Q(status__in=statuses) | Q(status='processing', updated_at__lt=stale)
+            ).order_by('id')[:limit]
+        )
+        WatermarkedImage.objects.filter(id__in=[r.id for r in records]).update(
+            status='processing', updated_at=timezone.now()
+        )
+    return [record.source for record in records]
+
+
+def watermark_source(source, media_root):
+    """
+    Worker entry point: watermark one source and write the result under MEDIA_ROOT.
+
+    Runs in a pool process, so it only touches the filesystem and network, never
+    the database. Returns ``(source, output, error)``.
+    """
+    try:
+        if source.startswith('http'):
+            response = httpx.get(source, timeout=30, follow_redirects=True)
+            response.raise_for_status()
+            data = response.content
+        else:
+            data = (Path(media_root) / source).read_bytes()
+
+        output = output_for(source)
+        path = Path(media_root) / output
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(watermark_bytes(data))
+        os.replace(tmp_path, path)
+        return source, output, ''
+    except Exception as e:
+        return source, '', str(e)
+
+
+def process_sources(sources, executor=None, workers=None, chunksize=4):
+    """Watermark ``sources`` through a process pool and record the results"""
+    if not sources:
+        return 0, 0
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+
+    try:
+        results = list(executor.map(
+            watermark_source, sources, repeat(str(settings.MEDIA_ROOT)), chunksize=chunksize
+        ))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    records = {
+        record.source: record
+        for record in WatermarkedImage.objects.filter(source__in=[r[0] for r in results])
+    }
+    now = timezone.now()
+    done = failed = 0
+    for source, output, error in results:
+        record = records.get(source)
+        if record is None:
+            continue
+        record.output = output
+        record.error = error
+        record.status = 'failed' if error else 'done'
+        record.processed_at = now
+        record.updated_at = now
+        if error:
+            failed += 1
+        else:
+            done += 1
+
+    WatermarkedImage.objects.bulk_update(
+        records.values(), ['output', 'error', 'status', 'processed_at', 'updated_at']
+    )
+    if done:
+        # Pages now link the watermarked copies instead of the originals
+        transaction.on_commit(bump_catalog_version)
+        transaction.on_commit(bump_media_version)
+    return done, failed
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import Cart, CartItem, Order, OrderItem
+from .flash_sales import close_sale, open_sale
+from .models import Cart, CartItem, FlashSale, FlashSaleShard, Order, OrderItem, ShopOrder, StockReservation
+from .stock import release_reservations
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -54,9 +56,59 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(ShopOrder)
+class ShopOrderAdmin(admin.ModelAdmin):
+    list_display = ['order', 'shop', 'customer', 'status', 'payment_status', 'item_count', 'subtotal', 'created_at']
+    list_filter = ['status', 'payment_status', 'created_at']
+    search_fields = ['order__order_number', 'shop__name', 'customer__email']
+    readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['order', 'shop', 'customer']
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product_name', 'quantity', 'product_price', 'total_price']
     list_filter = ['order__status']
     search_fields = ['order__order_number', 'product_name']
-    readonly_fields = ['product_name', 'product_price', 'total_price']
\ No newline at end of file
+    readonly_fields = ['product_name', 'product_price', 'total_price']
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'user', 'order', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['product__name', 'user__email', 'order__order_number']
+    readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['product', 'user', 'order']
+    actions = ['release_selected']
+
+    def release_selected(self, request, queryset):
+        release_reservations(queryset)
+    release_selected.short_description = "Return stock held by selected reservations"
+
+class FlashSaleShardInline(admin.TabularInline):
+    model = FlashSaleShard
+    extra = 0
+    can_delete = False
+    readonly_fields = ['index', 'stock_quantity']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(FlashSale)
+class FlashSaleAdmin(admin.ModelAdmin):
+    list_display = ['product', 'status', 'starts_at', 'ends_at', 'shard_count', 'admission_rate']
+    list_filter = ['status', 'starts_at']
+    search_fields = ['product__name']
+    readonly_fields = ['status', 'created_at', 'updated_at']
+    raw_id_fields = ['product']
+    inlines = [FlashSaleShardInline]
+    actions = ['open_selected', 'close_selected']
+
+    def open_selected(self, request, queryset):
+        for sale in queryset:
+            open_sale(sale)
+    open_selected.short_description = "Open selected flash sales now"
+
+    def close_selected(self, request, queryset):
+        for sale in queryset:
+            close_sale(sale)
+    close_selected.short_description = "Close selected flash sales and return their stock"
@@ -0,0 +1,25 @@
+import asyncio
+
+from channels.consumer import AsyncConsumer
+from .payments import aprocess_order_payment
+
+class PaymentConsumer(AsyncConsumer):
+    """
+    Background worker for the ``payment-processing`` channel.
+
+    Run with ``python manage.py runworker payment-processing``. Gateway calls
+    happen here instead of in the checkout request, so slow mobile-money APIs
+    never hold a web worker or a database transaction. Each order is charged in
+    its own task, so one slow gateway does not hold up the rest; per-gateway
+    concurrency limits live in ``HttpPaymentGateway``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Strong references so running payments are not garbage collected
+        self.tasks = set()
+
+    async def payment_process(self, message):
+        task = asyncio.ensure_future(aprocess_order_payment(message['order_id']))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
@@ -0,0 +1,130 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from market.models import Product
+from .models import FlashSale, FlashSaleShard
+from .stock import _stock_changed, running_sales
+
+SESSION_KEY = 'flash_sale_tickets'
+
+
+def open_sale(sale):
+    """
+    Split the product's stock across the sale's shards and start the sale.
+
+    While the sale runs its shards own the stock; the product row only shows
+    the total as of the last sync. Returns False if the sale was not scheduled.
+    """
+    with transaction.atomic():
+        sale = FlashSale.objects.select_for_update().get(pk=sale.pk)
+        if sale.status != 'scheduled':
+            return False
+        product = Product.objects.select_for_update().only('stock_quantity').get(pk=sale.product_id)
+
+        sale.shard_count = max(sale.shard_count, 1)
+        share, extra = divmod(product.stock_quantity, sale.shard_count)
+        FlashSaleShard.objects.bulk_create([
+            FlashSaleShard(sale=sale, index=index, stock_quantity=share + (index < extra))
+            for index in range(sale.shard_count)
+        ])
+        sale.status = 'active'
+        sale.save(update_fields=['shard_count', 'status', 'updated_at'])
+    return True
+
+
+def sync_sale(sale):
+    """Write the stock left in the sale's shards to the product row; returns it"""
+    remaining = sale.shards.aggregate(total=Sum('stock_quantity'))['total'] or 0
+    Product.objects.filter(pk=sale.product_id).update(stock_quantity=remaining, updated_at=timezone.now())
+    _stock_changed([sale.product_id])
+    return remaining
+
+
+def close_sale(sale):
+    """Fold the shards back into the product's stock and end the sale"""
+    with transaction.atomic():
+        sale = FlashSale.objects.select_for_update().get(pk=sale.pk)
+        if sale.status != 'active':
+            return False
+        # Lock the shards so no buyer draws from them while they are summed
+        list(sale.shards.select_for_update().values_list('pk', flat=True))
+        sync_sale(sale)
+        sale.shards.all().delete()
+        sale.status = 'ended'
+        sale.save(update_fields=['status', 'updated_at'])
+    return True
+
+
+def run_flash_sales(now=None):
+    """Open due sales, close finished ones and sync the rest; returns ``(opened, closed, synced)``"""
+    now = now or timezone.now()
+    opened = sum(
+        open_sale(sale)
+        for sale in FlashSale.objects.filter(status='scheduled', starts_at__lte=now, ends_at__gt=now)
+    )
+    closed = 0
+    for sale in FlashSale.objects.filter(status__in=['scheduled', 'active'], ends_at__lte=now):
+        if sale.status == 'active':
+            closed += close_sale(sale)
+        else:
+            # Its window passed before it was ever opened
+            FlashSale.objects.filter(pk=sale.pk, status='scheduled').update(status='ended')
+    synced = 0
+    for sale in FlashSale.objects.filter(status='active', ends_at__gt=now):
+        sync_sale(sale)
+        synced += 1
+    return opened, closed, synced
+
+
+def _tickets_key(sale_id):
+    return getattr(settings, 'FLASH_SALE_TICKETS_CACHE', 'flash_sale_tickets_{sale_id}').format(sale_id=sale_id)
+
+
+def take_ticket(sale):
+    """Next number in the sale's queue, handed out with an atomic cache increment"""
+    key = _tickets_key(sale.pk)
+    timeout = max((sale.ends_at - timezone.now()).total_seconds(), 0) + 60 * 60
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.add(key, 0, timeout)
+        return cache.incr(key)
+
+
+def admitted_count(sale, now=None):
+    """How many tickets the queue has let through by ``now``"""
+    elapsed = max((now or timezone.now()) - sale.starts_at, timedelta(0)).total_seconds()
+    return sale.admission_burst + int(elapsed * sale.admission_rate / 60)
+
+
+def admission(request, sale):
+    """
+    ``(admitted, position)`` of the current session in the sale's queue.
+
+    Tickets are kept in the session so reloading keeps the buyer's place;
+    the queue admits ``admission_rate`` tickets a minute after an initial
+    ``admission_burst``, so no worker has to move it along.
+    """
+    tickets = request.session.get(SESSION_KEY, {})
+    ticket = tickets.get(str(sale.pk))
+    if ticket is None:
+        ticket = tickets[str(sale.pk)] = take_ticket(sale)
+        request.session[SESSION_KEY] = tickets
+    position = ticket - admitted_count(sale)
+    return position <= 0, max(position, 0)
+
+
+def waiting_sale(request, product_ids):
+    """The first running sale among ``product_ids`` this session has not been admitted to"""
+    for sale in running_sales(product_ids).values():
+        admitted, _ = admission(request, sale)
+        if not admitted:
+            return sale
+    return None
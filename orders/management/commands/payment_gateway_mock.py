@@ -0,0 +1,116 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = 'Run a local mock payment gateway for PAYMENT_GATEWAY_BACKEND=http'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8098)
+        parser.add_argument(
+            '--latency', type=float, default=0.5,
+            help='Seconds each request takes, +/- 50%% jitter'
+        )
+        parser.add_argument(
+            '--fail-rate', type=float, default=0.1,
+            help='Share of payments that are declined'
+        )
+        parser.add_argument(
+            '--pending-rate', type=float, default=0.0,
+            help='Share of payments answered as pending; they settle on a later status query'
+        )
+        parser.add_argument(
+            '--error-rate', type=float, default=0.0,
+            help='Share of requests answered with HTTP 503'
+        )
+
+    def handle(self, *args, **options):
+        stdout = self.stdout
+        payments = {}
+        lock = threading.Lock()
+
+        def settle(reference):
+            outcome = 'failed' if random.random() < options['fail_rate'] else 'paid'
+            return {
+                'reference': reference,
+                'status': outcome,
+                'transaction_id': f'MOCK{uuid.uuid4().hex[:10].upper()}' if outcome == 'paid' else '',
+                'error': 'Insufficient funds' if outcome == 'failed' else '',
+            }
+
+        class GatewayHandler(BaseHTTPRequestHandler):
+            def _reply(self, status, data):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _simulate(self):
+                latency = options['latency']
+                time.sleep(random.uniform(latency * 0.5, latency * 1.5))
+                if random.random() < options['error_rate']:
+                    self._reply(503, {'error': 'Service unavailable'})
+                    return False
+                return True
+
+            def do_POST(self):
+                if self.path.rstrip('/') != '/payments':
+                    return self._reply(404, {'error': 'Not found'})
+                length = int(self.headers.get('Content-Length') or 0)
+                data = json.loads(self.rfile.read(length) or b'{}')
+                if not self._simulate():
+                    return
+
+                reference = self.headers.get('Idempotency-Key') or data.get('reference')
+                with lock:
+                    payment = payments.get(reference)
+                    if payment is None:
+                        if random.random() < options['pending_rate']:
+                            payment = {'reference': reference, 'status': 'pending'}
+                        else:
+                            payment = settle(reference)
+                        payments[reference] = payment
+                stdout.write(f"POST {reference} {data.get('amount')} -> {payment['status']}")
+                self._reply(200, payment)
+
+            def do_GET(self):
+                prefix = '/payments/'
+                if not self.path.startswith(prefix):
+                    return self._reply(404, {'error': 'Not found'})
+                if not self._simulate():
+                    return
+
+                reference = self.path[len(prefix):].strip('/')
+                with lock:
+                    payment = payments.get(reference)
+                    if payment is not None and payment['status'] == 'pending':
+                        payment = payments[reference] = settle(reference)
+                if payment is None:
+                    return self._reply(404, {'error': 'Unknown payment'})
+                self._reply(200, payment)
+
+            def log_message(self, format, *args):
+                pass
+
+        class GatewayServer(ThreadingHTTPServer):
+            # Reconciliation and load tests open many connections at once
+            request_queue_size = 256
+
+        server = GatewayServer((options['host'], options['port']), GatewayHandler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Mock payment gateway on http://{options['host']}:{options['port']}/"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
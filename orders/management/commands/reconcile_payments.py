@@ -0,0 +1,39 @@
+import asyncio
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from orders.reconciliation import reconcile
+
+class Command(BaseCommand):
+    help = 'Settle pending payments by querying their gateways concurrently'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Orders loaded and updated per batch'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Gateway status queries in flight at once'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=10,
+            help='Only reconcile orders created at least this many minutes ago'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report outcomes without changing any orders'
+        )
+
+    def handle(self, *args, **options):
+        checked, paid, failed = asyncio.run(reconcile(
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            min_age=timedelta(minutes=options['min_age']),
+            dry_run=options['dry_run'],
+            log=self.stdout.write,
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {checked} order(s): {paid} paid, {failed} failed, "
+            f"{checked - paid - failed} still pending"
+        ))
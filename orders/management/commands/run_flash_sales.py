@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from orders.flash_sales import run_flash_sales
+
+class Command(BaseCommand):
+    help = 'Open and close flash sales on schedule and sync their shard stock to products (run every minute)'
+
+    def handle(self, *args, **options):
+        opened, closed, synced = run_flash_sales()
+        self.stdout.write(self.style.SUCCESS(
+            f"Opened {opened}, closed {closed} and synced {synced} flash sale(s)"
+        ))
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_shop_orders(apps, schema_editor):
+    """Split existing orders into one sub-order per shop"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    ShopOrder = apps.get_model('orders', 'ShopOrder')
+
+    groups = (
+        OrderItem.objects
+        .values('order_id', 'product__shop_id')
+        .annotate(subtotal=models.Sum('total_price'), item_count=models.Sum('quantity'))
+        .order_by('order_id')
+    )
+    orders = Order.objects.in_bulk({group['order_id'] for group in groups})
+    for group in groups:
+        order = orders[group['order_id']]
+        shop_order = ShopOrder.objects.create(
+            order=order,
+            shop_id=group['product__shop_id'],
+            customer_id=order.user_id,
+            status=order.status,
+            payment_status=order.payment_status,
+            subtotal=group['subtotal'],
+            item_count=group['item_count'],
+            created_at=order.created_at,
+        )
+        OrderItem.objects.filter(
+            order=order, product__shop_id=shop_order.shop_id
+        ).update(shop_order=shop_order)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('market', '0005_watermarkedimage'),
+        ('orders', '0003_order_payment_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], default='pending', max_length=20, verbose_name='status')),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('paid', 'Paid'), ('failed', 'Failed'), ('refunded', 'Refunded')], default='pending', max_length=20, verbose_name='payment status')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='subtotal')),
+                ('item_count', models.PositiveIntegerField(default=0, verbose_name='item count')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to=settings.AUTH_USER_MODEL, verbose_name='customer')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to='orders.order', verbose_name='order')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='shop_orders', to='market.shop', verbose_name='shop')),
+            ],
+            options={
+                'verbose_name': 'shop order',
+                'verbose_name_plural': 'shop orders',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='shop_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.shoporder', verbose_name='shop order'),
+        ),
+        migrations.AddIndex(
+            model_name='shoporder',
+            index=models.Index(fields=['shop', 'payment_status', 'created_at'], name='orders_shop_shop_id_87a67a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoporder',
+            index=models.Index(fields=['shop', 'created_at'], name='orders_shop_shop_id_dd126a_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='shoporder',
+            unique_together={('order', 'shop')},
+        ),
+        migrations.RunPython(create_shop_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0005_watermarkedimage'),
+        ('orders', '0004_shoporder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlashSale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField(verbose_name='starts at')),
+                ('ends_at', models.DateTimeField(verbose_name='ends at')),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('ended', 'Ended')], default='scheduled', max_length=20, verbose_name='status')),
+                ('shard_count', models.PositiveIntegerField(default=8, help_text='Rows the stock is split across while the sale runs', verbose_name='stock shards')),
+                ('admission_rate', models.PositiveIntegerField(default=60, help_text='Buyers let through to checkout per minute', verbose_name='admission rate')),
+                ('admission_burst', models.PositiveIntegerField(default=50, help_text='Buyers let through as soon as the sale opens', verbose_name='admission burst')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flash_sales', to='market.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'flash sale',
+                'verbose_name_plural': 'flash sales',
+                'ordering': ['-starts_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FlashSaleShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='index')),
+                ('stock_quantity', models.PositiveIntegerField(default=0, verbose_name='stock quantity')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='orders.flashsale', verbose_name='flash sale')),
+            ],
+            options={
+                'verbose_name': 'flash sale shard',
+                'verbose_name_plural': 'flash sale shards',
+                'unique_together': {('sale', 'index')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='flashsale',
+            index=models.Index(fields=['status', 'product'], name='orders_flas_status_fb7e4b_idx'),
+        ),
+    ]
@@ -5,7 +5,10 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
-from decimal import Decimal
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .signals import counts_as_sale, shop_order_sales_changed
 
 
 User = get_user_model()
@@ -28,36 +31,36 @@ class Cart(models.Model):
         return f"Cart for {self.user.email}"
 
 
+    @cached_property
+    def summary(self):
+        """Prices for this cart, computed once per instance in a single pass"""
+        from .pricing import price_cart
+        return price_cart(self)
+
     @property
     def get_free_shipping_remaining(self):
         """Calculate remaining amount for free shipping"""
-        free_shipping_threshold = Decimal('50000')
-        if self.subtotal >= free_shipping_threshold:
-            return Decimal('0')
-        return free_shipping_threshold - self.subtotal
+        return self.summary.free_shipping_remaining
 
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.summary.total_items
 
     @property
     def subtotal(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.summary.subtotal
 
     @property
     def tax_amount(self):
-        return self.subtotal * Decimal('0.18')  # 18% VAT
+        return self.summary.tax_amount  # 18% VAT
 
     @property
     def shipping_cost(self):
-        # Free shipping for orders above 50,000 TSh
-        if self.subtotal > Decimal('50000'):
-            return Decimal('0')
-        return Decimal('5000')  # 5,000 TSh standard shipping
+        return self.summary.shipping_cost
 
     @property
     def total(self):
-        return self.subtotal + self.tax_amount + self.shipping_cost
+        return self.summary.total
 
 class CartItem(models.Model):
     cart = models.ForeignKey(
@@ -98,6 +101,7 @@ class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', _('Pending')),
         ('confirmed', _('Confirmed')),
+        ('on_hold', _('On hold')),
         ('processing', _('Processing')),
         ('shipped', _('Shipped')),
         ('delivered', _('Delivered')),
@@ -107,6 +111,7 @@ class Order(models.Model):
 
     PAYMENT_STATUS_CHOICES = (
         ('pending', _('Pending')),
+        ('processing', _('Processing')),
         ('paid', _('Paid')),
         ('failed', _('Failed')),
         ('refunded', _('Refunded')),
@@ -187,6 +192,7 @@ class Order(models.Model):
         blank=True
     )
     payment_date = models.DateTimeField(_('payment date'), blank=True, null=True)
+    payment_error = models.CharField(_('payment error'), max_length=255, blank=True)
     
     # Timestamps
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
@@ -207,16 +213,103 @@ class Order(models.Model):
         if not self.order_number:
             import uuid
             self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if not adding:
+            # Keep the per-shop copies in step (admin edits, shipping updates)
+            update_shop_orders([self.pk], status=self.status, payment_status=self.payment_status)
 
     @property
     def is_paid(self):
         return self.payment_status == 'paid'
 
+    @property
+    def is_payment_settled(self):
+        return self.payment_status in ('paid', 'failed', 'refunded')
+
     @property
     def can_be_cancelled(self):
         return self.status in ['pending', 'confirmed']
 
+class ShopOrder(models.Model):
+    """The part of an order sold by one shop; what sellers list and report on"""
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='shop_orders',
+        verbose_name=_('order')
+    )
+    shop = models.ForeignKey(
+        'market.Shop',
+        on_delete=models.PROTECT,
+        related_name='shop_orders',
+        verbose_name=_('shop')
+    )
+    customer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shop_orders',
+        verbose_name=_('customer')
+    )
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=Order.STATUS_CHOICES,
+        default='pending'
+    )
+    payment_status = models.CharField(
+        _('payment status'),
+        max_length=20,
+        choices=Order.PAYMENT_STATUS_CHOICES,
+        default='pending'
+    )
+    subtotal = models.DecimalField(
+        _('subtotal'),
+        max_digits=12,
+        decimal_places=2
+    )
+    item_count = models.PositiveIntegerField(_('item count'), default=0)
+    # Copied from the order so seller queries never join back to it
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('shop order')
+        verbose_name_plural = _('shop orders')
+        ordering = ['-created_at']
+        unique_together = ['order', 'shop']
+        indexes = [
+            models.Index(fields=['shop', 'payment_status', 'created_at']),
+            models.Index(fields=['shop', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} / {self.shop_id}"
+
+def update_shop_orders(order_ids, **fields):
+    """
+    Copy order status fields onto the orders' shop orders.
+
+    Sends shop_order_sales_changed for shop orders that start or stop
+    counting as sales, so live analytics can apply the difference.
+    """
+    shop_orders = ShopOrder.objects.filter(order_id__in=order_ids)
+    stale = []
+    changes = {}
+    for pk, status, payment_status in shop_orders.values_list('pk', 'status', 'payment_status'):
+        new_status = fields.get('status', status)
+        new_payment_status = fields.get('payment_status', payment_status)
+        if (new_status, new_payment_status) == (status, payment_status):
+            continue
+        stale.append(pk)
+        if counts_as_sale(status, payment_status) != counts_as_sale(new_status, new_payment_status):
+            changes[pk] = 1 if counts_as_sale(new_status, new_payment_status) else -1
+    if stale:
+        ShopOrder.objects.filter(pk__in=stale).update(**fields)
+    if changes:
+        shop_order_sales_changed.send(sender=ShopOrder, changes=changes)
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order,
@@ -224,6 +317,14 @@ class OrderItem(models.Model):
         related_name='items',
         verbose_name=_('order')
     )
+    shop_order = models.ForeignKey(
+        ShopOrder,
+        on_delete=models.CASCADE,
+        related_name='items',
+        blank=True,
+        null=True,
+        verbose_name=_('shop order')
+    )
     product = models.ForeignKey(
         'market.Product',
         on_delete=models.PROTECT,
@@ -255,4 +356,133 @@ class OrderItem(models.Model):
         if not self.product_price:
             self.product_price = self.product.price
         self.total_price = self.product_price * self.quantity
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class StockReservation(models.Model):
+    """Stock held back for a checkout; released on payment failure or when it expires"""
+
+    STATUS_CHOICES = (
+        ('active', _('Active')),
+        ('committed', _('Committed')),
+        ('released', _('Released')),
+    )
+
+    product = models.ForeignKey(
+        'market.Product',
+        on_delete=models.CASCADE,
+        related_name='stock_reservations',
+        verbose_name=_('product')
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations',
+        verbose_name=_('user')
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        related_name='reservations',
+        blank=True,
+        null=True,
+        verbose_name=_('order')
+    )
+    quantity = models.PositiveIntegerField(_('quantity'))
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='active'
+    )
+    expires_at = models.DateTimeField(_('expires at'))
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('stock reservation')
+        verbose_name_plural = _('stock reservations')
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.status})"
+
+class FlashSale(models.Model):
+    """
+    A promotion window for one product whose stock is split across counter
+    shards and whose checkout is gated by an admission queue.
+    """
+
+    STATUS_CHOICES = (
+        ('scheduled', _('Scheduled')),
+        ('active', _('Active')),
+        ('ended', _('Ended')),
+    )
+
+    product = models.ForeignKey(
+        'market.Product',
+        on_delete=models.CASCADE,
+        related_name='flash_sales',
+        verbose_name=_('product')
+    )
+    starts_at = models.DateTimeField(_('starts at'))
+    ends_at = models.DateTimeField(_('ends at'))
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='scheduled'
+    )
+    shard_count = models.PositiveIntegerField(
+        _('stock shards'),
+        default=8,
+        help_text=_('Rows the stock is split across while the sale runs')
+    )
+    admission_rate = models.PositiveIntegerField(
+        _('admission rate'),
+        default=60,
+        help_text=_('Buyers let through to checkout per minute')
+    )
+    admission_burst = models.PositiveIntegerField(
+        _('admission burst'),
+        default=50,
+        help_text=_('Buyers let through as soon as the sale opens')
+    )
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('flash sale')
+        verbose_name_plural = _('flash sales')
+        ordering = ['-starts_at']
+        indexes = [
+            models.Index(fields=['status', 'product']),
+        ]
+
+    def __str__(self):
+        return f"{self.product} ({self.starts_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def is_running(self):
+        return self.status == 'active'
+
+class FlashSaleShard(models.Model):
+    """One slice of a running flash sale's stock"""
+
+    sale = models.ForeignKey(
+        FlashSale,
+        on_delete=models.CASCADE,
+        related_name='shards',
+        verbose_name=_('flash sale')
+    )
+    index = models.PositiveIntegerField(_('index'))
+    stock_quantity = models.PositiveIntegerField(_('stock quantity'), default=0)
+
+    class Meta:
+        verbose_name = _('flash sale shard')
+        verbose_name_plural = _('flash sale shards')
+        unique_together = ['sale', 'index']
+
+    def __str__(self):
+        return f"{self.sale_id}/{self.index}: {self.stock_quantity}"
@@ -1,10 +1,22 @@
 from abc import ABC, abstractmethod
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+import asyncio
 import random
 import time
+import weakref
+
+import httpx
 
 class PaymentGateway(ABC):
-    """Abstract base class for payment gateways"""
+    """
+    Abstract base class for payment gateways.
+
+    Results are dicts with ``success`` and either ``transaction_id`` or ``error``.
+    ``pending: True`` means the outcome is not known yet (request accepted, timed
+    out or gateway unavailable) and must come from a callback or reconciliation.
+    """
     
     @abstractmethod
     def process_payment(self, amount, phone_number, order_reference):
@@ -14,6 +26,16 @@ class PaymentGateway(ABC):
     def get_gateway_name(self):
         pass
 
+    async def aprocess_payment(self, amount, phone_number, order_reference):
+        # Blocking simulators run in a thread so they don't stall the event loop
+        return await sync_to_async(self.process_payment, thread_sensitive=False)(
+            amount, phone_number, order_reference
+        )
+
+    async def aquery_status(self, order_reference):
+        """Current outcome of a payment: a result dict, ``pending`` if unknown"""
+        return {'success': False, 'pending': True, 'error': _('Status lookup not supported')}
+
 class MpesaGateway(PaymentGateway):
     """M-Pesa Payment Gateway"""
     
@@ -105,6 +127,192 @@ class SelcomGateway(PaymentGateway):
     def get_gateway_name(self):
         return 'Selcom'
 
+class StubGateway(PaymentGateway):
+    """Instant gateway for local development and tests; phone numbers ending in 0 are declined"""
+
+    def process_payment(self, amount, phone_number, order_reference):
+        if str(phone_number).endswith('0'):
+            return {
+                'success': False,
+                'error': _('Stub payment declined.')
+            }
+        return {
+            'success': True,
+            'transaction_id': f'STUB-{order_reference}',
+            'message': _('Payment processed successfully via the stub gateway')
+        }
+
+    def get_gateway_name(self):
+        return 'Stub'
+
+class GatewayUnavailable(Exception):
+    """The gateway could not be reached or its circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Stops calling a gateway after ``failure_threshold`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial request is let through; success
+    closes the circuit again, failure keeps it open for another period.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Half-open: let this request probe the gateway
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+_breakers = {}
+# Clients and semaphores belong to one event loop; workers may run several
+_loop_resources = weakref.WeakKeyDictionary()
+
+def _resources():
+    loop = asyncio.get_running_loop()
+    resources = _loop_resources.get(loop)
+    if resources is None:
+        resources = {
+            'client': httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=getattr(settings, 'PAYMENT_HTTP_MAX_CONNECTIONS', 100),
+                max_keepalive_connections=getattr(settings, 'PAYMENT_HTTP_MAX_KEEPALIVE', 20),
+            )),
+            'semaphores': {},
+        }
+        _loop_resources[loop] = resources
+    return resources
+
+class HttpPaymentGateway(PaymentGateway):
+    """
+    Gateway reached over HTTP on a shared, pooled ``httpx.AsyncClient``.
+
+    Settings come from ``PAYMENT_GATEWAY_DEFAULTS`` overridden by
+    ``PAYMENT_GATEWAYS[key]``: ``base_url``, ``api_key``, ``timeout``,
+    ``connect_timeout``, ``retries``, ``backoff``, ``max_concurrency``,
+    ``failure_threshold`` and ``reset_timeout``. Provider adapters override
+    ``payment_request`` and ``parse_result``.
+    """
+
+    RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+    def __init__(self, key, name):
+        self.key = key
+        self.name = name
+        self.config = {
+            **getattr(settings, 'PAYMENT_GATEWAY_DEFAULTS', {}),
+            **getattr(settings, 'PAYMENT_GATEWAYS', {}).get(key, {}),
+        }
+        self.breaker = _breakers.setdefault(key, CircuitBreaker(
+            self.config.get('failure_threshold', 5), self.config.get('reset_timeout', 30)
+        ))
+
+    def get_gateway_name(self):
+        return self.name
+
+    def process_payment(self, amount, phone_number, order_reference):
+        return async_to_sync(self.aprocess_payment)(amount, phone_number, order_reference)
+
+    def payment_request(self, amount, phone_number, order_reference):
+        return 'POST', '/payments', {
+            'amount': amount,
+            'phone_number': phone_number,
+            'reference': order_reference,
+        }
+
+    def parse_result(self, data):
+        status = data.get('status')
+        if status == 'paid':
+            return {'success': True, 'transaction_id': data.get('transaction_id', '')}
+        if status == 'failed':
+            return {'success': False, 'error': data.get('error') or _('Payment was declined.')}
+        return {'success': False, 'pending': True, 'error': data.get('error', '')}
+
+    async def aprocess_payment(self, amount, phone_number, order_reference):
+        method, path, payload = self.payment_request(amount, phone_number, order_reference)
+        try:
+            # The reference doubles as idempotency key, so retried charges are not duplicated
+            response = await self._request(
+                method, path, json=payload, headers={'Idempotency-Key': order_reference}
+            )
+        except GatewayUnavailable as e:
+            print(f"{self.name} payment error for {order_reference}: {e}")
+            return {'success': False, 'pending': True, 'error': str(e)}
+        if response.status_code >= 400:
+            return {'success': False, 'error': _('%(gateway)s rejected the payment.') % {'gateway': self.name}}
+        return self.parse_result(response.json())
+
+    async def aquery_status(self, order_reference):
+        try:
+            response = await self._request('GET', f'/payments/{order_reference}')
+        except GatewayUnavailable as e:
+            return {'success': False, 'pending': True, 'error': str(e)}
+        if response.status_code == 404:
+            return {'success': False, 'error': _('Payment not found at %(gateway)s.') % {'gateway': self.name}}
+        if response.status_code >= 400:
+            return {'success': False, 'pending': True, 'error': f'HTTP {response.status_code}'}
+        return self.parse_result(response.json())
+
+    async def _request(self, method, path, **kwargs):
+        """Send a request with the gateway's timeout, retries, breaker and concurrency limit"""
+        if not self.breaker.allow():
+            raise GatewayUnavailable(f'{self.name} circuit open')
+
+        resources = _resources()
+        semaphore = resources['semaphores'].get(self.key)
+        if semaphore is None:
+            semaphore = resources['semaphores'][self.key] = asyncio.Semaphore(
+                self.config.get('max_concurrency', 20)
+            )
+
+        headers = kwargs.pop('headers', {})
+        if self.config.get('api_key'):
+            headers['Authorization'] = f"Bearer {self.config['api_key']}"
+        timeout = httpx.Timeout(
+            self.config.get('timeout', 10), connect=self.config.get('connect_timeout', 3)
+        )
+        retries = self.config.get('retries', 2)
+        url = self.config['base_url'].rstrip('/') + path
+
+        last_error = None
+        for attempt in range(retries + 1):
+            if attempt:
+                backoff = self.config.get('backoff', 0.5) * 2 ** (attempt - 1)
+                await asyncio.sleep(backoff + random.uniform(0, backoff))
+            try:
+                async with semaphore:
+                    response = await resources['client'].request(
+                        method, url, headers=headers, timeout=timeout, **kwargs
+                    )
+            except httpx.TransportError as e:
+                last_error = e
+                continue
+            if response.status_code in self.RETRY_STATUS_CODES:
+                last_error = httpx.HTTPStatusError(
+                    f'HTTP {response.status_code}', request=response.request, response=response
+                )
+                continue
+            self.breaker.record_success()
+            return response
+
+        self.breaker.record_failure()
+        raise GatewayUnavailable(f'{self.name} unavailable: {last_error!r}')
+
 class PaymentGatewayFactory:
     """Factory class to create payment gateway instances"""
     
@@ -118,6 +326,12 @@ class PaymentGatewayFactory:
         }
         
         gateway_class = gateways.get(gateway_name.lower())
+        backend = getattr(settings, 'PAYMENT_GATEWAY_BACKEND', 'simulator')
+        if gateway_class and backend == 'stub':
+            return StubGateway()
+        if gateway_class and backend == 'http':
+            gateway = gateway_class()
+            return HttpPaymentGateway(gateway_name.lower(), gateway.get_gateway_name())
         if gateway_class:
             return gateway_class()
         raise ValueError(_('Unsupported payment gateway'))
\ No newline at end of file
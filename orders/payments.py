@@ -0,0 +1,157 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CartItem, Order, update_shop_orders
+from .payment_gateways import PaymentGatewayFactory
+from .pricing import forget_cart_counts
+from .stock import InsufficientStock, commit_reservations, release_reservations
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_CHANNEL = 'payment-processing'
+
+# payment_status -> statuses it may move to
+TRANSITIONS = {
+    'pending': {'processing', 'paid', 'failed'},
+    'processing': {'paid', 'failed'},
+    'paid': {'refunded'},
+    'failed': set(),
+    'refunded': set(),
+}
+
+
+def transition(order_id, to_status, **fields):
+    """
+    Move an order's payment to ``to_status`` if its current status allows it.
+
+    The check and the write are one conditional UPDATE, so duplicate callbacks,
+    retried worker messages and concurrent polls cannot apply a result twice.
+    Returns True if this call made the transition.
+    """
+    sources = [status for status, targets in TRANSITIONS.items() if to_status in targets]
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, payment_status__in=sources).update(
+            payment_status=to_status, updated_at=timezone.now(), **fields
+        ):
+            return False
+        shop_fields = {'status': fields['status']} if 'status' in fields else {}
+        update_shop_orders([order_id], payment_status=to_status, **shop_fields)
+    return True
+
+
+def start_payment(order):
+    """Hand the order to the payment worker once the creating transaction commits"""
+    transaction.on_commit(lambda: _notify_worker(order.pk))
+
+
+def _notify_worker(order_id):
+    try:
+        async_to_sync(get_channel_layer().send)(
+            PAYMENT_CHANNEL, {'type': 'payment.process', 'order_id': order_id}
+        )
+    except Exception as e:
+        # The order stays pending and is picked up by reconciliation
+        print(f"Payment queue error: {e}")
+
+
+def _claim(order_id):
+    if not transition(order_id, 'processing'):
+        return None
+    return Order.objects.get(pk=order_id)
+
+
+async def charge(order):
+    """Ask the order's gateway to take payment; never raises"""
+    try:
+        gateway = PaymentGatewayFactory.get_gateway(order.payment_method)
+        return await gateway.aprocess_payment(
+            amount=float(order.total),
+            phone_number=order.shipping_phone,
+            order_reference=order.order_number
+        )
+    except Exception as e:
+        print(f"Payment error for {order.order_number}: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+async def aprocess_order_payment(order_id):
+    """Charge a pending order through its gateway and record the outcome"""
+    order = await database_sync_to_async(_claim)(order_id)
+    if order is None:
+        return
+    result = await charge(order)
+    await database_sync_to_async(apply_payment_result)(order, result)
+
+
+def process_order_payment(order_id):
+    async_to_sync(aprocess_order_payment)(order_id)
+
+
+def apply_payment_result(order, result):
+    """
+    Record a gateway result on ``order``; returns True if it changed the order.
+
+    Results marked ``pending`` leave the order processing until a callback or
+    reconciliation reports the outcome.
+    """
+    if result.get('pending'):
+        return False
+    if result.get('success'):
+        return mark_paid(order, result.get('transaction_id', ''))
+    return mark_failed(order, result.get('error', ''))
+
+
+def hold_oversold(order, error):
+    """
+    Put a paid order whose stock could not be taken on hold.
+
+    This is a payment that landed after its reservation expired and the stock
+    sold out: the order leaves ``confirmed`` and carries a note so staff can
+    refund the customer, or restock and confirm it.
+    """
+    logger.error("Order %s was paid but its stock is gone: %s", order.order_number, error)
+    Order.objects.filter(pk=order.pk).update(
+        status='on_hold', confirmed_at=None, updated_at=timezone.now(),
+        payment_error=f"Paid after the stock sold out ({error}); refund or restock"[:255],
+    )
+    update_shop_orders([order.pk], status='on_hold')
+
+
+def mark_paid(order, reference):
+    now = timezone.now()
+    with transaction.atomic():
+        if not transition(
+            order.pk, 'paid',
+            payment_reference=reference, payment_date=now,
+            status='confirmed', confirmed_at=now,
+        ):
+            return False
+
+        try:
+            commit_reservations(order)
+        except InsufficientStock as e:
+            # The cart stays as it was: nothing was bought yet
+            hold_oversold(order, e)
+            return True
+
+        # The cart is kept until payment succeeds so a failed payment can be retried
+        CartItem.objects.filter(
+            cart__user_id=order.user_id,
+            product__in=order.items.values('product'),
+        ).delete()
+        forget_cart_counts(order.user_id)
+    return True
+
+
+def mark_failed(order, error):
+    with transaction.atomic():
+        if not transition(order.pk, 'failed', payment_error=str(error)[:255]):
+            return False
+        # Give the stock back to other shoppers
+        release_reservations(order.reservations.all())
+    return True
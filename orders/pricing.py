@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import CartItem
+
+TAX_RATE = Decimal('0.18')  # 18% VAT
+FREE_SHIPPING_THRESHOLD = Decimal('50000')
+SHIPPING_COST = Decimal('5000')  # 5,000 TSh standard shipping
+
+
+@dataclass(frozen=True)
+class CartLine:
+    item: CartItem
+    unit_price: Decimal
+    quantity: int
+    total_price: Decimal
+    is_available: bool
+
+    @property
+    def product(self):
+        return self.item.product
+
+
+@dataclass(frozen=True)
+class CartSummary:
+    """Prices of a cart computed in one pass over its lines"""
+
+    lines: tuple
+    total_items: int
+    subtotal: Decimal
+    tax_amount: Decimal
+    shipping_cost: Decimal
+    total: Decimal
+    free_shipping_remaining: Decimal
+    all_available: bool
+
+    @property
+    def is_empty(self):
+        return self.total_items == 0
+
+    @property
+    def items(self):
+        """Cart items with their products, images, shop and category loaded"""
+        return [line.item for line in self.lines]
+
+
+def cart_lines(**filters):
+    return (
+        CartItem.objects.filter(**filters)
+        .select_related('product', 'product__shop', 'product__category')
+        .prefetch_related('product__images')
+        .order_by('added_at', 'pk')
+    )
+
+
+def summarize(items):
+    lines = []
+    total_items = 0
+    subtotal = Decimal('0')
+    all_available = True
+
+    for item in items:
+        product = item.product
+        line_total = product.price * item.quantity
+        available = product.is_in_stock and item.quantity <= product.stock_quantity
+        lines.append(CartLine(
+            item=item,
+            unit_price=product.price,
+            quantity=item.quantity,
+            total_price=line_total,
+            is_available=available,
+        ))
+        total_items += item.quantity
+        subtotal += line_total
+        all_available = all_available and available
+
+    tax_amount = subtotal * TAX_RATE
+    # Free shipping for orders above 50,000 TSh
+    shipping_cost = Decimal('0') if subtotal > FREE_SHIPPING_THRESHOLD else SHIPPING_COST
+    free_shipping_remaining = max(FREE_SHIPPING_THRESHOLD - subtotal, Decimal('0'))
+
+    return CartSummary(
+        lines=tuple(lines),
+        total_items=total_items,
+        subtotal=subtotal,
+        tax_amount=tax_amount,
+        shipping_cost=shipping_cost,
+        total=subtotal + tax_amount + shipping_cost,
+        free_shipping_remaining=free_shipping_remaining,
+        all_available=all_available,
+    )
+
+
+def price_cart(cart):
+    """Summary of ``cart`` from a single query for its lines and products"""
+    return summarize(cart_lines(cart=cart))
+
+
+def _counts_key(user_id):
+    return getattr(settings, 'CART_SUMMARY_CACHE', 'cart_summary_{user_id}').format(user_id=user_id)
+
+
+def cart_counts(user_id):
+    """
+    ``{'count', 'subtotal'}`` for the navbar, served from the cache when possible.
+
+    A miss runs one aggregate query and never creates a cart.
+    """
+    key = _counts_key(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        totals = CartItem.objects.filter(cart__user_id=user_id).aggregate(
+            count=Sum('quantity'),
+            subtotal=Sum(F('quantity') * F('product__price')),
+        )
+        counts = {
+            'count': totals['count'] or 0,
+            'subtotal': Decimal(totals['subtotal'] or 0).quantize(Decimal('0.01')),
+        }
+        cache.set(key, counts, getattr(settings, 'CART_SUMMARY_CACHE_TIMEOUT', 900))
+    return counts
+
+
+def store_cart_counts(user_id, summary):
+    """Write a freshly priced cart into the navbar cache"""
+    cache.set(
+        _counts_key(user_id),
+        {'count': summary.total_items, 'subtotal': summary.subtotal},
+        getattr(settings, 'CART_SUMMARY_CACHE_TIMEOUT', 900),
+    )
+
+
+def forget_cart_counts(user_id):
+    """
+    Drop the cached counts once the surrounding transaction commits.
+
+    Payments are settled by the callback view and the reconcile command, so
+    this relies on the default cache being shared by every process.
+    """
+    transaction.on_commit(lambda: cache.delete(_counts_key(user_id)))
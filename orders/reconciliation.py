@@ -0,0 +1,146 @@
+import asyncio
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CartItem, Order, StockReservation, update_shop_orders
+from .payment_gateways import PaymentGatewayFactory
+from .payments import hold_oversold
+from .pricing import forget_cart_counts
+from .stock import InsufficientStock, commit_reservations, release_reservations
+
+UNSETTLED = ('pending', 'processing')
+
+
+def unsettled_batch(after_id, batch_size, min_age):
+    """Next batch of unsettled orders older than ``min_age``, in primary key order"""
+    cutoff = timezone.now() - min_age
+    return list(
+        Order.objects.filter(
+            pk__gt=after_id, payment_status__in=UNSETTLED, created_at__lt=cutoff
+        ).order_by('pk').only('id', 'order_number', 'payment_method', 'user_id')[:batch_size]
+    )
+
+
+async def query_statuses(orders, concurrency):
+    """Ask each order's gateway for its payment outcome, at most ``concurrency`` at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    gateways = {}
+
+    async def query(order):
+        async with semaphore:
+            try:
+                gateway = gateways.get(order.payment_method)
+                if gateway is None:
+                    gateway = gateways[order.payment_method] = PaymentGatewayFactory.get_gateway(
+                        order.payment_method
+                    )
+                return await gateway.aquery_status(order.order_number)
+            except Exception as e:
+                print(f"Reconciliation error for {order.order_number}: {e}")
+                return {'success': False, 'pending': True, 'error': str(e)}
+
+    return await asyncio.gather(*(query(order) for order in orders))
+
+
+def apply_results(orders, results):
+    """
+    Write definitive outcomes with bulk updates; returns ``(paid, failed)`` counts.
+
+    Rows are locked and re-checked first so orders settled meanwhile by the
+    worker or a callback are left alone.
+    """
+    outcomes = {
+        order.pk: result for order, result in zip(orders, results) if not result.get('pending')
+    }
+    if not outcomes:
+        return 0, 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        locked = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=outcomes, payment_status__in=UNSETTLED)
+            .only('id', 'user_id', 'order_number', 'status')
+        )
+        paid, failed = [], []
+        for order in locked:
+            result = outcomes[order.pk]
+            order.updated_at = now
+            if result.get('success'):
+                order.payment_status = 'paid'
+                order.payment_reference = result.get('transaction_id', '')
+                order.payment_date = now
+                order.status = 'confirmed'
+                order.confirmed_at = now
+                paid.append(order)
+            else:
+                order.payment_status = 'failed'
+                order.payment_error = str(result.get('error', ''))[:255]
+                failed.append(order)
+
+        Order.objects.bulk_update(paid, [
+            'payment_status', 'payment_reference', 'payment_date',
+            'status', 'confirmed_at', 'updated_at',
+        ])
+        Order.objects.bulk_update(failed, ['payment_status', 'payment_error', 'updated_at'])
+        update_shop_orders([order.pk for order in paid], payment_status='paid', status='confirmed')
+        update_shop_orders([order.pk for order in failed], payment_status='failed')
+
+        # Stock held for failed orders goes back in one statement
+        release_reservations(StockReservation.objects.filter(order__in=failed))
+
+        if paid:
+            StockReservation.objects.filter(order__in=paid, status='active').update(
+                status='committed', updated_at=now
+            )
+            lapsed = set(StockReservation.objects.filter(
+                order__in=paid, status='released'
+            ).values_list('order_id', flat=True))
+            held = set()
+            for order in paid:
+                if order.pk in lapsed:
+                    try:
+                        commit_reservations(order)
+                    except InsufficientStock as e:
+                        hold_oversold(order, e)
+                        held.add(order.pk)
+
+            bought = [order for order in paid if order.pk not in held]
+            purchased = Q()
+            for order in bought:
+                purchased |= Q(cart__user_id=order.user_id, product__orderitem__order=order)
+            if bought:
+                CartItem.objects.filter(purchased).delete()
+            for user_id in {order.user_id for order in bought}:
+                forget_cart_counts(user_id)
+
+    return len(paid), len(failed)
+
+
+async def reconcile(batch_size=500, concurrency=50, min_age=timedelta(minutes=10), dry_run=False, log=print):
+    """Settle every stale pending order; returns ``(checked, paid, failed)``"""
+    checked = paid = failed = 0
+    after_id = 0
+    while True:
+        orders = await database_sync_to_async(unsettled_batch)(after_id, batch_size, min_age)
+        if not orders:
+            break
+        after_id = orders[-1].pk
+
+        results = await query_statuses(orders, concurrency)
+        checked += len(orders)
+        if dry_run:
+            for order, result in zip(orders, results):
+                if not result.get('pending'):
+                    log(f"{order.order_number}: {'paid' if result.get('success') else 'failed'}")
+            continue
+
+        batch_paid, batch_failed = await database_sync_to_async(apply_results)(orders, results)
+        paid += batch_paid
+        failed += batch_failed
+        log(f"Checked {checked} order(s): {paid} paid, {failed} failed so far")
+    return checked, paid, failed
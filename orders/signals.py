@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Sent inside the transaction that changes shop orders' status fields, with
+# ``changes``: {shop_order_id: +1 if it now counts as a sale, -1 if it no longer does}
+shop_order_sales_changed = Signal()
+
+# Sent inside the transaction that changes product stock with queryset updates,
+# which skip post_save; ``product_ids``: the products whose stock changed
+stock_changed = Signal()
+
+
+def counts_as_sale(status, payment_status):
+    """Whether a (shop) order with these statuses belongs in sales figures"""
+    return payment_status == 'paid' and status != 'cancelled'
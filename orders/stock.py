@@ -0,0 +1,245 @@
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from market.conditional import bump_catalog_version
+from market.models import Product
+from market.surrogate import product_key, purge_keys
+from .models import FlashSale, FlashSaleShard, StockReservation
+from .signals import stock_changed
+
+
+class InsufficientStock(Exception):
+    """One or more of ``product_ids`` did not have enough stock left; nothing was taken"""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Insufficient stock for product(s) {', '.join(map(str, self.product_ids))}")
+
+
+def _quantities(lines):
+    """Total quantity per product for ``(product_id, quantity)`` pairs"""
+    totals = Counter()
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+    return totals
+
+
+def _stock_changed(product_ids):
+    # Queryset updates skip model signals, so invalidate cached pages here
+    keys = [product_key(product_id) for product_id in product_ids]
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(lambda: purge_keys(*keys))
+    stock_changed.send(sender=Product, product_ids=list(product_ids))
+
+
+def _quantity_case(quantities):
+    """Per-row quantity for a single UPDATE across several products"""
+    return Case(
+        *(When(pk=product_id, then=Value(quantity)) for product_id, quantity in sorted(quantities.items())),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _lock_products(product_ids):
+    """
+    Lock the product rows in primary key order.
+
+    A bare ``UPDATE ... WHERE pk IN (...)`` locks rows in whatever order the
+    plan visits them, so two carts sharing products could deadlock; taking the
+    locks with an ordered SELECT ... FOR UPDATE first makes them queue instead.
+    """
+    list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def running_sales(product_ids):
+    """
+    Open flash sales for ``product_ids``, keyed by product id.
+
+    Goes by status alone: an open sale's shards hold the stock until
+    close_sale folds it back, whatever the clock says.
+    """
+    return {
+        sale.product_id: sale
+        for sale in FlashSale.objects.filter(status='active', product_id__in=product_ids)
+    }
+
+
+def take_shard_stock(sale, quantity):
+    """
+    Take ``quantity`` from a running flash sale's stock shards.
+
+    Shards are tried in random order with a conditional UPDATE each, so
+    concurrent buyers spread over different rows instead of queueing on the
+    product. Only when no single shard can cover the quantity are the shards
+    locked and drawn down together.
+
+    Returns False, taking nothing, if close_sale ended the sale after it was
+    read: its shards are gone and the stock is back on the product row.
+    """
+    indexes = list(range(sale.shard_count))
+    random.shuffle(indexes)
+    for index in indexes:
+        if FlashSaleShard.objects.filter(
+            sale=sale, index=index, stock_quantity__gte=quantity
+        ).update(stock_quantity=F('stock_quantity') - quantity):
+            return True
+
+    shards = list(sale.shards.select_for_update().filter(stock_quantity__gt=0).order_by('index'))
+    if sum(shard.stock_quantity for shard in shards) < quantity:
+        if not FlashSale.objects.filter(pk=sale.pk, status='active').exists():
+            return False
+        raise InsufficientStock([sale.product_id])
+    for shard in shards:
+        taken = min(shard.stock_quantity, quantity)
+        shard.stock_quantity -= taken
+        quantity -= taken
+        if not quantity:
+            break
+    FlashSaleShard.objects.bulk_update(shards, ['stock_quantity'])
+    return True
+
+
+def return_shard_stock(sale, quantity):
+    """Add ``quantity`` back to a random shard; False if the sale's shards are gone"""
+    return bool(FlashSaleShard.objects.filter(
+        sale=sale, index=random.randrange(sale.shard_count)
+    ).update(stock_quantity=F('stock_quantity') + quantity))
+
+
+def take_stock(lines):
+    """
+    Subtract quantities from product stock without overselling.
+
+    The rows are locked in primary key order first, then one conditional
+    UPDATE covers every product (``stock_quantity >= qty`` per row). Must run
+    inside a transaction: if any product is short, fewer rows match,
+    InsufficientStock is raised and the rollback restores the rest.
+
+    Products in a running flash sale draw from the sale's shards instead and
+    leave the product row alone until the sale syncs or closes; a sale that
+    closes mid-checkout falls back to the product row.
+    """
+    quantities = _quantities(lines)
+    for product_id, sale in sorted(running_sales(quantities).items()):
+        if take_shard_stock(sale, quantities[product_id]):
+            del quantities[product_id]
+    if not quantities:
+        return
+    _lock_products(quantities)
+    quantity = _quantity_case(quantities)
+    updated = Product.objects.filter(
+        pk__in=quantities, stock_quantity__gte=quantity
+    ).update(stock_quantity=F('stock_quantity') - quantity, updated_at=timezone.now())
+    if updated != len(quantities):
+        raise InsufficientStock(quantities)
+    _stock_changed(quantities)
+
+
+def return_stock(lines):
+    """Add quantities back to product stock in a single UPDATE, locking rows in take_stock's order"""
+    quantities = _quantities(lines)
+    for product_id, sale in running_sales(quantities).items():
+        if return_shard_stock(sale, quantities[product_id]):
+            del quantities[product_id]
+    if not quantities:
+        return
+    _lock_products(quantities)
+    Product.objects.filter(pk__in=quantities).update(
+        stock_quantity=F('stock_quantity') + _quantity_case(quantities),
+        updated_at=timezone.now(),
+    )
+    _stock_changed(quantities)
+
+
+def reserve_stock(user, lines, ttl=None):
+    """
+    Take stock for ``lines`` and hold it for ``user`` until ``ttl`` seconds from now.
+
+    Runs in its own short transaction so no row locks are held while the
+    customer pays. Raises InsufficientStock if any product is short.
+    """
+    ttl = ttl or getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60)
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    quantities = _quantities(lines)
+
+    with transaction.atomic():
+        take_stock(quantities.items())
+        return StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, user=user, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in sorted(quantities.items())
+        ])
+
+
+def reserve_cart(user, cart_items, ttl=None):
+    return reserve_stock(user, ((item.product_id, item.quantity) for item in cart_items), ttl)
+
+
+def release_reservations(reservations):
+    """
+    Return the stock held by the active reservations in the ``reservations`` queryset.
+
+    Reservations locked by another release or commit are skipped. Returns the
+    number released.
+    """
+    with transaction.atomic():
+        rows = list(
+            reservations.filter(status='active')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', 'product_id', 'quantity')
+        )
+        if not rows:
+            return 0
+
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+            status='released', updated_at=timezone.now()
+        )
+        return_stock((product_id, quantity) for _, product_id, quantity in rows)
+    return len(rows)
+
+
+def commit_reservations(order):
+    """
+    Mark an order's reservations as sold once it is paid.
+
+    Reservations that expired and were released in the meantime take their
+    stock again; raises InsufficientStock if it is gone.
+    """
+    with transaction.atomic():
+        rows = list(
+            order.reservations.select_for_update()
+            .order_by('pk')
+            .values_list('product_id', 'quantity', 'status')
+        )
+        lapsed = [(product_id, quantity) for product_id, quantity, status in rows if status == 'released']
+        if lapsed:
+            take_stock(lapsed)
+        return order.reservations.exclude(status='committed').update(
+            status='committed', updated_at=timezone.now()
+        )
+
+
+def release_expired(now=None, chunk_size=500):
+    """Release active reservations past their expiry in chunks; returns the number released"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(status='active', expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        count = release_reservations(StockReservation.objects.filter(pk__in=ids))
+        if not count:
+            # Everything left is locked by a concurrent release or commit
+            break
+        released += count
+    return released
@@ -1,3 +1,369 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from market.models import Category, Product, Shop
+from .flash_sales import close_sale, open_sale
+from .models import Cart, CartItem, FlashSale, Order, OrderItem, ShopOrder, StockReservation
+from .payments import apply_payment_result, mark_failed, mark_paid, transition
+from .reconciliation import reconcile
+from .stock import (
+    InsufficientStock, commit_reservations, release_expired, release_reservations, reserve_stock,
+    return_stock, take_shard_stock, take_stock,
+)
+
+User = get_user_model()
+
+
+class StockTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(email='seller@example.com', password='x', user_type='seller')
+        cls.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        cls.shop = Shop.objects.create(seller=cls.seller, name='Duka', slug='duka')
+        cls.category = Category.objects.create(name='Vyakula', slug='vyakula')
+
+    def make_product(self, stock, slug='unga'):
+        return Product.objects.create(
+            name=slug.title(), slug=slug, description='', category=self.category, shop=self.shop,
+            price=Decimal('1000'), stock_quantity=stock, status='published',
+        )
+
+    def make_order(self, *reservations, payment_method='mpesa'):
+        """A pending order for the buyer holding ``reservations``"""
+        order = Order.objects.create(
+            user=self.buyer, subtotal=Decimal('1000'), tax_amount=0, shipping_cost=0, total=Decimal('1000'),
+            payment_method=payment_method, shipping_name='Asha', shipping_phone='0712345678',
+            shipping_email='buyer@example.com', shipping_address='Mtaa 1', shipping_region='Dar es Salaam',
+            shipping_district='Ilala',
+        )
+        shop_order = ShopOrder.objects.create(order=order, shop=self.shop, customer=self.buyer, subtotal=order.subtotal)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, shop_order=shop_order, product_id=reservation.product_id, product_name='',
+                product_price=Decimal('1000'), quantity=reservation.quantity,
+                total_price=Decimal('1000') * reservation.quantity,
+            )
+            for reservation in reservations
+        ])
+        StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(order=order)
+        return order
+
+    def stock_of(self, product):
+        return Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+
+
+class ProductStockTests(StockTestCase):
+
+    def setUp(self):
+        self.unga = self.make_product(5, 'unga')
+        self.sukari = self.make_product(2, 'sukari')
+
+    def test_take_subtracts_every_line(self):
+        take_stock([(self.unga.pk, 2), (self.sukari.pk, 1), (self.unga.pk, 1)])
+        self.assertEqual(self.stock_of(self.unga), 2)
+        self.assertEqual(self.stock_of(self.sukari), 1)
+
+    def test_take_exact_stock(self):
+        take_stock([(self.sukari.pk, 2)])
+        self.assertEqual(self.stock_of(self.sukari), 0)
+
+    def test_oversell_takes_nothing(self):
+        # Only sukari is short, but the unga taken in the same call is rolled back too
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock(self.buyer, [(self.unga.pk, 3), (self.sukari.pk, 3)])
+        self.assertIn(self.sukari.pk, raised.exception.product_ids)
+        self.assertEqual(self.stock_of(self.unga), 5)
+        self.assertEqual(self.stock_of(self.sukari), 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_duplicate_lines_count_together(self):
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(self.buyer, [(self.sukari.pk, 1), (self.sukari.pk, 2)])
+        self.assertEqual(self.stock_of(self.sukari), 2)
+
+    def test_reserve_holds_stock(self):
+        reservations = reserve_stock(self.buyer, [(self.unga.pk, 3), (self.sukari.pk, 2)])
+        self.assertEqual(sorted((r.product_id, r.quantity) for r in reservations), [(self.unga.pk, 3), (self.sukari.pk, 2)])
+        self.assertEqual(self.stock_of(self.unga), 2)
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(self.buyer, [(self.sukari.pk, 1)])
+
+    def test_release_returns_stock_once(self):
+        reserve_stock(self.buyer, [(self.unga.pk, 3)])
+        self.assertEqual(release_reservations(StockReservation.objects.all()), 1)
+        self.assertEqual(release_reservations(StockReservation.objects.all()), 0)
+        self.assertEqual(self.stock_of(self.unga), 5)
+
+    def test_release_expired(self):
+        reserve_stock(self.buyer, [(self.unga.pk, 1)], ttl=60)
+        reserve_stock(self.buyer, [(self.unga.pk, 2)], ttl=60 * 60)
+        self.assertEqual(release_expired(now=timezone.now() + timedelta(minutes=5)), 1)
+        self.assertEqual(self.stock_of(self.unga), 3)
+
+    def test_commit_after_release_takes_stock_again(self):
+        reservation, = reserve_stock(self.buyer, [(self.sukari.pk, 2)])
+        order = self.make_order(reservation)
+        release_reservations(StockReservation.objects.all())
+        commit_reservations(order)
+        self.assertEqual(self.stock_of(self.sukari), 0)
+        self.assertEqual(StockReservation.objects.get().status, 'committed')
+
+    def test_commit_after_release_sold_out(self):
+        reservation, = reserve_stock(self.buyer, [(self.sukari.pk, 2)])
+        order = self.make_order(reservation)
+        release_reservations(StockReservation.objects.all())
+        take_stock([(self.sukari.pk, 1)])
+        with self.assertRaises(InsufficientStock):
+            commit_reservations(order)
+        self.assertEqual(self.stock_of(self.sukari), 1)
+        self.assertEqual(StockReservation.objects.get().status, 'released')
+
+
+class FlashSaleStockTests(StockTestCase):
+
+    def setUp(self):
+        self.product = self.make_product(10)
+        now = timezone.now()
+        self.sale = FlashSale.objects.create(
+            product=self.product, starts_at=now, ends_at=now + timedelta(hours=1), shard_count=4,
+        )
+        open_sale(self.sale)
+        self.sale.refresh_from_db()
+
+    def shard_total(self):
+        return sum(self.sale.shards.values_list('stock_quantity', flat=True))
+
+    def test_open_splits_stock_across_shards(self):
+        self.assertEqual(list(self.sale.shards.order_by('index').values_list('stock_quantity', flat=True)), [3, 3, 2, 2])
+
+    def test_take_draws_from_shards_not_product(self):
+        take_stock([(self.product.pk, 7)])
+        self.assertEqual(self.shard_total(), 3)
+        self.assertEqual(self.stock_of(self.product), 10)
+
+    def test_take_spanning_shards(self):
+        # No single shard holds 9, so the shards are drawn down together
+        self.assertTrue(take_shard_stock(self.sale, 9))
+        self.assertEqual(self.shard_total(), 1)
+
+    def test_oversell_raises(self):
+        with self.assertRaises(InsufficientStock):
+            take_shard_stock(self.sale, 11)
+        self.assertEqual(self.shard_total(), 10)
+
+    def test_return_goes_back_to_shards(self):
+        take_stock([(self.product.pk, 4)])
+        return_stock([(self.product.pk, 4)])
+        self.assertEqual(self.shard_total(), 10)
+        self.assertEqual(self.stock_of(self.product), 10)
+
+    def test_close_folds_shards_into_product(self):
+        take_stock([(self.product.pk, 4)])
+        self.assertTrue(close_sale(self.sale))
+        self.assertEqual(self.stock_of(self.product), 6)
+        self.assertFalse(self.sale.shards.exists())
+
+    def test_take_after_close_falls_back_to_product(self):
+        # A buyer that read the sale as running just before it closed
+        stale = FlashSale.objects.get(pk=self.sale.pk)
+        close_sale(self.sale)
+        self.assertFalse(take_shard_stock(stale, 2))
+
+        take_stock([(self.product.pk, 2)])
+        self.assertEqual(self.stock_of(self.product), 8)
+
+    def test_return_after_close_goes_to_product(self):
+        take_stock([(self.product.pk, 4)])
+        close_sale(self.sale)
+        return_stock([(self.product.pk, 4)])
+        self.assertEqual(self.stock_of(self.product), 10)
+
+
+@override_settings(PAYMENT_CALLBACK_SECRET='siri')
+class PaymentTests(StockTestCase):
+
+    def setUp(self):
+        self.product = self.make_product(5)
+        CartItem.objects.create(cart=Cart.objects.create(user=self.buyer), product=self.product, quantity=2)
+        self.order = self.make_order(*reserve_stock(self.buyer, [(self.product.pk, 2)]))
+
+    def payment_status(self):
+        return Order.objects.values_list('payment_status', flat=True).get(pk=self.order.pk)
+
+    def callback(self, payload, secret='siri'):
+        body = json.dumps(payload).encode()
+        return self.client.post(
+            reverse('orders:payment_callback', kwargs={'gateway': self.order.payment_method}),
+            body, content_type='application/json',
+            HTTP_X_PAYMENT_SIGNATURE=hmac.new(secret.encode(), body, hashlib.sha256).hexdigest(),
+        )
+
+    def test_allowed_transitions(self):
+        self.assertTrue(transition(self.order.pk, 'processing'))
+        self.assertFalse(transition(self.order.pk, 'processing'))
+        self.assertFalse(transition(self.order.pk, 'refunded'))
+        self.assertTrue(transition(self.order.pk, 'paid'))
+        self.assertTrue(transition(self.order.pk, 'refunded'))
+        self.assertFalse(transition(self.order.pk, 'paid'))
+        self.assertEqual(self.payment_status(), 'refunded')
+
+    def test_failed_is_final(self):
+        self.assertTrue(transition(self.order.pk, 'failed'))
+        self.assertFalse(transition(self.order.pk, 'paid'))
+        self.assertEqual(self.payment_status(), 'failed')
+
+    def test_paid_commits_stock_and_clears_cart(self):
+        self.assertTrue(mark_paid(self.order, 'TX1'))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.payment_status, self.order.status), ('paid', 'confirmed'))
+        self.assertEqual(self.order.payment_reference, 'TX1')
+        self.assertEqual(list(self.order.shop_orders.values_list('payment_status', 'status')), [('paid', 'confirmed')])
+        self.assertEqual(self.order.reservations.get().status, 'committed')
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.stock_of(self.product), 3)
+
+    def test_paid_after_reservation_lapsed_and_sold_out(self):
+        release_expired(now=timezone.now() + timedelta(days=1))
+        take_stock([(self.product.pk, 4)])
+        with self.assertLogs('orders.payments', 'ERROR'):
+            self.assertTrue(mark_paid(self.order, 'TX1'))
+
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.payment_status, self.order.status), ('paid', 'on_hold'))
+        self.assertIsNone(self.order.confirmed_at)
+        self.assertIn('refund or restock', self.order.payment_error)
+        self.assertEqual(list(self.order.shop_orders.values_list('status', flat=True)), ['on_hold'])
+        self.assertEqual(self.order.reservations.get().status, 'released')
+        self.assertEqual(self.stock_of(self.product), 1)
+        self.assertTrue(CartItem.objects.exists())
+
+    def test_paid_after_reservation_lapsed_with_stock_left(self):
+        release_expired(now=timezone.now() + timedelta(days=1))
+        self.assertTrue(mark_paid(self.order, 'TX1'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(self.order.reservations.get().status, 'committed')
+        self.assertEqual(self.stock_of(self.product), 3)
+
+    def test_paid_twice_applies_once(self):
+        self.assertTrue(mark_paid(self.order, 'TX1'))
+        self.assertFalse(mark_paid(self.order, 'TX2'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_reference, 'TX1')
+
+    def test_failed_releases_stock_and_keeps_cart(self):
+        self.assertTrue(mark_failed(self.order, 'Insufficient balance'))
+        self.assertFalse(mark_failed(self.order, 'Insufficient balance'))
+        self.assertEqual(self.order.reservations.get().status, 'released')
+        self.assertEqual(self.stock_of(self.product), 5)
+        self.assertTrue(CartItem.objects.exists())
+
+    def test_pending_result_leaves_order(self):
+        transition(self.order.pk, 'processing')
+        self.assertFalse(apply_payment_result(self.order, {'pending': True}))
+        self.assertEqual(self.payment_status(), 'processing')
+
+    def test_duplicate_callbacks(self):
+        payload = {'order_reference': self.order.order_number, 'success': True, 'transaction_id': 'TX1'}
+        self.assertEqual(self.callback(payload).json(), {'success': True, 'applied': True})
+        self.assertEqual(self.callback(payload).json(), {'success': True, 'applied': False})
+        self.assertEqual(self.stock_of(self.product), 3)
+        self.assertEqual(self.payment_status(), 'paid')
+
+    def test_failure_callback_after_success_is_ignored(self):
+        self.callback({'order_reference': self.order.order_number, 'success': True, 'transaction_id': 'TX1'})
+        response = self.callback({'order_reference': self.order.order_number, 'success': False, 'error': 'timeout'})
+        self.assertEqual(response.json()['applied'], False)
+        self.assertEqual(self.payment_status(), 'paid')
+        self.assertEqual(self.order.reservations.get().status, 'committed')
+
+    def test_callback_signature(self):
+        payload = {'order_reference': self.order.order_number, 'success': True}
+        self.assertEqual(self.callback(payload, secret='wrong').status_code, 403)
+        self.assertEqual(self.payment_status(), 'pending')
+
+    def test_callback_unknown_order(self):
+        self.assertEqual(self.callback({'order_reference': 'ORD-NONE', 'success': True}).status_code, 404)
+
+
+class StatusGateway:
+    """Answers status queries from a dict of order number -> result"""
+
+    def __init__(self, results):
+        self.results = results
+
+    async def aquery_status(self, order_reference):
+        return self.results.get(order_reference, {'success': False, 'pending': True})
+
+
+class ReconciliationTests(StockTestCase):
+
+    def setUp(self):
+        self.product = self.make_product(6)
+        self.orders = {
+            outcome: self.make_order(*reserve_stock(self.buyer, [(self.product.pk, 1)]))
+            for outcome in ('paid', 'failed', 'lapsed', 'sold_out', 'pending')
+        }
+        CartItem.objects.create(cart=Cart.objects.create(user=self.buyer), product=self.product, quantity=1)
+        Order.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    def reconcile(self, results, **kwargs):
+        gateway = StatusGateway({self.orders[outcome].order_number: result for outcome, result in results.items()})
+        with mock.patch('orders.reconciliation.PaymentGatewayFactory.get_gateway', return_value=gateway):
+            return async_to_sync(reconcile)(batch_size=2, log=StringIO().write, **kwargs)
+
+    def order(self, outcome):
+        return Order.objects.get(pk=self.orders[outcome].pk)
+
+    def test_outcomes(self):
+        # Both lapsed orders lose their hold and others buy it; only the failed order's unit comes back
+        release_reservations(StockReservation.objects.filter(order__in=[self.orders['lapsed'], self.orders['sold_out']]))
+        take_stock([(self.product.pk, 3)])
+
+        with self.assertLogs('orders.payments', 'ERROR'):
+            checked, paid, failed = self.reconcile({
+                'paid': {'success': True, 'transaction_id': 'TX1'},
+                'failed': {'success': False, 'error': 'Declined'},
+                'lapsed': {'success': True, 'transaction_id': 'TX2'},
+                'sold_out': {'success': True, 'transaction_id': 'TX3'},
+            })
+        self.assertEqual((checked, paid, failed), (5, 3, 1))
+
+        self.assertEqual((self.order('paid').payment_status, self.order('paid').status), ('paid', 'confirmed'))
+        self.assertEqual(self.orders['paid'].reservations.get().status, 'committed')
+        self.assertEqual((self.order('failed').payment_status, self.order('failed').payment_error), ('failed', 'Declined'))
+        self.assertEqual(self.orders['failed'].reservations.get().status, 'released')
+        self.assertEqual(self.order('lapsed').status, 'confirmed')
+        self.assertEqual(self.orders['lapsed'].reservations.get().status, 'committed')
+
+        sold_out = self.order('sold_out')
+        self.assertEqual((sold_out.payment_status, sold_out.status), ('paid', 'on_hold'))
+        self.assertIn('refund or restock', sold_out.payment_error)
+        self.assertEqual(self.orders['sold_out'].reservations.get().status, 'released')
+
+        self.assertEqual(self.order('pending').payment_status, 'pending')
+        self.assertEqual(self.stock_of(self.product), 0)
+
+    def test_dry_run_changes_nothing(self):
+        checked, paid, failed = self.reconcile({'paid': {'success': True}}, dry_run=True)
+        self.assertEqual((checked, paid, failed), (5, 0, 0))
+        self.assertEqual(self.order('paid').payment_status, 'pending')
+
+    def test_recent_orders_are_left(self):
+        Order.objects.filter(pk=self.orders['paid'].pk).update(created_at=timezone.now())
+        checked, paid, _ = self.reconcile({'paid': {'success': True}})
+        self.assertEqual((checked, paid), (4, 0))
+        self.assertEqual(self.order('paid').payment_status, 'pending')
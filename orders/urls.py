@@ -15,6 +15,11 @@ urlpatterns = [
     
     # Checkout URLs
     path('checkout/', views.checkout, name='checkout'),
+    path('flash-sale/<int:sale_id>/queue/', views.flash_sale_queue, name='flash_sale_queue'),
+    path('flash-sale/<int:sale_id>/queue/status/', views.flash_sale_queue_status, name='flash_sale_queue_status'),
     path('order/success/<int:order_id>/', views.order_success, name='order_success'),
     path('order/failed/<int:order_id>/', views.order_failed, name='order_failed'),
+    path('order/pending/<int:order_id>/', views.order_pending, name='order_pending'),
+    path('order/status/<int:order_id>/', views.order_payment_status, name='order_payment_status'),
+    path('payments/callback/<str:gateway>/', views.payment_callback, name='payment_callback'),
 ]
\ No newline at end of file
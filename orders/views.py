@@ -1,25 +1,35 @@
+import hashlib
+import hmac
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.db import transaction
+from django.utils import timezone
 
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, CartItem, FlashSale, Order, OrderItem, ShopOrder, StockReservation
 from .forms import CheckoutForm, CartItemForm
-from .payment_gateways import PaymentGatewayFactory
+from .flash_sales import admission, waiting_sale
+from .payments import apply_payment_result, start_payment
+from .pricing import cart_counts, forget_cart_counts, store_cart_counts
+from .stock import InsufficientStock, release_reservations, reserve_cart
 from market.models import Product
 
 @login_required
 def cart_view(request):
     """Display user's shopping cart"""
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('product', 'product__shop', 'product__category')
     
     context = {
         'cart': cart,
-        'cart_items': cart_items,
+        'cart_items': cart.summary.items,
     }
     return render(request, 'orders/cart.html', context)
 
@@ -54,6 +64,7 @@ def add_to_cart(request, product_id):
         cart_item.quantity += 1
         cart_item.save()
     
+    store_cart_counts(request.user.pk, cart.summary)
     return JsonResponse({
         'success': True,
         'message': _('Product added to cart'),
@@ -64,8 +75,10 @@ def add_to_cart(request, product_id):
 @require_POST
 def update_cart_item(request, item_id):
     """Update cart item quantity"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    form = CartItemForm(request.POST, instance=cart_item)
+    cart_item = get_object_or_404(
+        CartItem.objects.select_related('product'), id=item_id, cart__user=request.user
+    )
+    form = CartItemForm(request.POST)
     
     if form.is_valid():
         quantity = form.cleaned_data['quantity']
@@ -74,7 +87,9 @@ def update_cart_item(request, item_id):
         if quantity > cart_item.product.stock_quantity:
             messages.error(request, _('Requested quantity exceeds available stock'))
         else:
-            form.save()
+            cart_item.quantity = quantity
+            cart_item.save(update_fields=['quantity'])
+            forget_cart_counts(request.user.pk)
             messages.success(request, _('Cart updated successfully'))
     
     return redirect('orders:cart')
@@ -85,6 +100,7 @@ def remove_from_cart(request, item_id):
     """Remove item from cart"""
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     cart_item.delete()
+    forget_cart_counts(request.user.pk)
     messages.success(request, _('Item removed from cart'))
     return redirect('orders:cart')
 
@@ -92,23 +108,27 @@ def remove_from_cart(request, item_id):
 def checkout(request):
     """Checkout process"""
     cart = get_object_or_404(Cart, user=request.user)
-    cart_items = cart.items.select_related('product')
+    summary = cart.summary
     
-    if cart.total_items == 0:
+    if summary.is_empty:
         messages.warning(request, _('Your cart is empty'))
         return redirect('orders:cart')
     
     # Check stock availability
-    for item in cart_items:
-        if not item.is_available:
-            messages.error(request, 
-                _('Some items in your cart are no longer available. Please review your cart.'))
-            return redirect('orders:cart')
+    if not summary.all_available:
+        messages.error(request, 
+            _('Some items in your cart are no longer available. Please review your cart.'))
+        return redirect('orders:cart')
+
+    # Flash sale items are only sold to buyers the sale's queue has let through
+    sale = waiting_sale(request, [line.product.pk for line in summary.lines])
+    if sale is not None:
+        return redirect('orders:flash_sale_queue', sale_id=sale.pk)
     
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            return process_checkout(request, cart, form.cleaned_data)
+            return process_checkout(request, summary, form.cleaned_data)
     else:
         # Pre-fill form with user data
         initial_data = {
@@ -120,82 +140,161 @@ def checkout(request):
     
     context = {
         'cart': cart,
+        'cart_items': summary.items,
         'form': form,
     }
     return render(request, 'orders/checkout.html', context)
 
-@transaction.atomic
-def process_checkout(request, cart, form_data):
-    """Process checkout and create order"""
+def process_checkout(request, summary, form_data):
+    """Reserve stock and create a pending order; the payment worker charges it"""
     try:
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            subtotal=cart.subtotal,
-            tax_amount=cart.tax_amount,
-            shipping_cost=cart.shipping_cost,
-            total=cart.total,
-            payment_method=form_data['payment_method'],
-            shipping_name=form_data['shipping_name'],
-            shipping_phone=form_data['shipping_phone'],
-            shipping_email=form_data['shipping_email'],
-            shipping_address=form_data['shipping_address'],
-            shipping_region=form_data['shipping_region'],
-            shipping_district=form_data['shipping_district'],
-            shipping_ward=form_data.get('shipping_ward', ''),
-        )
-        
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                product_name=cart_item.product.name,
-                product_price=cart_item.product.price,
-                quantity=cart_item.quantity,
-                total_price=cart_item.total_price
+        # Committed on its own so no product rows stay locked while the order is written
+        reservations = reserve_cart(request.user, summary.items)
+    except InsufficientStock:
+        messages.error(request,
+            _('Some items in your cart are no longer available. Please review your cart.'))
+        return redirect('orders:cart')
+    held = StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations])
+
+    try:
+        with transaction.atomic():
+            # Create order
+            order = Order.objects.create(
+                user=request.user,
+                subtotal=summary.subtotal,
+                tax_amount=summary.tax_amount,
+                shipping_cost=summary.shipping_cost,
+                total=summary.total,
+                payment_method=form_data['payment_method'],
+                shipping_name=form_data['shipping_name'],
+                shipping_phone=form_data['shipping_phone'],
+                shipping_email=form_data['shipping_email'],
+                shipping_address=form_data['shipping_address'],
+                shipping_region=form_data['shipping_region'],
+                shipping_district=form_data['shipping_district'],
+                shipping_ward=form_data.get('shipping_ward', ''),
             )
-            
-            # Update product stock
-            cart_item.product.stock_quantity -= cart_item.quantity
-            cart_item.product.save()
-        
-        # Process payment
-        payment_gateway = PaymentGatewayFactory.get_gateway(form_data['payment_method'])
-        payment_result = payment_gateway.process_payment(
-            amount=float(order.total),
-            phone_number=form_data['shipping_phone'],
-            order_reference=order.order_number
-        )
-        
-        if payment_result['success']:
-            order.payment_status = 'paid'
-            order.payment_reference = payment_result['transaction_id']
-            order.status = 'confirmed'
-            order.confirmed_at = timezone.now()
-            order.save()
-            
-            # Clear cart
-            cart.items.all().delete()
-            
-            messages.success(request, _('Order placed successfully!'))
-            return redirect('orders:order_success', order_id=order.id)
-        else:
-            order.payment_status = 'failed'
-            order.save()
-            
-            # Restore product stock
-            for order_item in order.items.all():
-                order_item.product.stock_quantity += order_item.quantity
-                order_item.product.save()
-            
-            messages.error(request, payment_result['error'])
-            return redirect('orders:checkout')
-            
+
+            # One sub-order per shop, so seller pages read their own rows directly
+            lines_by_shop = {}
+            for line in summary.lines:
+                lines_by_shop.setdefault(line.product.shop_id, []).append(line)
+            shop_orders = ShopOrder.objects.bulk_create([
+                ShopOrder(
+                    order=order,
+                    shop_id=shop_id,
+                    customer=request.user,
+                    subtotal=sum(line.total_price for line in lines),
+                    item_count=sum(line.quantity for line in lines),
+                    created_at=order.created_at,
+                )
+                for shop_id, lines in lines_by_shop.items()
+            ])
+            shop_order_ids = {shop_order.shop_id: shop_order.pk for shop_order in shop_orders}
+
+            # Create order items from the priced cart in one INSERT
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    shop_order_id=shop_order_ids[line.product.shop_id],
+                    product=line.product,
+                    product_name=line.product.name,
+                    product_price=line.unit_price,
+                    quantity=line.quantity,
+                    total_price=line.total_price
+                )
+                for line in summary.lines
+            ])
+            held.update(order=order)
+            start_payment(order)
     except Exception as e:
+        print(f"Checkout error: {e}")
+        release_reservations(held)
         messages.error(request, _('An error occurred during checkout. Please try again.'))
         return redirect('orders:checkout')
 
+    return redirect('orders:order_pending', order_id=order.id)
+
+@login_required
+def order_pending(request, order_id):
+    """Waiting page shown while the payment worker charges the order"""
+    order = get_object_or_404(Order, id=order_id, user=request.user)
+    if order.is_payment_settled:
+        return redirect(_payment_result_url(order))
+    return render(request, 'orders/order_pending.html', {'order': order})
+
+@login_required
+def order_payment_status(request, order_id):
+    """Polled by the pending page until the payment settles"""
+    order = get_object_or_404(
+        Order.objects.only('id', 'user_id', 'status', 'payment_status'),
+        id=order_id, user=request.user
+    )
+    return JsonResponse({
+        'payment_status': order.payment_status,
+        'status': order.status,
+        'redirect_url': _payment_result_url(order) if order.is_payment_settled else None,
+    })
+
+@login_required
+def flash_sale_queue(request, sale_id):
+    """Waiting room shown until the flash sale's queue admits the buyer"""
+    sale = get_object_or_404(FlashSale.objects.select_related('product'), id=sale_id)
+    if not sale.is_running:
+        return redirect('orders:checkout')
+    admitted, position = admission(request, sale)
+    if admitted:
+        return redirect('orders:checkout')
+    return render(request, 'orders/flash_sale_queue.html', {
+        'sale': sale,
+        'position': position,
+        'wait_minutes': -(-position // max(sale.admission_rate, 1)),
+    })
+
+@login_required
+def flash_sale_queue_status(request, sale_id):
+    """Polled by the waiting room until the buyer is admitted"""
+    sale = get_object_or_404(FlashSale, id=sale_id)
+    admitted, position = admission(request, sale) if sale.is_running else (True, 0)
+    return JsonResponse({
+        'position': position,
+        'redirect_url': reverse('orders:checkout') if admitted else None,
+    })
+
+def _payment_result_url(order):
+    if order.is_paid:
+        return reverse('orders:order_success', kwargs={'order_id': order.id})
+    return reverse('orders:order_failed', kwargs={'order_id': order.id})
+
+@csrf_exempt
+@require_POST
+def payment_callback(request, gateway):
+    """
+    Result notification from a payment gateway.
+
+    Expects a JSON body ``{"order_reference", "success", "transaction_id", "error"}``
+    signed with HMAC-SHA256 of the raw body under ``PAYMENT_CALLBACK_SECRET`` in the
+    ``X-Payment-Signature`` header. Repeated notifications are harmless.
+    """
+    secret = getattr(settings, 'PAYMENT_CALLBACK_SECRET', '')
+    signature = request.headers.get('X-Payment-Signature', '')
+    expected = hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+    if not secret or not hmac.compare_digest(signature, expected):
+        return JsonResponse({'success': False, 'error': 'invalid signature'}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+        order = Order.objects.get(
+            order_number=payload['order_reference'], payment_method=gateway
+        )
+    except (ValueError, KeyError):
+        return JsonResponse({'success': False, 'error': 'invalid payload'}, status=400)
+    except Order.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'unknown order'}, status=404)
+
+    applied = apply_payment_result(order, payload)
+    return JsonResponse({'success': True, 'applied': applied})
+
 @login_required
 def order_success(request, order_id):
     """Order success page"""
@@ -217,9 +316,9 @@ def order_failed(request, order_id):
 # AJAX view for cart count
 @login_required
 def get_cart_count(request):
-    """Get cart item count for navbar"""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    return JsonResponse({'count': cart.total_items})
+    """Get cart item count for navbar; answered from the cache without touching the cart"""
+    counts = cart_counts(request.user.pk)
+    return JsonResponse({'count': counts['count'], 'subtotal': str(counts['subtotal'])})
 
 
 
@@ -227,7 +326,7 @@ def get_cart_count(request):
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Order, OrderItem
+from market.models import Shop
 
 @login_required
 def seller_orders(request):
@@ -239,13 +338,9 @@ def seller_orders(request):
     try:
         # FIXED: using seller instead of user.shop
         shop = Shop.objects.get(seller=request.user)
-        # Get orders that contain products from this seller's shop
-        order_items = OrderItem.objects.filter(product__shop=shop).select_related('order', 'product')
-        
-        # Get unique orders
-        orders = Order.objects.filter(
-            items__product__shop=shop
-        ).distinct().order_by('-created_at')
+        # Each order's share for this shop lives in its own indexed sub-order row
+        orders = ShopOrder.objects.filter(shop=shop).select_related('order', 'customer')
+        order_items = OrderItem.objects.filter(shop_order__shop=shop).select_related('order', 'product')
         
     except Shop.DoesNotExist:
         messages.error(request, 'Unahtaji kuwa na duka kwanza!')
@@ -14,9 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sokoletu.settings')
 
 application = get_asgi_application()
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import dashboard.routing
+from market.consumers import WatermarkConsumer
+from orders.consumers import PaymentConsumer
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sokoletu.settings')
 
@@ -27,4 +29,8 @@ application = ProtocolTypeRouter({
             dashboard.routing.websocket_urlpatterns
         )
     ),
+    "channel": ChannelNameRouter({
+        "image-watermark": WatermarkConsumer.as_asgi(),
+        "payment-processing": PaymentConsumer.as_asgi(),
+    }),
 })
\ No newline at end of file
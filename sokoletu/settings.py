@@ -32,6 +32,8 @@ INSTALLED_APPS = [
     'django_redis',
     'dashboard',
     'pyuploadcare.dj',
+    'rest_framework',
+    'api',
 
 
 
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'market.middleware.SurrogateKeyMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Ongeza hapa juu ya CommonMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -54,6 +57,7 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 
 WSGI_APPLICATION = 'sokoletu.wsgi.application'
+ASGI_APPLICATION = 'sokoletu.asgi.application'
 
 
 ROOT_URLCONF = 'sokoletu.urls'
@@ -142,6 +146,12 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized/WebP variants of local media served from /media-cache/
+MEDIA_DERIVATIVE_CACHE_DIR = BASE_DIR / 'media_cache'
+MEDIA_DERIVATIVE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+MEDIA_DERIVATIVE_WIDTHS = (150, 300, 600, 1200)
+MEDIA_DERIVATIVE_QUALITY = 75
+
 SITE_ID = 1
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -163,25 +173,14 @@ SESSION_SAVE_EVERY_REQUEST = True
 PROFILE_COMPLETION_REQUIRED = True
 
 
-# settings.py
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django_redis.cache.RedisCache',
-#         'LOCATION': 'redis://127.0.0.1:6379/1',
-#         'OPTIONS': {
-#             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-#         }
-#     }
-# }
-
-
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
 
 # Channel layers (using Redis for production, InMemory for development)
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+            "hosts": [f'{REDIS_URL}/0'],
         },
     },
 }
@@ -196,18 +195,113 @@ if DEBUG:
 
 
 
+# Shared by every web process, worker and management command: the catalog version,
+# cart counts, flash sale queue tickets and dashboard refresh locks rely on that
 CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-sokoletu-cache",
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        }
     }
 }
 
+# For development and tests (one process, so a local cache is shared enough); set REDIS_URL in production
+if DEBUG or not os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Read-only catalog API (/api/)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+}
 
 # Cache keys
 SEARCH_SUGGESTIONS_CACHE = 'search_suggestions_{query}'
 PRODUCT_RECOMMENDATIONS_CACHE = 'recommendations_{user_id}_{session_key}'
 CATEGORY_PRODUCTS_CACHE = 'category_products_{category_slug}'
+# Bumped on every catalog change (from any process); listing page ETags depend on it.
+# Product pages go by the product, shop and category updated_at plus the media version,
+# bumped when the watermark pipeline finishes images
+CATALOG_VERSION_CACHE = 'catalog_version'
+MEDIA_VERSION_CACHE = 'media_version'
+# Navbar cart count/subtotal; rewritten on every cart change and dropped when a payment settles
+# (from whichever process settles it). Price edits show up after the timeout
+CART_SUMMARY_CACHE = 'cart_summary_{user_id}'
+CART_SUMMARY_CACHE_TIMEOUT = 60 * 15
+# Seller analytics polled by the dashboard: served from cache, recomputed in the background
+# (one refresh per seller at a time) once older than the soft TTL
+DASHBOARD_ANALYTICS_CACHE = 'dashboard_analytics_{seller_id}'
+DASHBOARD_ANALYTICS_SOFT_TTL = 30
+DASHBOARD_ANALYTICS_CACHE_TIMEOUT = 60 * 15
+# Longest range the sales chart API will build
+DASHBOARD_CHART_MAX_DAYS = 5 * 366
+# Widest moving average window (in buckets) the sales chart API accepts
+DASHBOARD_CHART_MAX_WINDOW = 90
+# Chat messages sent over WebSockets are written in batches: after this many seconds
+# or as soon as this many are waiting, whichever comes first
+CHAT_WRITE_BATCH_DELAY = 0.005
+CHAT_WRITE_BATCH_SIZE = 100
+# Messages per chat history page (chat_history API and the chat socket's history command)
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 100
+
+# HTTP cache in front of the site: responses are tagged with surrogate keys and
+# purged by key on catalog changes (python manage.py surrogate_purge_stub for local testing)
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+SURROGATE_CACHE_TTL = 6 * 60 * 60
+SURROGATE_PURGE_URL = os.environ.get('SURROGATE_PURGE_URL')
+SURROGATE_PURGE_TOKEN = os.environ.get('SURROGATE_PURGE_TOKEN')
+SURROGATE_PURGE_BATCH_SIZE = 100
+SURROGATE_PURGE_INTERVAL = 0.5
+SURROGATE_PURGE_TIMEOUT = 5
+
+# Product view rollups (python manage.py rollup_product_views)
+PRODUCT_VIEW_RETENTION_DAYS = 90
+PRODUCT_VIEW_PRUNE_CHUNK_SIZE = 5000
+
+# Payments are charged by the payment-processing worker. 'stub' swaps every
+# gateway for orders.payment_gateways.StubGateway (numbers ending in 0 are declined),
+# 'http' uses HttpPaymentGateway (python manage.py payment_gateway_mock for local testing)
+PAYMENT_GATEWAY_BACKEND = os.environ.get('PAYMENT_GATEWAY_BACKEND', 'simulator')
+PAYMENT_GATEWAY_DEFAULTS = {
+    'base_url': os.environ.get('PAYMENT_GATEWAY_URL', 'http://127.0.0.1:8098'),
+    'timeout': 10,
+    'connect_timeout': 3,
+    'retries': 2,
+    'backoff': 0.5,
+    'max_concurrency': 20,
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+}
+PAYMENT_GATEWAYS = {
+    'mpesa': {'api_key': os.environ.get('MPESA_API_KEY', '')},
+    'tigopesa': {'api_key': os.environ.get('TIGOPESA_API_KEY', '')},
+    'airtelmoney': {'api_key': os.environ.get('AIRTELMONEY_API_KEY', '')},
+    'selcom': {'api_key': os.environ.get('SELCOM_API_KEY', ''), 'timeout': 20},
+}
+PAYMENT_HTTP_MAX_CONNECTIONS = 100
+PAYMENT_HTTP_MAX_KEEPALIVE = 20
+# Shared secret gateways use to sign result callbacks (X-Payment-Signature)
+PAYMENT_CALLBACK_SECRET = os.environ.get('PAYMENT_CALLBACK_SECRET', '')
+
+# Checkout stock reservations (python manage.py release_expired_reservations)
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Flash sales (python manage.py run_flash_sales every minute); queue tickets come from cache.incr
+# on the shared Redis cache, so every web process hands out numbers from the same queue
+FLASH_SALE_TICKETS_CACHE = 'flash_sale_tickets_{sale_id}'
 
 UPLOADCARE = {
     'pub_key': '5ff964c3b9a85a1e2697',
@@ -3,10 +3,16 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
+from django.views.i18n import set_language
+from core.views import csrf_cookie
+from market.views import media_derivative
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('i18n/', include('django.conf.urls.i18n')),
+    path('i18n/setlang/', set_language, name='set_language'),
+    path('csrf/', csrf_cookie, name='csrf_cookie'),
+    path('api/', include('api.urls', namespace='api')),
+    path('media-cache/<int:width>/<str:fmt>/<path:path>', media_derivative, name='media_derivative'),
 ]
 
 urlpatterns += i18n_patterns(